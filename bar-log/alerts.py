@@ -0,0 +1,155 @@
+"""
+Notification des alertes de stock bas (produit passe sous son seuil).
+
+L'ensemble alerte_stock est tenu a jour par les ecritures de stock de
+data_access.py (meme transaction). Ce module le consomme depuis un thread
+de fond par process:
+- toutes les ALERT_POLL_SECONDS, data_access.claim_stock_alerts() reserve
+  les alertes pas encore notifiees (une alerte n'est prise que par un
+  process) et les pousse: memoire du process (recent_alerts(), toasts du
+  tableau de bord) et webhook optionnel (BARLOG_ALERT_WEBHOOK, POST JSON),
+- toutes les ALERT_RESYNC_SECONDS, data_access.sync_low_stock() recalcule
+  tout l'ensemble (ventes simultanees du meme produit, ecritures hors
+  application) sur une lecture sans verrou du stock.
+
+Interaction:
+- pages/dashboard.py demarre le service et affiche les nouvelles alertes,
+- pages/admin.py affiche alert_stats().
+
+Une alerte n'est notifiee qu'a l'entree sous le seuil: un produit doit
+repasser au-dessus de son seuil (reappro) avant d'etre signale de nouveau.
+"""
+
+from collections import deque
+import json
+import os
+import threading
+import time
+import urllib.request
+
+import data_access
+
+ALERT_POLL_SECONDS = float(os.getenv("BARLOG_ALERT_POLL_SECONDS", "10"))
+ALERT_RESYNC_SECONDS = float(os.getenv("BARLOG_ALERT_RESYNC_SECONDS", "300"))
+ALERT_WEBHOOK = os.getenv("BARLOG_ALERT_WEBHOOK", "")
+ALERT_WEBHOOK_TIMEOUT = 5
+# Alertes gardees en memoire pour l'affichage.
+ALERT_HISTORY = 50
+
+_WAKE = threading.Event()
+_LOCK = threading.Lock()
+_WORKER = None
+_RECENT = deque(maxlen=ALERT_HISTORY)
+_STATE = {
+    "sequence": 0,
+    "resynced_at": None,
+    "checked_at": None,
+    "last_error": None,
+    "notified": 0,
+    "webhook_errors": 0,
+}
+
+
+def start():
+    """Demarre le thread de notification du process s'il ne tourne pas deja."""
+    global _WORKER
+    with _LOCK:
+        if _WORKER is None or not _WORKER.is_alive():
+            _WORKER = threading.Thread(target=_run, name="barlog-alerts", daemon=True)
+            _WORKER.start()
+
+
+def _post_webhook(alerts):
+    """Envoie les alertes au webhook configure (POST JSON). Retourne False en cas d'echec."""
+    payload = json.dumps(
+        {
+            "alertes": [
+                {
+                    "id_produit": alert["id_produit"],
+                    "nom_produit": alert["nom_produit"],
+                    "stock": alert["stock"],
+                    "seuil": alert["seuil"],
+                    "depuis": str(alert["depuis"]),
+                }
+                for alert in alerts
+            ]
+        }
+    ).encode("utf-8")
+    request = urllib.request.Request(
+        ALERT_WEBHOOK,
+        data=payload,
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=ALERT_WEBHOOK_TIMEOUT):
+            return True
+    except (OSError, ValueError):
+        # Webhook injoignable ou URL invalide: l'alerte reste affichee en memoire.
+        return False
+
+
+def _check(resync=False):
+    """Recalcule l'ensemble si demande puis notifie les nouvelles alertes."""
+    if resync:
+        data_access.sync_low_stock()
+    alerts = data_access.claim_stock_alerts()
+    now = time.time()
+    webhook_failed = bool(alerts and ALERT_WEBHOOK) and not _post_webhook(alerts)
+    with _LOCK:
+        for alert in alerts:
+            _STATE["sequence"] += 1
+            _RECENT.append(
+                {
+                    "sequence": _STATE["sequence"],
+                    "id_produit": alert["id_produit"],
+                    "nom_produit": alert["nom_produit"],
+                    "stock": int(alert["stock"]),
+                    "seuil": int(alert["seuil"]),
+                    "notified_at": now,
+                }
+            )
+        _STATE["notified"] += len(alerts)
+        _STATE["webhook_errors"] += int(webhook_failed)
+        _STATE["checked_at"] = now
+        _STATE["last_error"] = None
+        if resync:
+            _STATE["resynced_at"] = now
+
+
+def _run():
+    """Boucle du thread: un controle toutes les ALERT_POLL_SECONDS (ou sur reveil)."""
+    while True:
+        with _LOCK:
+            resynced_at = _STATE["resynced_at"]
+        resync = resynced_at is None or time.time() - resynced_at >= ALERT_RESYNC_SECONDS
+        try:
+            _check(resync=resync)
+        except Exception as exc:
+            with _LOCK:
+                _STATE["last_error"] = str(exc)
+        _WAKE.wait(ALERT_POLL_SECONDS)
+        _WAKE.clear()
+
+
+def recent_alerts(after=0):
+    """
+    Alertes notifiees par ce process, plus recentes que la sequence after.
+
+    Retour: liste de dict sequence, id_produit, nom_produit, stock, seuil,
+    notified_at (les ALERT_HISTORY dernieres au plus).
+    """
+    with _LOCK:
+        return [dict(alert) for alert in _RECENT if alert["sequence"] > after]
+
+
+def alert_stats():
+    """Compteurs du service (alertes notifiees, erreurs, dernier recalcul)."""
+    with _LOCK:
+        return {
+            "notified": _STATE["notified"],
+            "webhook_errors": _STATE["webhook_errors"],
+            "checked_at": _STATE["checked_at"],
+            "resynced_at": _STATE["resynced_at"],
+            "last_error": _STATE["last_error"],
+        }
@@ -0,0 +1,165 @@
+"""
+Benchmark de construction des DataFrame: fetch_df() contre fetch_frame().
+
+Compare, sur N lignes au format de list_sales():
+- le chemin dict: une ligne = un dict (cursor dictionary=True), puis
+  pd.DataFrame(rows); DECIMAL en objets Decimal (dtype object),
+- le chemin colonnes (data_access._frame_from_rows): tuples, colonnes
+  construites avec leur dtype (int64, centimes int64, category).
+
+Mesure le temps de construction (dicts compris pour le chemin dict: c'est
+le cursor qui les cree), le pic d'allocation Python (tracemalloc) et la
+memoire du DataFrame obtenu (memory_usage(deep=True)).
+
+Sans option, les lignes sont synthetiques (aucune base requise). Avec
+--from-db, la requete de list_sales est lue sur la base de bench (lignes
+les plus recentes, LIMIT --rows) et les temps de lecture SQL sont ajoutes.
+
+Usage (depuis bar-log/):
+    python bench/bench_fetch.py [--rows 500000] [--seed 7]
+    python bench/bench_fetch.py --from-db [--rows 500000]
+"""
+
+import argparse
+from datetime import date, timedelta
+from decimal import Decimal
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import benchdb
+
+# Colonnes de list_sales() (types logiques de db.describe_columns()).
+SALES_COLUMNS = [
+    ("id_vente", "int"),
+    ("date_vente", "date"),
+    ("quantite", "int"),
+    ("montant", "decimal"),
+    ("type_vente", "str"),
+    ("id_recu", "int"),
+    ("id_produit", "str"),
+    ("categorie", "str"),
+    ("article", "str"),
+    ("marge", "decimal"),
+]
+CATEGORIES = ["Bieres", "Whisky", "Vins rouges", "Liqueurs", "Sodas", "Cocktail"]
+
+
+def build_rows(count, seed):
+    """Tuples realistes au format de list_sales (Decimal, dates, 1/3 de verres)."""
+    rng = np.random.default_rng(seed)
+    start = date.today() - timedelta(days=365)
+    days = rng.integers(0, 365, count)
+    product = rng.integers(1, 2000, count)
+    quantite = rng.integers(1, 6, count)
+    prix = rng.integers(100, 8000, count) * 5
+    verre = rng.random(count) < 0.33
+    categorie = rng.integers(0, len(CATEGORIES), count)
+    return [
+        (
+            index + 1,
+            start + timedelta(days=int(days[index])),
+            int(quantite[index]),
+            Decimal(int(prix[index]) * int(quantite[index])).quantize(Decimal("0.01")),
+            "verre" if verre[index] else "bouteille",
+            index // 4 + 1,
+            f"PR{int(product[index]):06d}",
+            CATEGORIES[categorie[index]],
+            f"Produit {int(product[index]):04d}",
+            (Decimal(int(prix[index]) * int(quantite[index])) * Decimal("0.3")).quantize(Decimal("0.01")),
+        )
+        for index in range(count)
+    ]
+
+
+def dict_path(rows, names):
+    """Chemin actuel: un dict par ligne (cursor dictionary=True) puis pd.DataFrame."""
+    records = [dict(zip(names, row)) for row in rows]
+    return pd.DataFrame(records)
+
+
+def measure(label, build):
+    """Temps, pic tracemalloc et memoire du DataFrame d'une construction."""
+    gc.collect()
+    started = time.perf_counter()
+    df = build()
+    seconds = time.perf_counter() - started
+    del df
+    gc.collect()
+    tracemalloc.start()
+    df = build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = {
+        "build_seconds": round(seconds, 4),
+        "peak_alloc_mb": round(peak / 2**20, 1),
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 2**20, 1),
+        "dtypes": {name: str(dtype) for name, dtype in df.dtypes.items()},
+    }
+    print(f"  {label}: {result['build_seconds']} s, {result['frame_mb']} Mo", file=sys.stderr)
+    return result, df
+
+
+def fetch_database_rows(args):
+    """Lit la requete list_sales sur la base de bench (tuples) et son temps SQL."""
+    benchdb.use_bench_database(benchdb.config_from_args(args))
+    import data_access
+    from db import db_cursor, describe_columns
+
+    query = data_access._SALES_SELECT + " ORDER BY v.date_vente DESC, v.id_vente DESC LIMIT %s"
+    started = time.perf_counter()
+    with db_cursor(dictionary=False) as (_, cur):
+        cur.execute(query, (args.rows,))
+        rows = cur.fetchall()
+        columns = describe_columns(cur.description)
+    return rows, columns, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--from-db", action="store_true", help="Lire list_sales sur la base de bench")
+    benchdb.add_db_arguments(parser)
+    args = parser.parse_args(argv)
+
+    fetch_seconds = None
+    if args.from_db:
+        rows, columns, fetch_seconds = fetch_database_rows(args)
+    else:
+        rows, columns = build_rows(args.rows, args.seed), SALES_COLUMNS
+    names = [name for name, _ in columns]
+
+    import data_access
+
+    dict_result, dict_df = measure("dict", lambda: dict_path(rows, names))
+    columnar_result, columnar_df = measure("colonnes", lambda: data_access._frame_from_rows(columns, rows))
+
+    # Controle: memes montants au centime pres.
+    montant_cents = np.rint(dict_df["montant"].astype("float64").to_numpy() * data_access.MONEY_SCALE)
+    gap = int(np.abs(montant_cents - columnar_df["montant"].to_numpy()).max()) if len(rows) else 0
+    print(
+        json.dumps(
+            {
+                "rows": len(rows),
+                "source": "database" if args.from_db else "synthetic",
+                "sql_fetch_seconds": round(fetch_seconds, 4) if fetch_seconds is not None else None,
+                "dict": dict_result,
+                "columnar": columnar_result,
+                "build_speedup": round(dict_result["build_seconds"] / columnar_result["build_seconds"], 1),
+                "memory_ratio": round(dict_result["frame_mb"] / columnar_result["frame_mb"], 1),
+                "max_montant_gap_cents": gap,
+            },
+            indent=2,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
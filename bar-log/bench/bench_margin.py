@@ -0,0 +1,114 @@
+"""
+Benchmark du moteur de marge (margin.py) contre l'ancienne boucle Decimal.
+
+Compare sur N lignes synthetiques (brouillon/historique de ventes):
+- la boucle ligne a ligne en Decimal qu'utilisait pages/sales.py,
+- margin.sale_lines() (pandas/NumPy vectorise, centimes int64; les prix
+  sont convertis en centimes hors chrono, comme a la lecture par
+  data_access.py).
+
+Affiche un resume JSON: temps de chaque version, acceleration, et ecart
+max entre les deux resultats (doit rester au centime pres).
+
+Usage (depuis bar-log/, aucune base requise):
+    python bench/bench_margin.py [--rows 100000] [--seed 7]
+"""
+
+import argparse
+from decimal import Decimal
+import json
+from pathlib import Path
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+from margin import sale_lines  # noqa: E402
+from money import MONEY_COLUMNS, MONEY_SCALE, to_cents_array  # noqa: E402
+
+
+def build_rows(count, seed):
+    """Genere des lignes de vente realistes (prix FCFA, 1/3 de verres)."""
+    rng = np.random.default_rng(seed)
+    prix_achat = rng.integers(500, 40000, count) * 5
+    prix_bouteille = (prix_achat * rng.uniform(1.3, 2.5, count)).round(-1)
+    quantite_ml = rng.choice([330, 500, 700, 750, 1000], count)
+    prix_verre = (prix_bouteille / (quantite_ml / 50) * rng.uniform(1.1, 1.8, count)).round(-1)
+    return pd.DataFrame(
+        {
+            "quantite": rng.integers(1, 6, count),
+            "type_vente": rng.choice(["bouteille", "bouteille", "verre"], count),
+            "prix_achat": [Decimal(str(value)) for value in prix_achat],
+            "prix_vente_bouteille": [Decimal(str(value)) for value in prix_bouteille],
+            "prix_vente_verre": [Decimal(str(value)) for value in prix_verre],
+            "quantite_ml": quantite_ml,
+        }
+    )
+
+
+def decimal_loop(df):
+    """Reproduction de l'ancienne boucle Decimal de pages/sales.py."""
+    montants = []
+    marges = []
+    for row in df.to_dict("records"):
+        prix_achat = Decimal(str(row["prix_achat"]))
+        prix_bouteille = Decimal(str(row["prix_vente_bouteille"]))
+        prix_verre = Decimal(str(row["prix_vente_verre"]))
+        quantite_ml = int(row["quantite_ml"] or 1)
+        qty = Decimal(str(row["quantite"]))
+        if row["type_vente"] == "verre":
+            nombre_verres = Decimal(quantite_ml) / Decimal(50)
+            prix_moyen_verre = (prix_bouteille / nombre_verres).quantize(Decimal("0.01"))
+            montant = (prix_verre * qty).quantize(Decimal("0.01"))
+            marge = montant - (prix_moyen_verre * qty).quantize(Decimal("0.01"))
+        else:
+            montant = (prix_bouteille * qty).quantize(Decimal("0.01"))
+            marge = montant - (prix_achat * qty).quantize(Decimal("0.01"))
+        montants.append(montant)
+        marges.append(marge)
+    return montants, marges
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    df = build_rows(args.rows, args.seed)
+    cents_df = df.copy()
+    for column in MONEY_COLUMNS.intersection(df.columns):
+        cents_df[column] = to_cents_array(df[column].to_numpy())
+
+    started = time.perf_counter()
+    montants, marges = decimal_loop(df)
+    loop_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = sale_lines(cents_df)
+    vector_seconds = time.perf_counter() - started
+
+    montant_gap = np.abs(result["montant"].to_numpy() / MONEY_SCALE - np.array(montants, dtype="float64")).max()
+    marge_gap = np.abs(result["marge"].to_numpy() / MONEY_SCALE - np.array(marges, dtype="float64")).max()
+    print(
+        json.dumps(
+            {
+                "rows": args.rows,
+                "decimal_loop_seconds": round(loop_seconds, 4),
+                "vectorized_seconds": round(vector_seconds, 4),
+                "speedup": round(loop_seconds / vector_seconds, 1) if vector_seconds else None,
+                "max_montant_gap": round(float(montant_gap), 4),
+                "max_marge_gap": round(float(marge_gap), 4),
+            },
+            indent=2,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
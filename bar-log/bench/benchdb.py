@@ -0,0 +1,148 @@
+"""
+Base de benchmark partagee par les scripts de bench/.
+
+Interaction:
+- generate.py cree la base et charge schema.sql via load_schema(),
+- run.py (et les autres benchs qui parlent a MySQL) appellent
+  use_bench_database() pour que db.py/data_access.py visent la base de bench,
+  jamais celle de .streamlit/secrets.toml.
+
+Configuration (arguments ou variables d'environnement):
+    BENCH_DB_HOST (defaut DB_HOST puis 127.0.0.1), BENCH_DB_PORT,
+    BENCH_DB_USER, BENCH_DB_PASSWORD, BENCH_DB_NAME (defaut barstock_bench).
+"""
+
+import os
+from pathlib import Path
+import sys
+
+APP_DIR = Path(__file__).resolve().parent.parent
+SCHEMA_PATH = APP_DIR / "schema.sql"
+DEFAULT_DATABASE = "barstock_bench"
+
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+
+def _env(name, default=None):
+    """Lit BENCH_<name>, puis DB_<name>, puis la valeur par defaut."""
+    return os.getenv(f"BENCH_DB_{name}", os.getenv(f"DB_{name}", default))
+
+
+def add_db_arguments(parser):
+    """Declare les options de connexion communes aux scripts de bench."""
+    group = parser.add_argument_group("base de benchmark")
+    group.add_argument("--host", default=_env("HOST", "127.0.0.1"))
+    group.add_argument("--port", type=int, default=int(_env("PORT", "3306")))
+    group.add_argument("--user", default=_env("USER", "root"))
+    group.add_argument("--password", default=_env("PASSWORD", ""))
+    group.add_argument("--database", default=os.getenv("BENCH_DB_NAME", DEFAULT_DATABASE))
+    return group
+
+
+def config_from_args(args):
+    """Construit la config de connexion depuis les arguments parses."""
+    return {
+        "host": args.host,
+        "port": args.port,
+        "user": args.user,
+        "password": args.password,
+        "database": args.database,
+    }
+
+
+def connect(cfg, database=True):
+    """Connexion directe (hors pool); database=False pour CREATE DATABASE."""
+    import mysql.connector
+
+    params = {
+        "host": cfg["host"],
+        "port": cfg["port"],
+        "user": cfg["user"],
+        "password": cfg["password"],
+        "autocommit": False,
+    }
+    if database:
+        params["database"] = cfg["database"]
+    return mysql.connector.connect(**params)
+
+
+def split_sql(script):
+    """
+    Decoupe un script SQL en instructions executables une par une.
+
+    Gere les blocs DELIMITER (trigger de schema.sql) et ignore les
+    commentaires de ligne.
+    """
+    statements = []
+    delimiter = ";"
+    buffer = []
+    for line in script.splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith("DELIMITER "):
+            delimiter = stripped.split(None, 1)[1]
+            continue
+        if not buffer and (not stripped or stripped.startswith("--")):
+            continue
+        buffer.append(line)
+        if stripped.endswith(delimiter):
+            statement = "\n".join(buffer).rstrip()
+            statement = statement[: -len(delimiter)].strip()
+            if statement:
+                statements.append(statement)
+            buffer = []
+    tail = "\n".join(buffer).strip()
+    if tail:
+        statements.append(tail)
+    return statements
+
+
+def load_schema(cfg, recreate=False):
+    """Cree la base cfg["database"] et y execute schema.sql."""
+    conn = connect(cfg, database=False)
+    try:
+        cur = conn.cursor()
+        name = cfg["database"].replace("`", "")
+        if recreate:
+            cur.execute(f"DROP DATABASE IF EXISTS `{name}`")
+        cur.execute(f"CREATE DATABASE `{name}` CHARACTER SET utf8mb4")
+        cur.execute(f"USE `{name}`")
+        for statement in split_sql(SCHEMA_PATH.read_text(encoding="utf-8")):
+            cur.execute(statement)
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+
+def use_bench_database(cfg, pool_size=5):
+    """
+    Fait pointer db.py sur la base de bench pour tout le process.
+
+    Les secrets Streamlit sont ignores (ils designent la base reelle) et la
+    config passe par les variables DB_* lues par db._from_env().
+    """
+    import db
+
+    os.environ["DB_HOST"] = str(cfg["host"])
+    os.environ["DB_PORT"] = str(cfg["port"])
+    os.environ["DB_USER"] = str(cfg["user"])
+    os.environ["DB_PASSWORD"] = str(cfg["password"])
+    os.environ["DB_NAME"] = str(cfg["database"])
+    os.environ["DB_POOL_SIZE"] = str(pool_size)
+    db._from_secrets = lambda: None
+
+
+def table_counts(cfg, tables=("produit", "vente", "recu", "entree_stock", "charge", "vente_jour")):
+    """Retourne le nombre de lignes de chaque table (volumes du jeu de donnees)."""
+    conn = connect(cfg)
+    try:
+        cur = conn.cursor()
+        counts = {}
+        for table in tables:
+            cur.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = int(cur.fetchone()[0])
+        cur.close()
+        return counts
+    finally:
+        conn.close()
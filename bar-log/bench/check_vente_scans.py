@@ -0,0 +1,145 @@
+"""
+Benchmark de regression: aucune page ne doit scanner toute la table vente.
+
+Principe:
+- chaque page de streamlit_app.py est rendue en headless (AppTest),
+- toutes les requetes SQL passees par data_access.db_cursor() sont
+  enregistrees avec leur duree,
+- un SELECT qui lit vente sans borne de date (ni cle precise, ni bout de
+  cle primaire) est signale.
+
+Le script affiche un resume JSON (temps de rendu, nb de requetes vente par
+page) et sort en code 1 si une page emet un scan non borne.
+
+Usage (depuis bar-log/, base configuree via DB_* ou secrets):
+    python bench/check_vente_scans.py
+"""
+
+from contextlib import contextmanager
+import json
+from pathlib import Path
+import re
+import sys
+import time
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import data_access  # noqa: E402
+
+PAGE_LABELS = (
+    "Tableau de bord",
+    "Produits",
+    "Entrees",
+    "Ventes",
+    "Charges",
+    "Rapports",
+)
+
+_VENTE_TABLE = re.compile(r"\b(from|join)\s+vente\b")
+_DATE_RANGE = (
+    re.compile(r"date_vente\s+between\b"),
+    re.compile(r"date_vente\s*>=.*date_vente\s*<="),
+)
+_KEY_LOOKUP = re.compile(r"\b(id_vente|id_recu)\s*=\s*%s")
+# Sous-requete en bout de cle primaire (filigrane de kpi.py): une seule
+# entree d'index lue, quelle que soit la taille de vente.
+_KEY_EDGE = re.compile(r"\(\s*select\s+(max|min)\(\s*id_vente\s*\)\s+(as\s+\w+\s+)?from\s+vente\s*\)")
+
+
+def is_unbounded_vente_scan(sql):
+    """
+    Retourne True si la requete lit vente sans borne de date ni cle.
+
+    Les sous-requetes (SELECT MAX/MIN(id_vente) FROM vente) sont bornees
+    (bout de l'index primaire) et ignorees.
+    """
+    text = " ".join(sql.lower().split())
+    if not text.startswith(("select", "with")):
+        return False
+    text = _KEY_EDGE.sub("", text)
+    if not _VENTE_TABLE.search(text):
+        return False
+    if any(pattern.search(text) for pattern in _DATE_RANGE):
+        return False
+    return not _KEY_LOOKUP.search(text)
+
+
+class _RecordingCursor:
+    """Proxy de cursor qui note chaque execute() (SQL, parametres, duree)."""
+
+    def __init__(self, cursor, log):
+        self._cursor = cursor
+        self._log = log
+
+    def execute(self, operation, params=None):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params)
+        finally:
+            self._log.append(
+                {
+                    "sql": operation,
+                    "params": params,
+                    "seconds": time.perf_counter() - started,
+                }
+            )
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def install_recorder(log):
+    """Remplace data_access.db_cursor par une version qui enregistre le SQL."""
+    original = data_access.db_cursor
+
+    @contextmanager
+    def recording_db_cursor(*args, **kwargs):
+        with original(*args, **kwargs) as (conn, cur):
+            yield conn, _RecordingCursor(cur, log)
+
+    data_access.db_cursor = recording_db_cursor
+    return original
+
+
+def run_page(label, log):
+    """Rend une page en headless et retourne ses mesures."""
+    del log[:]
+    at = AppTest.from_file(str(APP_DIR / "streamlit_app.py"), default_timeout=120)
+    at.session_state["main_navigation"] = label
+    started = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - started
+    vente_queries = [entry for entry in log if _VENTE_TABLE.search(entry["sql"].lower())]
+    unbounded = [entry for entry in vente_queries if is_unbounded_vente_scan(entry["sql"])]
+    return {
+        "page": label,
+        "render_seconds": round(elapsed, 4),
+        "queries": len(log),
+        "vente_queries": len(vente_queries),
+        "vente_seconds": round(sum(entry["seconds"] for entry in vente_queries), 4),
+        "unbounded_vente_scans": [" ".join(entry["sql"].split()) for entry in unbounded],
+        "exceptions": [str(exc.value) for exc in at.exception],
+    }
+
+
+def main():
+    log = []
+    original = install_recorder(log)
+    try:
+        results = [run_page(label, log) for label in PAGE_LABELS]
+    finally:
+        data_access.db_cursor = original
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    offenders = [result["page"] for result in results if result["unbounded_vente_scans"]]
+    if offenders:
+        print(f"Scan non borne de vente sur: {', '.join(offenders)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Compare deux fichiers de resultats de bench/run.py, bench/startup.py ou
+bench/concurrency.py (avant / apres).
+
+Affiche, pour chaque mesure commune, la mediane avant/apres et le ratio
+(apres / avant). Une mesure est marquee en regression si le ratio depasse
+--threshold et que l'ecart absolu depasse --min-delta-ms (evite le bruit
+sur les mesures de quelques millisecondes).
+
+Usage (depuis bar-log/):
+    python bench/compare.py bench/results/abc1234.json bench/results/def5678.json [--fail]
+"""
+
+import argparse
+import json
+from pathlib import Path
+import sys
+
+SECTIONS = ("functions", "writes", "maintenance", "pages", "startup", "concurrency")
+
+
+def _load(path):
+    """Charge un fichier de resultats."""
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def compare(base, head, threshold, min_delta_ms):
+    """Retourne les lignes de comparaison (section, nom, avant, apres, ratio, regression)."""
+    lines = []
+    for section in SECTIONS:
+        before = base.get(section, {})
+        after = head.get(section, {})
+        for name in sorted(set(before) & set(after)):
+            base_ms = before[name]["median_ms"]
+            head_ms = after[name]["median_ms"]
+            ratio = head_ms / base_ms if base_ms else None
+            regression = (
+                ratio is not None
+                and ratio > threshold
+                and head_ms - base_ms > min_delta_ms
+            )
+            lines.append((section, name, base_ms, head_ms, ratio, regression))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare deux resultats de bench/run.py")
+    parser.add_argument("base", help="Resultats de reference (avant)")
+    parser.add_argument("head", help="Resultats a comparer (apres)")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Ratio apres/avant juge en regression")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0)
+    parser.add_argument("--fail", action="store_true", help="Code retour 1 si une regression est detectee")
+    args = parser.parse_args(argv)
+
+    base = _load(args.base)
+    head = _load(args.head)
+    print(f"avant: {base['meta']['revision']}  apres: {head['meta']['revision']}")
+    if base["meta"].get("volumes") != head["meta"].get("volumes"):
+        print("attention: volumes differents entre les deux bases", file=sys.stderr)
+
+    lines = compare(base, head, args.threshold, args.min_delta_ms)
+    width = max((len(f"{section}/{name}") for section, name, *_ in lines), default=10)
+    for section, name, base_ms, head_ms, ratio, regression in lines:
+        ratio_text = f"x{ratio:.2f}" if ratio is not None else "-"
+        flag = "  REGRESSION" if regression else ""
+        print(f"{section + '/' + name:<{width}}  {base_ms:>10.1f}  {head_ms:>10.1f}  {ratio_text:>7}{flag}")
+
+    regressions = [line for line in lines if line[5]]
+    if args.fail and regressions:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Benchmark de concurrence des ventes: N caisses vendent le meme produit.
+
+Pour chaque mode de add_sale_stockable() ("ledger", "pessimiste",
+"optimiste"), --threads threads vendent --sales ventes chacun du meme
+produit (cree pour l'occasion) et on mesure:
+- debit (ventes validees / seconde) et latence p50/p95 par vente,
+- reprises sur deadlock / lock wait timeout et conflits de stock
+  (data_access.sale_stats()),
+- attentes de verrous InnoDB (Innodb_row_lock_waits / _time, compteurs
+  globaux du serveur: lancer sur une base de bench au repos),
+- survente: stock final (somme du ledger) compare aux ventes validees.
+
+Avec --stock inferieur au volume demande, le mode ledger peut survendre,
+les modes pessimiste et optimiste doivent s'arreter a 0.
+
+Usage (depuis bar-log/, base de bench configuree comme pour run.py):
+    python bench/concurrency.py [--threads 8] [--sales 200] [--stock 100000]
+"""
+
+import argparse
+from datetime import date, datetime
+import json
+from pathlib import Path
+import statistics
+import sys
+import threading
+import time
+
+import benchdb
+from run import RESULTS_DIR, _git_revision
+
+MODES = ("ledger", "pessimiste", "optimiste")
+_LOCK_STATUS = ("Innodb_row_lock_waits", "Innodb_row_lock_time")
+
+
+def _lock_status(cfg):
+    """Compteurs globaux d'attente de verrous InnoDB (connexion hors pool)."""
+    conn = benchdb.connect(cfg)
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SHOW GLOBAL STATUS WHERE Variable_name IN (%s, %s)",
+            _LOCK_STATUS,
+        )
+        values = {name: int(value) for name, value in cur.fetchall()}
+        cur.close()
+    finally:
+        conn.close()
+    return values
+
+
+def _ledger_stock(data_access, product_id):
+    """Stock du produit recalcule depuis tout le ledger (independant du snapshot)."""
+    row = data_access.fetch_one(
+        "SELECT COALESCE(SUM(quantite), 0) AS stock FROM mouvement_stock WHERE id_produit = %s",
+        (product_id,),
+    )
+    return int(row["stock"])
+
+
+def _percentile(values, ratio):
+    """Percentile par rang le plus proche."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(ratio * (len(values) - 1))))]
+
+
+def run_mode(data_access, cfg, mode, category_id, threads, sales, stock):
+    """Lance threads x sales ventes concurrentes du meme produit dans un mode."""
+    name = f"Bench concurrence {mode} {datetime.now():%H%M%S}"
+    product_id = data_access.create_product(name, category_id, 100_000, 200_000, 0, stock, "bouteille", 750)
+    receipts = [data_access.create_receipt("Bench concurrence") for _ in range(threads)]
+    today = date.today()
+
+    latencies = []
+    outcomes = {"ok": 0, "stock": 0, "errors": 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+
+    def till(receipt_id):
+        barrier.wait()
+        for _ in range(sales):
+            started = time.perf_counter()
+            try:
+                data_access.add_sale_stockable(product_id, 1, today, "bouteille", receipt_id, mode=mode)
+                outcome = "ok"
+            except ValueError:
+                outcome = "stock"
+            except Exception:
+                outcome = "errors"
+            elapsed = time.perf_counter() - started
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == "ok":
+                    latencies.append(elapsed)
+
+    workers = [threading.Thread(target=till, args=(receipt_id,)) for receipt_id in receipts]
+    for worker in workers:
+        worker.start()
+    stats_before = data_access.sale_stats()
+    locks_before = _lock_status(cfg)
+    barrier.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - started
+    locks_after = _lock_status(cfg)
+    stats_after = data_access.sale_stats()
+
+    final_stock = _ledger_stock(data_access, product_id)
+    values = [latency * 1000 for latency in latencies] or [0.0]
+    return {
+        "threads": threads,
+        "sales_attempted": threads * sales,
+        "sales_ok": outcomes["ok"],
+        "rejected_stock": outcomes["stock"],
+        "errors": outcomes["errors"],
+        "seconds": round(seconds, 3),
+        "throughput_per_s": round(outcomes["ok"] / seconds, 1) if seconds else None,
+        "median_ms": round(statistics.median(values), 3),
+        "p95_ms": round(_percentile(values, 0.95), 3),
+        "max_ms": round(max(values), 3),
+        "retries": stats_after["retries"] - stats_before["retries"],
+        "conflicts": stats_after["conflicts"] - stats_before["conflicts"],
+        "oversells_detected": stats_after["oversells"] - stats_before["oversells"],
+        "row_lock_waits": locks_after["Innodb_row_lock_waits"] - locks_before["Innodb_row_lock_waits"],
+        "row_lock_time_ms": locks_after["Innodb_row_lock_time"] - locks_before["Innodb_row_lock_time"],
+        "initial_stock": stock,
+        "final_stock": final_stock,
+        "oversold": max(0, -final_stock),
+        "consistent": stock - outcomes["ok"] == final_stock,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ventes concurrentes d'un meme produit par mode")
+    benchdb.add_db_arguments(parser)
+    parser.add_argument("--threads", type=int, default=8, help="Caisses simultanees")
+    parser.add_argument("--sales", type=int, default=200, help="Ventes par caisse")
+    parser.add_argument("--stock", type=int, default=None, help="Stock initial (defaut: tout le volume)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    cfg = benchdb.config_from_args(args)
+    # Une connexion par caisse + marge pour les lectures du bench.
+    benchdb.use_bench_database(cfg, pool_size=args.threads + 2)
+    import data_access
+
+    category = data_access.fetch_one(
+        "SELECT id_categorie FROM categorie WHERE stockable = 1 ORDER BY id_categorie LIMIT 1"
+    )
+    stock = args.stock if args.stock is not None else args.threads * args.sales
+    # Le roll-up de fond ajouterait ses propres verrous a la mesure.
+    data_access.ROLLUP_EVERY_MOVEMENTS = 0
+
+    concurrency = {}
+    for mode in args.modes:
+        result = run_mode(data_access, cfg, mode, category["id_categorie"], args.threads, args.sales, stock)
+        concurrency[mode] = result
+        print(
+            f"  {mode}: {result['throughput_per_s']} ventes/s, p95 {result['p95_ms']} ms, "
+            f"{result['retries']} reprises, {result['row_lock_waits']} attentes de verrou "
+            f"({result['row_lock_time_ms']} ms), survente {result['oversold']}",
+            file=sys.stderr,
+        )
+
+    revision = _git_revision()
+    results = {
+        "meta": {
+            "revision": revision,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "database": cfg["database"],
+            "threads": args.threads,
+            "sales_per_thread": args.sales,
+            "stock": stock,
+        },
+        "concurrency": concurrency,
+    }
+    output = args.output or RESULTS_DIR / f"concurrency-{revision}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Conseiller d'index: EXPLAIN FORMAT=JSON de chaque requete de data_access.py.
+
+Principe:
+- les lectures de run.py (read_cases(), memes arguments representatifs)
+  sont executees sur la base de bench avec le SQL et les parametres
+  enregistres (check_vente_scans.install_recorder()), plus les ecritures
+  de run.py avec --with-writes,
+- chaque requete distincte (empreinte query_log.fingerprint) est rejouee
+  en EXPLAIN FORMAT=JSON avec ses parametres reels,
+- le plan est parcouru (formats MySQL et MariaDB) et la requete signalee
+  si elle fait un filesort, une table temporaire, un parcours complet de
+  table (access_type ALL) ou d'index (access_type index) sur plus de
+  --min-rows lignes estimees.
+
+Resultat: resume sur stderr, JSON dans bench/results/explain-<commit>.json
+(plans complets avec --plans); code 1 avec --fail si une requete est
+signalee.
+
+Usage (depuis bar-log/, base de bench configuree comme pour run.py):
+    python bench/explain.py [--with-writes] [--min-rows 1000] [--plans] [--fail]
+"""
+
+import argparse
+from datetime import datetime
+import json
+from pathlib import Path
+import sys
+
+import benchdb
+from check_vente_scans import install_recorder
+import query_log
+from run import RESULTS_DIR, _git_revision, _reference_values, read_cases, run_writes
+
+# Instructions qui ont un plan (INSERT ... SELECT aussi, pas INSERT ... VALUES).
+_EXPLAINABLE = ("select", "with", "update", "delete")
+
+FLAG_LABELS = {
+    "filesort": "filesort",
+    "temporary": "table temporaire",
+    "full_scan": "parcours complet",
+    "index_scan": "parcours d'index complet",
+}
+
+
+def _explainable(sql):
+    """True si la requete a un plan utile (lecture, mise a jour, INSERT ... SELECT)."""
+    text = " ".join(sql.lower().split())
+    if text.startswith("insert"):
+        return " select " in f" {text} "
+    return text.startswith(_EXPLAINABLE)
+
+
+def capture(data_access, ref, with_writes):
+    """Execute les cas de run.py et retourne {empreinte: requete} (premier appel de chaque)."""
+    log = []
+    original = install_recorder(log)
+    queries = {}
+    try:
+        for name, func_name, args, kwargs in read_cases(ref):
+            del log[:]
+            data_access.invalidate_cache()
+            getattr(data_access, func_name)(*args, **kwargs)
+            _collect(queries, log, name)
+        if with_writes:
+            del log[:]
+            run_writes(data_access, ref, 1)
+            _collect(queries, log, "writes")
+    finally:
+        data_access.db_cursor = original
+    return queries
+
+
+def _collect(queries, log, case):
+    """Ajoute les requetes enregistrees d'un cas (dedoublonnees par empreinte)."""
+    for entry in log:
+        if not _explainable(entry["sql"]):
+            continue
+        text = query_log.fingerprint(entry["sql"])
+        query = queries.setdefault(
+            text,
+            {
+                "fingerprint_id": query_log.fingerprint_id(text),
+                "fingerprint": text,
+                "sql": entry["sql"],
+                "params": entry["params"],
+                "cases": [],
+            },
+        )
+        if case not in query["cases"]:
+            query["cases"].append(case)
+
+
+def _walk(node):
+    """Parcourt recursivement un plan JSON (dicts et listes)."""
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value)
+
+
+def analyze(plan, min_rows):
+    """
+    Extrait les tables lues et les signaux d'un plan EXPLAIN FORMAT=JSON.
+
+    MySQL: using_filesort / using_temporary_table, rows_examined_per_scan;
+    MariaDB: objets filesort / temporary_table, rows.
+    """
+    flags = set()
+    tables = []
+    for node in _walk(plan):
+        if node.get("using_filesort") or "filesort" in node:
+            flags.add("filesort")
+        if node.get("using_temporary_table") or "temporary_table" in node:
+            flags.add("temporary")
+        access = node.get("access_type")
+        if access is None:
+            continue
+        rows = node.get("rows_examined_per_scan", node.get("rows"))
+        table = {
+            "table": node.get("table_name"),
+            "access": access,
+            "key": node.get("key"),
+            "rows": rows,
+            "covering": bool(node.get("using_index")),
+        }
+        tables.append(table)
+        if access in ("ALL", "index") and (rows or 0) >= min_rows:
+            flags.add("full_scan" if access == "ALL" else "index_scan")
+    return sorted(flags), tables
+
+
+def explain(cfg, queries, min_rows, keep_plans):
+    """EXPLAIN FORMAT=JSON de chaque requete capturee (connexion hors pool)."""
+    conn = benchdb.connect(cfg)
+    results = []
+    try:
+        cur = conn.cursor()
+        for query in queries.values():
+            entry = {key: query[key] for key in ("fingerprint_id", "fingerprint", "cases")}
+            try:
+                cur.execute("EXPLAIN FORMAT=JSON " + query["sql"], query["params"])
+                plan = json.loads(cur.fetchall()[0][0])
+            except Exception as exc:
+                entry.update({"error": str(exc), "flags": [], "tables": []})
+                results.append(entry)
+                continue
+            entry["flags"], entry["tables"] = analyze(plan, min_rows)
+            if keep_plans:
+                entry["plan"] = plan
+            results.append(entry)
+        conn.rollback()
+        cur.close()
+    finally:
+        conn.close()
+    return results
+
+
+def _print_summary(results):
+    """Resume lisible: une ligne par requete signalee."""
+    flagged = [result for result in results if result["flags"] or result.get("error")]
+    print(f"{len(results)} requetes expliquees, {len(flagged)} signalees", file=sys.stderr)
+    for result in flagged:
+        if result.get("error"):
+            reason = f"erreur: {result['error']}"
+        else:
+            reason = ", ".join(FLAG_LABELS[flag] for flag in result["flags"])
+        tables = ", ".join(
+            f"{table['table']}:{table['access']}({table['key'] or '-'}, {table['rows']})"
+            for table in result["tables"]
+        )
+        print(
+            f"  [{result['fingerprint_id']}] {reason} - {', '.join(result['cases'])}\n"
+            f"      {tables}\n      {result['fingerprint'][:160]}",
+            file=sys.stderr,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EXPLAIN des requetes data_access sur la base de bench")
+    benchdb.add_db_arguments(parser)
+    parser.add_argument("--with-writes", action="store_true", help="Inclure les ecritures de run.py")
+    parser.add_argument("--min-rows", type=int, default=1000, help="Seuil des parcours complets signales")
+    parser.add_argument("--plans", action="store_true", help="Garder les plans complets dans le JSON")
+    parser.add_argument("--fail", action="store_true", help="Code 1 si une requete est signalee")
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    cfg = benchdb.config_from_args(args)
+    benchdb.use_bench_database(cfg)
+    import data_access
+
+    ref = _reference_values(data_access)
+    queries = capture(data_access, ref, args.with_writes)
+    results = explain(cfg, queries, args.min_rows, args.plans)
+    _print_summary(results)
+
+    revision = _git_revision()
+    report = {
+        "meta": {
+            "revision": revision,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "database": cfg["database"],
+            "volumes": benchdb.table_counts(cfg),
+            "min_rows": args.min_rows,
+        },
+        "queries": results,
+    }
+    output = args.output or RESULTS_DIR / f"explain-{revision}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+    print(output)
+    if args.fail and any(result["flags"] or result.get("error") for result in results):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
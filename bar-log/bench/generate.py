@@ -0,0 +1,375 @@
+"""
+Generateur de jeu de donnees synthetique pour les benchmarks BarStock.
+
+Cree (ou recree) la base de bench depuis schema.sql puis la remplit avec
+des volumes configurables et des distributions proches d'un vrai bar:
+- produits repartis par categorie (vins, whisky, jus, eau...), contenance
+  et unite de vente coherentes avec la categorie,
+- ventes groupees en recus, plus nombreuses le week-end et en decembre,
+  popularite des produits en loi de Zipf, ~8% de preparations (cocktails),
+- entrees de stock periodiques par produit,
+- charges fixes mensuelles + charges diverses sur N annees.
+
+Les ids produits (PR000001...) sont inseres explicitement et la sequence
+du trigger est avancee en consequence. vente_jour est reconstruit a la fin
+via data_access.rebuild_sales_summary() (meme SQL que l'application).
+
+Usage (depuis bar-log/, serveur MySQL/MariaDB local):
+    python bench/generate.py --recreate [--products 2000] [--sales 5000000] [--years 3]
+"""
+
+import argparse
+from datetime import date, datetime, timedelta
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import benchdb
+from margin import sale_lines
+from money import MONEY_SCALE
+
+# Profil par categorie de schema.sql:
+# (poids dans le catalogue, part vendue au verre, contenances ml, prix achat min/max FCFA)
+CATEGORY_PROFILES = {
+    "Vins moelleux": (6, 0.5, (750,), (3500, 12000)),
+    "Vins Bordeaux": (8, 0.5, (750,), (5000, 30000)),
+    "Vins rouges": (12, 0.5, (750,), (3000, 15000)),
+    "Vins mousseux": (4, 0.3, (750,), (6000, 20000)),
+    "Champagne": (4, 0.2, (750,), (25000, 90000)),
+    "Whisky": (10, 0.8, (700, 1000), (12000, 80000)),
+    "Gins": (5, 0.8, (700,), (10000, 40000)),
+    "Liqueur": (7, 0.8, (700,), (8000, 30000)),
+    "Shooter": (3, 1.0, (500, 700), (6000, 18000)),
+    "Jus": (12, 0.0, (250, 330, 1000), (300, 1500)),
+    "Eau": (5, 0.0, (500, 1500), (200, 600)),
+    "Sirop": (4, 0.6, (700,), (2000, 5000)),
+    "Sucrerie": (15, 0.0, (330, 500), (250, 800)),
+    "Repas": (5, 0.0, (0,), (1500, 6000)),
+}
+
+NAME_STEMS = {
+    "Vins moelleux": ("Moelleux", "Coteaux", "Doux"),
+    "Vins Bordeaux": ("Chateau", "Medoc", "Saint-Emilion"),
+    "Vins rouges": ("Cotes", "Merlot", "Cabernet", "Syrah"),
+    "Vins mousseux": ("Cremant", "Brut", "Prosecco"),
+    "Champagne": ("Champagne", "Cuvee"),
+    "Whisky": ("Single Malt", "Blend", "Bourbon"),
+    "Gins": ("Gin", "London Dry"),
+    "Liqueur": ("Liqueur", "Creme de"),
+    "Shooter": ("Shot", "Tequila", "Vodka"),
+    "Jus": ("Jus", "Nectar"),
+    "Eau": ("Eau", "Eau gazeuse"),
+    "Sirop": ("Sirop",),
+    "Sucrerie": ("Soda", "Cola", "Tonic", "Limonade"),
+    "Repas": ("Plat", "Brochettes", "Frites"),
+}
+
+PREPARATIONS = ("Mojito", "Pina Colada", "Cuba Libre", "Virgin Mojito", "Spritz", "Cocktail maison")
+
+# Charges fixes mensuelles (type, montant min/max) et charges diverses.
+MONTHLY_CHARGES = (
+    ("Loyer", 250000, 250000),
+    ("Salaires", 600000, 750000),
+    ("Electricite", 60000, 140000),
+    ("Eau", 15000, 40000),
+)
+MISC_CHARGES = ("Transport", "Glace", "Entretien", "Divers")
+
+# Niveaux de stock initiaux (quelques ruptures, majorite entre 12 et 48).
+STOCK_LEVELS = (0, 2, 5, 8, 12, 24, 48, 96)
+STOCK_WEIGHTS = (0.03, 0.05, 0.07, 0.1, 0.25, 0.25, 0.15, 0.1)
+
+# Poids de frequentation par jour de semaine (lundi -> dimanche).
+WEEKDAY_WEIGHTS = (0.7, 0.7, 0.8, 0.9, 1.4, 1.8, 1.1)
+
+
+def _batches(rows, size):
+    """Decoupe une liste de tuples en lots pour executemany()."""
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
+
+
+def _insert(cur, sql, rows, batch):
+    """Insertion multi-lignes par lots."""
+    for chunk in _batches(rows, batch):
+        cur.executemany(sql, chunk)
+
+
+def _day_range(years):
+    """Jours couverts par le jeu de donnees (se termine aujourd'hui)."""
+    end = date.today()
+    start = end - timedelta(days=int(365.25 * years))
+    days = pd.date_range(start, end, freq="D")
+    return days
+
+
+def _day_weights(days):
+    """Poids de frequentation: jour de semaine, decembre, legere croissance."""
+    weekday = np.asarray(WEEKDAY_WEIGHTS)[days.weekday]
+    december = np.where(days.month == 12, 1.3, 1.0)
+    growth = np.linspace(0.8, 1.2, len(days))
+    weights = weekday * december * growth
+    return weights / weights.sum()
+
+
+def generate_products(rng, categories, count):
+    """Construit le catalogue produit (DataFrame) selon CATEGORY_PROFILES."""
+    stockable = categories[categories["libelle"].isin(CATEGORY_PROFILES.keys())].reset_index(drop=True)
+    weights = np.array([CATEGORY_PROFILES[name][0] for name in stockable["libelle"]], dtype="float64")
+    picks = rng.choice(len(stockable), size=count, p=weights / weights.sum())
+
+    rows = []
+    for index, pick in enumerate(picks, start=1):
+        libelle = stockable.at[pick, "libelle"]
+        _, verre_share, sizes, (low, high) = CATEGORY_PROFILES[libelle]
+        quantite_ml = int(rng.choice(sizes))
+        prix_achat = int(rng.integers(low, high + 1) // 50 * 50)
+        prix_bouteille = int(round(prix_achat * rng.uniform(1.4, 2.2), -2))
+        unite = "verre" if quantite_ml and rng.random() < verre_share else "bouteille"
+        if unite == "verre":
+            verres = max(1, quantite_ml // 50)
+            prix_verre = int(round(prix_bouteille / verres * rng.uniform(1.3, 1.8), -2))
+        else:
+            prix_verre = 0
+        stem = rng.choice(NAME_STEMS[libelle])
+        rows.append(
+            {
+                "id_produit": f"PR{index:06d}",
+                "nom_produit": f"{stem} {index:04d}",
+                "prix_achat": prix_achat,
+                "prix_vente_bouteille": prix_bouteille,
+                "prix_vente_verre": prix_verre,
+                "stock_actuel": int(rng.choice(STOCK_LEVELS, p=STOCK_WEIGHTS)),
+                "unite_vente": unite,
+                "quantite_ml": quantite_ml,
+                "id_categorie": int(stockable.at[pick, "id_categorie"]),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def load_products(cur, products, batch):
+    """Insere le catalogue, avance la sequence PRxxxxxx et ouvre le ledger de stock."""
+    _insert(
+        cur,
+        "INSERT INTO produit (id_produit, nom_produit, prix_achat, prix_vente_bouteille, "
+        "prix_vente_verre, stock_actuel, unite_vente, quantite_ml, id_categorie) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+        list(products.itertuples(index=False, name=None)),
+        batch,
+    )
+    cur.execute(f"ALTER TABLE produit_sequence AUTO_INCREMENT = {len(products) + 1}")
+    # Stock initial en mouvements d'ouverture (comme la migration 003), le
+    # snapshot est recale en fin de generation par rollup_stock().
+    cur.execute(
+        "INSERT INTO mouvement_stock (id_produit, quantite, type_mouvement) "
+        "SELECT id_produit, stock_actuel, 'ajustement' FROM produit WHERE stock_actuel <> 0"
+    )
+    cur.execute("UPDATE produit SET stock_actuel = 0")
+
+
+def load_sales(cur, rng, products, categories, days, count, batch, chunk=200_000):
+    """
+    Genere et insere count lignes de vente groupees en recus.
+
+    Les recus sont tires jour par jour (poids _day_weights), 1 a 5 lignes
+    chacun; les lignes sont produites par tranches de chunk pour borner
+    la memoire.
+    """
+    lines_per_receipt = rng.choice([1, 2, 3, 4, 5], size=count, p=[0.35, 0.3, 0.2, 0.1, 0.05])
+    receipt_count = int(np.searchsorted(np.cumsum(lines_per_receipt), count)) + 1
+    lines_per_receipt = lines_per_receipt[:receipt_count]
+    lines_per_receipt[-1] -= int(lines_per_receipt.sum() - count)
+
+    day_index = np.sort(rng.choice(len(days), size=receipt_count, p=_day_weights(days)))
+    seconds = rng.integers(17 * 3600, 26 * 3600, receipt_count)
+    receipt_dates = days.to_numpy()[day_index]
+    receipt_times = pd.to_datetime(receipt_dates) + pd.to_timedelta(seconds, unit="s")
+    names = np.where(rng.random(receipt_count) < 0.15, "Client", None)
+    _insert(
+        cur,
+        "INSERT INTO recu (id_recu, date_recu, nom_client) VALUES (%s, %s, %s)",
+        list(
+            zip(
+                range(1, receipt_count + 1),
+                [value.to_pydatetime() for value in receipt_times],
+                names.tolist(),
+            )
+        ),
+        batch,
+    )
+
+    line_receipt = np.repeat(np.arange(1, receipt_count + 1), lines_per_receipt)
+    line_day = np.repeat(day_index, lines_per_receipt)
+
+    # Popularite des produits en loi de Zipf (quelques references font le volume).
+    ranks = rng.permutation(len(products)) + 1
+    popularity = 1.0 / ranks**1.1
+    popularity /= popularity.sum()
+
+    preparation_ids = categories.loc[categories["stockable"] == 0, "id_categorie"].to_numpy()
+    day_values = [value.date() for value in days]
+    # Catalogue en FCFA, sale_lines() calcule en centimes.
+    prices = products.copy()
+    for column in ("prix_achat", "prix_vente_bouteille", "prix_vente_verre"):
+        prices[column] = prices[column] * MONEY_SCALE
+    sql = (
+        "INSERT INTO vente (date_vente, quantite, montant, cout_unitaire, nom_preparation, "
+        "type_vente, id_produit, id_categorie, id_recu) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"
+    )
+
+    for start in range(0, count, chunk):
+        size = min(chunk, count - start)
+        picked = prices.iloc[rng.choice(len(prices), size=size, p=popularity)].reset_index(drop=True)
+        picked["quantite"] = rng.choice([1, 1, 1, 2, 2, 3, 4, 6], size=size)
+        verre = (picked["unite_vente"].to_numpy() == "verre") & (rng.random(size) < 0.7)
+        picked["type_vente"] = np.where(verre, "verre", "bouteille")
+        lines = sale_lines(picked)
+
+        is_preparation = rng.random(size) < 0.08 if len(preparation_ids) else np.zeros(size, dtype=bool)
+        preparation_amount = rng.integers(25, 61, size) * 100 * MONEY_SCALE
+        montant = np.where(is_preparation, preparation_amount * lines["quantite"], lines["montant"])
+        cout = np.where(is_preparation, 0, lines["cout_unitaire"])
+        id_produit = np.where(is_preparation, None, lines["id_produit"].to_numpy(dtype=object))
+        id_categorie = np.where(
+            is_preparation,
+            rng.choice(preparation_ids, size=size) if len(preparation_ids) else 0,
+            lines["id_categorie"].to_numpy(),
+        )
+        nom_preparation = np.where(is_preparation, rng.choice(PREPARATIONS, size=size), None)
+        type_vente = np.where(is_preparation, "verre", lines["type_vente"].to_numpy())
+
+        rows = list(
+            zip(
+                [day_values[index] for index in line_day[start : start + size]],
+                lines["quantite"].astype(int).tolist(),
+                (montant / MONEY_SCALE).tolist(),
+                (cout / MONEY_SCALE).tolist(),
+                nom_preparation.tolist(),
+                type_vente.tolist(),
+                id_produit.tolist(),
+                id_categorie.astype(int).tolist(),
+                line_receipt[start : start + size].tolist(),
+            )
+        )
+        _insert(cur, sql, rows, batch)
+        print(f"  vente: {start + size}/{count}", file=sys.stderr)
+    return receipt_count
+
+
+def load_entries(cur, rng, products, days, batch):
+    """Reapprovisionnement periodique (toutes les 1 a 4 semaines par produit)."""
+    rows = []
+    first, last = days[0].date(), days[-1].date()
+    for product_id in products["id_produit"]:
+        current = first + timedelta(days=int(rng.integers(0, 28)))
+        while current <= last:
+            rows.append((current, int(rng.choice([6, 12, 12, 24, 24, 48])), product_id))
+            current += timedelta(days=int(rng.integers(7, 29)))
+    _insert(
+        cur,
+        "INSERT INTO entree_stock (date_entree, quantite, id_produit) VALUES (%s, %s, %s)",
+        rows,
+        batch,
+    )
+    return len(rows)
+
+
+def load_charges(cur, rng, days, batch):
+    """Charges fixes mensuelles + 2 a 5 charges diverses par semaine."""
+    rows = []
+    for month_start in pd.date_range(days[0], days[-1], freq="MS"):
+        for type_charge, low, high in MONTHLY_CHARGES:
+            rows.append((type_charge, int(rng.integers(low, high + 1) // 500 * 500), month_start.date()))
+    misc_days = rng.choice(len(days), size=int(len(days) / 7 * 3.5))
+    for index in misc_days:
+        rows.append(
+            (
+                str(rng.choice(MISC_CHARGES)),
+                int(rng.integers(2, 80)) * 500,
+                days[index].date(),
+            )
+        )
+    _insert(
+        cur,
+        "INSERT INTO charge (type_charge, montant, date_charge) VALUES (%s, %s, %s)",
+        rows,
+        batch,
+    )
+    return len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genere la base de benchmark BarStock")
+    benchdb.add_db_arguments(parser)
+    parser.add_argument("--recreate", action="store_true", help="DROP puis CREATE de la base de bench")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--sales", type=int, default=5_000_000, help="Nombre de lignes vente")
+    parser.add_argument("--years", type=float, default=3.0, help="Historique couvert (ventes, entrees, charges)")
+    parser.add_argument("--batch", type=int, default=5000, help="Lignes par INSERT multi-lignes")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    cfg = benchdb.config_from_args(args)
+    rng = np.random.default_rng(args.seed)
+    days = _day_range(args.years)
+    started = time.perf_counter()
+
+    benchdb.load_schema(cfg, recreate=args.recreate)
+    conn = benchdb.connect(cfg)
+    try:
+        cur = conn.cursor()
+        # Chargement en masse: controles differes (les donnees sont coherentes par construction).
+        cur.execute("SET foreign_key_checks = 0")
+        cur.execute("SET unique_checks = 0")
+        cur.execute("SELECT id_categorie, libelle, stockable FROM categorie")
+        categories = pd.DataFrame(cur.fetchall(), columns=["id_categorie", "libelle", "stockable"])
+
+        products = generate_products(rng, categories, args.products)
+        load_products(cur, products, args.batch)
+        conn.commit()
+        receipts = load_sales(cur, rng, products, categories, days, args.sales, args.batch)
+        conn.commit()
+        entries = load_entries(cur, rng, products, days, args.batch)
+        charges = load_charges(cur, rng, days, args.batch)
+        conn.commit()
+        cur.execute("SET unique_checks = 1")
+        cur.execute("SET foreign_key_checks = 1")
+        cur.close()
+    finally:
+        conn.close()
+
+    benchdb.use_bench_database(cfg)
+    import data_access
+
+    summary_rows = data_access.rebuild_sales_summary()
+    stock_snapshots = data_access.rollup_stock()
+    low_stock = data_access.sync_low_stock()
+
+    print(
+        json.dumps(
+            {
+                "database": cfg["database"],
+                "generated_at": datetime.now().isoformat(timespec="seconds"),
+                "seed": args.seed,
+                "products": len(products),
+                "sales": args.sales,
+                "receipts": receipts,
+                "entries": entries,
+                "charges": charges,
+                "vente_jour": summary_rows,
+                "stock_snapshots": stock_snapshots,
+                "alerte_stock": low_stock,
+                "seconds": round(time.perf_counter() - started, 1),
+            },
+            indent=2,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+"""
+Suite de benchmark BarStock: chronometre data_access et le rendu des pages.
+
+Principe:
+- la base de bench (voir generate.py) remplace celle des secrets,
+- chaque fonction publique de data_access.py est appelee --runs fois avec
+  des arguments representatifs (cache vide avant chaque appel: on mesure
+  le SQL + la construction du DataFrame, pas le cache),
+- chaque page de streamlit_app.py est rendue en headless (AppTest), avec
+  le nombre de requetes SQL emises,
+- les ecritures (creation produit, recu, charges...) sont mesurees dans un
+  groupe separe (--skip-writes pour les ignorer) et les commandes de
+  maintenance seulement avec --with-maintenance.
+
+Le resultat est un fichier JSON stable (cles = nom de mesure) a comparer
+entre deux commits avec compare.py.
+
+Usage (depuis bar-log/):
+    python bench/run.py [--runs 5] [--output bench/results/<commit>.json]
+"""
+
+import argparse
+from datetime import date, datetime, timedelta
+import json
+from pathlib import Path
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import benchdb
+from check_vente_scans import PAGE_LABELS, install_recorder
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def _row_count(result):
+    """Nombre de lignes d'un resultat (DataFrame, Page, dict ou scalaire)."""
+    rows = getattr(result, "rows", result)
+    if hasattr(rows, "shape"):
+        return int(rows.shape[0])
+    if isinstance(rows, (list, tuple)):
+        return len(rows)
+    return None
+
+
+def _summary(samples, rows=None, **extra):
+    """Statistiques en millisecondes d'une serie de mesures."""
+    values = [sample * 1000 for sample in samples]
+    summary = {
+        "runs": len(values),
+        "median_ms": round(statistics.median(values), 3),
+        "min_ms": round(min(values), 3),
+        "max_ms": round(max(values), 3),
+    }
+    if rows is not None:
+        summary["rows"] = rows
+    summary.update(extra)
+    return summary
+
+
+def time_call(data_access, func, args, kwargs, runs):
+    """Chronometre func(*args, **kwargs) runs fois, cache invalide avant chaque appel."""
+    samples = []
+    result = None
+    for _ in range(runs):
+        data_access.invalidate_cache()
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        samples.append(time.perf_counter() - started)
+    return _summary(samples, _row_count(result))
+
+
+def _reference_values(data_access):
+    """Arguments representatifs tires de la base (produit populaire, categorie, periodes)."""
+    today = date.today()
+    top = data_access.fetch_one(
+        """
+        SELECT id_produit, id_categorie
+        FROM vente_jour
+        WHERE id_produit <> '' AND date_vente >= %s
+        GROUP BY id_produit, id_categorie
+        ORDER BY SUM(quantite) DESC
+        LIMIT 1
+        """,
+        (today - timedelta(days=30),),
+    ) or data_access.fetch_one("SELECT id_produit, id_categorie FROM produit LIMIT 1")
+    preparation = data_access.fetch_one(
+        "SELECT id_categorie FROM categorie WHERE stockable = 0 ORDER BY id_categorie LIMIT 1"
+    )
+    return {
+        "today": today,
+        "month_start": today.replace(day=1),
+        "year_start": today - timedelta(days=365),
+        "all_start": today - timedelta(days=365 * 10),
+        "product_id": top["id_produit"] if top else None,
+        "category_id": top["id_categorie"] if top else None,
+        "preparation_category_id": preparation["id_categorie"] if preparation else None,
+    }
+
+
+def read_cases(ref):
+    """Lectures mesurees: (nom, fonction data_access, args, kwargs)."""
+    today = ref["today"]
+    month = (ref["month_start"], today)
+    year = (ref["year_start"], today)
+    return [
+        ("list_categories", "list_categories", (), {}),
+        ("list_categories_stockable", "list_categories", (), {"stockable": True}),
+        ("list_receipts", "list_receipts", (), {}),
+        ("list_products", "list_products", (), {}),
+        ("list_products_page", "list_products", (), {"limit": 50}),
+        ("count_products", "count_products", (), {}),
+        ("list_entries_month_page", "list_entries", month, {"limit": 50}),
+        ("list_entries_product_year_page", "list_entries", year + (ref["product_id"],), {"limit": 50}),
+        ("count_entries_month", "count_entries", month, {}),
+        ("list_sales_month_page", "list_sales", month, {"limit": 50}),
+        ("list_sales_month", "list_sales", month, {}),
+        ("list_sales_category_year_page", "list_sales", year, {"category_id": ref["category_id"], "limit": 50}),
+        ("count_sales_month", "count_sales", month, {}),
+        ("count_sales_year", "count_sales", year, {}),
+        ("list_charges_year", "list_charges", year, {}),
+        ("get_sales_totals_month", "get_sales_totals", month, {}),
+        ("get_sales_totals_all", "get_sales_totals", (ref["all_start"], today), {}),
+        ("sales_by_day_month", "sales_by_day", month, {}),
+        ("sales_by_month_year", "sales_by_month", year, {}),
+        ("get_charge_total_year", "get_charge_total", year, {}),
+        ("list_low_stock", "list_low_stock", (), {}),
+        ("get_stock_at_now", "get_stock_at", (ref["product_id"], datetime.now()), {}),
+    ]
+
+
+def run_reads(data_access, ref, runs):
+    """Mesure toutes les lectures de read_cases()."""
+    results = {}
+    for name, func_name, args, kwargs in read_cases(ref):
+        results[name] = time_call(data_access, getattr(data_access, func_name), args, kwargs, runs)
+        print(f"  {name}: {results[name]['median_ms']} ms", file=sys.stderr)
+    return results
+
+
+def _timed(results, name, func, *args, **kwargs):
+    """Mesure un appel unique d'ecriture et retourne son resultat."""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    results[name] = _summary([time.perf_counter() - started])
+    return result
+
+
+def run_writes(data_access, ref, runs):
+    """
+    Mesure les ecritures sur des donnees dediees au bench.
+
+    Chaque iteration cree un produit, l'approvisionne, le vend (ligne a ligne,
+    recu complet, preparation) puis cree/modifie/supprime une charge. Les
+    lignes ajoutees restent dans la base de bench (volume negligeable).
+    Montants en centimes (money.py).
+    """
+    samples = {}
+    today = ref["today"]
+    for iteration in range(runs):
+        step = {}
+        name = f"Bench {datetime.now():%H%M%S} {iteration}"
+        category_id = ref["category_id"]
+        product_id = _timed(
+            step, "create_product", data_access.create_product,
+            name, category_id, 100_000, 200_000, 30_000, 100, "bouteille", 750,
+        )
+        _timed(
+            step, "update_product", data_access.update_product,
+            product_id, name, category_id, 100_000, 200_000, 30_000, 100, "verre", 750,
+        )
+        _timed(
+            step, "add_stock_entry", data_access.add_stock_entry,
+            product_id, 24, today, 100_000, 200_000, "bouteille",
+        )
+        receipt_id = _timed(step, "create_receipt", data_access.create_receipt, "Bench")
+        _timed(
+            step, "add_sale_stockable", data_access.add_sale_stockable,
+            product_id, 1, today, "bouteille", receipt_id,
+        )
+        items = [
+            {"product_id": product_id, "quantite": 2, "date_vente": today, "unite_vente": "bouteille"},
+            {"product_id": product_id, "quantite": 3, "date_vente": today, "unite_vente": "verre"},
+        ]
+        _timed(step, "commit_receipt", data_access.commit_receipt, items, "Bench")
+        if ref["preparation_category_id"]:
+            _timed(
+                step,
+                "add_sale_non_stockable",
+                data_access.add_sale_non_stockable,
+                ref["preparation_category_id"],
+                "Mojito",
+                1,
+                350_000,
+                today,
+                "verre",
+                receipt_id,
+            )
+        _timed(step, "add_charge", data_access.add_charge, "Bench", 100_000, today)
+        charge = data_access.fetch_one("SELECT MAX(id_charge) AS id_charge FROM charge WHERE type_charge = 'Bench'")
+        _timed(step, "update_charge", data_access.update_charge, charge["id_charge"], "Bench", 150_000, today)
+        _timed(step, "delete_charge", data_access.delete_charge, charge["id_charge"])
+        tmp_id = data_access.create_product(name + " tmp", category_id)
+        _timed(step, "delete_product", data_access.delete_product, tmp_id)
+        for key, value in step.items():
+            samples.setdefault(key, []).append(value["median_ms"] / 1000)
+    return {key: _summary(values) for key, values in samples.items()}
+
+
+def run_maintenance(data_access, ref):
+    """Mesure les commandes de maintenance (une execution chacune)."""
+    results = {}
+    _timed(
+        results, "rebuild_sales_summary_month", data_access.rebuild_sales_summary,
+        ref["month_start"], ref["today"],
+    )
+    _timed(results, "backfill_unit_costs_missing", data_access.backfill_unit_costs, only_missing=True)
+    _timed(results, "rollup_stock", data_access.rollup_stock)
+    return results
+
+
+def run_pages(data_access, runs):
+    """Rend chaque page en headless et mesure temps de rendu + requetes SQL."""
+    from streamlit.testing.v1 import AppTest
+
+    log = []
+    original = install_recorder(log)
+    results = {}
+    try:
+        for label in PAGE_LABELS:
+            samples = []
+            queries = 0
+            exceptions = []
+            for _ in range(runs):
+                data_access.invalidate_cache()
+                del log[:]
+                at = AppTest.from_file(str(benchdb.APP_DIR / "streamlit_app.py"), default_timeout=600)
+                at.session_state["main_navigation"] = label
+                started = time.perf_counter()
+                at.run()
+                samples.append(time.perf_counter() - started)
+                queries = len(log)
+                exceptions = [str(exc.value) for exc in at.exception]
+            results[label] = _summary(
+                samples,
+                queries=queries,
+                sql_ms=round(sum(entry["seconds"] for entry in log) * 1000, 3),
+                exceptions=exceptions,
+            )
+            print(f"  page {label}: {results[label]['median_ms']} ms", file=sys.stderr)
+    finally:
+        data_access.db_cursor = original
+    return results
+
+
+def _git_revision():
+    """Commit courant (+ marqueur si l'arbre de travail est modifie)."""
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=benchdb.APP_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=benchdb.APP_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{revision}-dirty" if dirty else revision
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark data_access + pages BarStock")
+    benchdb.add_db_arguments(parser)
+    parser.add_argument("--runs", type=int, default=5, help="Repetitions par fonction")
+    parser.add_argument("--page-runs", type=int, default=3, help="Repetitions par page")
+    parser.add_argument("--skip-writes", action="store_true")
+    parser.add_argument("--skip-pages", action="store_true")
+    parser.add_argument("--with-maintenance", action="store_true")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Fichier JSON (defaut bench/results/<commit>.json)",
+    )
+    args = parser.parse_args(argv)
+
+    cfg = benchdb.config_from_args(args)
+    benchdb.use_bench_database(cfg)
+    import data_access
+
+    revision = _git_revision()
+    server = data_access.fetch_one("SELECT VERSION() AS version")
+    ref = _reference_values(data_access)
+
+    results = {
+        "meta": {
+            "revision": revision,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "server": server["version"] if server else None,
+            "database": cfg["database"],
+            "volumes": benchdb.table_counts(cfg),
+            "runs": args.runs,
+            "page_runs": args.page_runs,
+        },
+        "functions": run_reads(data_access, ref, args.runs),
+    }
+    if not args.skip_writes:
+        results["writes"] = run_writes(data_access, ref, args.runs)
+    if args.with_maintenance:
+        results["maintenance"] = run_maintenance(data_access, ref)
+    if not args.skip_pages:
+        results["pages"] = run_pages(data_access, args.page_runs)
+
+    output = args.output or RESULTS_DIR / f"{revision}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
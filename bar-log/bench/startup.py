@@ -0,0 +1,146 @@
+"""
+Benchmark de demarrage a froid: time-to-first-paint du tableau de bord.
+
+Chaque mesure tourne dans un process Python neuf (imports froids), comme
+la premiere session apres le lancement du serveur Streamlit:
+- streamlit est deja importe (c'est le serveur), le chronometre demarre
+  au lancement du script streamlit_app.py,
+- first_element: premier element envoye au navigateur (theme, sidebar),
+- first_paint: envoi du titre de la page demandee (premier contenu visible),
+- first_run: fin du premier rendu complet (requetes SQL comprises),
+- pandas_at_first_paint: pandas etait-il deja importe au moment du titre.
+
+Pour comparer deux versions, lancer le script sur chaque arbre (--app) ou
+sur chaque commit, puis bench/compare.py sur les deux JSON.
+
+Usage (depuis bar-log/, base de bench configuree comme pour run.py):
+    python bench/startup.py [--runs 5] [--app ../autre-arbre/bar-log/streamlit_app.py]
+"""
+
+import argparse
+import json
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import time
+
+import benchdb
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def _child(args):
+    """Une mesure dans ce process (appele par le parent avec --child)."""
+    app_path = Path(args.app).resolve()
+    sys.path.insert(0, str(app_path.parent))
+    benchdb.use_bench_database(benchdb.config_from_args(args))
+
+    from streamlit.runtime.scriptrunner.script_runner import ScriptRunner
+    from streamlit.testing.v1 import AppTest
+
+    marks = {}
+    original = ScriptRunner._enqueue_forward_msg
+
+    def recording_enqueue(self, msg):
+        if msg.HasField("delta"):
+            now = time.perf_counter()
+            marks.setdefault("first_element", now)
+            body = msg.delta.new_element.markdown.body
+            if "first_paint" not in marks and "class='page-title'" in body:
+                marks["first_paint"] = now
+                marks["pandas_at_first_paint"] = "pandas" in sys.modules
+        return original(self, msg)
+
+    ScriptRunner._enqueue_forward_msg = recording_enqueue
+    at = AppTest.from_file(str(app_path), default_timeout=600)
+    at.session_state["main_navigation"] = args.page
+    started = time.perf_counter()
+    at.run()
+    finished = time.perf_counter()
+
+    result = {
+        "first_element_ms": (marks.get("first_element", finished) - started) * 1000,
+        "first_paint_ms": (marks.get("first_paint", finished) - started) * 1000,
+        "first_run_ms": (finished - started) * 1000,
+        "pandas_at_first_paint": marks.get("pandas_at_first_paint"),
+        "exceptions": [str(exc.value) for exc in at.exception],
+    }
+    print(json.dumps(result))
+    return 0
+
+
+def _measure(script_args):
+    """Lance une mesure dans un process neuf et retourne son resultat."""
+    completed = subprocess.run(
+        [sys.executable, __file__, "--child"] + script_args,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time-to-first-paint BarStock (demarrage a froid)")
+    benchdb.add_db_arguments(parser)
+    parser.add_argument("--app", default=str(benchdb.APP_DIR / "streamlit_app.py"))
+    parser.add_argument("--page", default="Tableau de bord")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        return _child(args)
+
+    script_args = [
+        "--host", args.host,
+        "--port", str(args.port),
+        "--user", args.user,
+        "--password", args.password,
+        "--database", args.database,
+        "--app", args.app,
+        "--page", args.page,
+    ]
+    runs = [_measure(script_args) for _ in range(args.runs)]
+    for run in runs:
+        print(
+            f"  first_paint {run['first_paint_ms']:.0f} ms, first_run {run['first_run_ms']:.0f} ms",
+            file=sys.stderr,
+        )
+
+    startup = {}
+    for key in ("first_element_ms", "first_paint_ms", "first_run_ms"):
+        values = [run[key] for run in runs]
+        startup[f"{args.page} {key[:-3]}"] = {
+            "runs": len(values),
+            "median_ms": round(statistics.median(values), 3),
+            "min_ms": round(min(values), 3),
+            "max_ms": round(max(values), 3),
+        }
+
+    app_dir = Path(args.app).resolve().parent
+    revision = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], cwd=app_dir, capture_output=True, text=True
+    ).stdout.strip() or "unknown"
+    results = {
+        "meta": {
+            "revision": revision,
+            "app": str(Path(args.app).resolve()),
+            "database": args.database,
+            "runs": args.runs,
+            "pandas_at_first_paint": [run["pandas_at_first_paint"] for run in runs],
+            "exceptions": sorted({exc for run in runs for exc in run["exceptions"]}),
+        },
+        "startup": startup,
+    }
+    output = args.output or RESULTS_DIR / f"startup-{revision}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
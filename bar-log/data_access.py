@@ -9,14 +9,190 @@ Architecture d'interaction:
 - ce module utilise db.db_cursor() pour gerer connexions + transactions.
 - ui.py ne fait pas d'acces SQL: il consomme seulement les DataFrame/valeurs
   que ce module retourne.
+- les lectures catalogue (produits, categories) passent par un cache process
+  invalide par les ecritures qui les modifient, avec un TTL de securite.
+- le stock est un ledger append-only (mouvement_stock): stock courant =
+  snapshot produit.stock_actuel + mouvements posterieurs au snapshot,
+  recale periodiquement par rollup_stock().
 """
 
+import base64
+from collections import deque, namedtuple
 from datetime import datetime
-from decimal import Decimal
+from functools import wraps
+from operator import itemgetter
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from db import db_cursor, describe_columns, is_duplicate_error, is_transient_error
+from margin import margin_sql, unit_cost, unit_cost_sql
+from money import MONEY_COLUMNS, MONEY_SCALE, to_cents, to_cents_array, to_decimal
+import query_log
+
+# Duree de vie max d'une entree du cache (filet de securite si une ecriture
+# externe a l'app modifie le catalogue).
+CACHE_TTL_SECONDS = 300
+
+# Cache process: (fonction, args, kwargs) -> (expiration, DataFrame).
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+# Incremente a chaque invalidation: un resultat lu avant une invalidation
+# n'est jamais stocke apres elle.
+_CACHE_GENERATION = 0
+_CACHE_STATS = {"hits": 0, "misses": 0, "invalidations": 0}
+# Version des totaux ventes/charges: incrementee par chaque ecriture de vente
+# ou de charge du process (cf. totals_version(), lue par kpi.py).
+_TOTALS_GENERATION = 0
+
+# Roll-up opportuniste du stock: lance en tache de fond tous les N
+# mouvements ecrits par ce process (0 = uniquement via maintenance.py).
+ROLLUP_EVERY_MOVEMENTS = 500
+_MOVEMENTS_LOCK = threading.Lock()
+_MOVEMENTS_SINCE_ROLLUP = 0
+_ROLLUP_RUNNING = threading.Lock()
+
+# Controle du stock des ventes stockables: "ledger" (sans verrou),
+# "pessimiste" (FOR UPDATE) ou "optimiste" (ecriture conditionnelle).
+SALE_MODES = ("ledger", "pessimiste", "optimiste")
+SALE_MODE = os.getenv("BARLOG_SALE_MODE", "ledger")
+# Reprises sur deadlock / lock wait timeout (backoff exponentiel borne).
+SALE_MAX_ATTEMPTS = 5
+SALE_RETRY_BASE_SECONDS = 0.02
+SALE_RETRY_MAX_SECONDS = 0.5
+_SALE_STATS = {"transactions": 0, "retries": 0, "conflicts": 0, "oversells": 0}
+_SALE_STATS_LOCK = threading.Lock()
+# Survente constatees en mode ledger (stock negatif apres une vente): les
+# derniers cas sont gardes en memoire (cf. recent_oversells()).
+OVERSELL_HISTORY = 50
+_OVERSELLS = deque(maxlen=OVERSELL_HISTORY)
+# Quantite maximale d'une ligne de vente (saisie caisse, rejeu du journal).
+MAX_SALE_QUANTITY = 10000
+
+# Stock courant d'un produit (alias p): snapshot + mouvements posterieurs.
+# Sous-requete couverte par idx_mouvement_produit, quelques lignes apres
+# un roll-up.
+_CURRENT_STOCK_SQL = """CAST(p.stock_actuel + COALESCE((
+            SELECT SUM(m.quantite)
+            FROM mouvement_stock m
+            WHERE m.id_produit = p.id_produit
+              AND m.id_mouvement > p.id_mouvement_snapshot
+        ), 0) AS SIGNED)"""
+
+# Colonnes texte a faible cardinalite construites en category (fetch_frame).
+CATEGORICAL_COLUMNS = ("categorie", "type_vente")
+
+# Seuil d'alerte stock d'un nouveau produit (produit.seuil_alerte).
+DEFAULT_SEUIL_ALERTE = 5
+
+# Lignes lues par fetchmany() dans stream_rows() (exports).
+EXPORT_CHUNK_ROWS = 5000
+
+# Resultat pagine (keyset): rows = DataFrame de la page, curseurs opaques
+# vers la page suivante/precedente (None si pas de page dans ce sens).
+Page = namedtuple("Page", ["rows", "next_cursor", "prev_cursor"])
+
+
+def _copy_result(result):
+    """Copie un resultat de cache (DataFrame, Page ou valeur immuable)."""
+    if isinstance(result, Page):
+        return result._replace(rows=result.rows.copy())
+    # DataFrame (pandas n'est pas importe ici: voir fetch_df()).
+    if hasattr(result, "copy"):
+        return result.copy()
+    return result
+
+
+def _cached(func):
+    """
+    Decorateur de cache TTL pour les lectures catalogue.
+
+    - cle = nom de fonction + parametres,
+    - retourne une copie du resultat (les pages peuvent le modifier),
+    - invalide explicitement par invalidate_cache().
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        with _CACHE_LOCK:
+            entry = _CACHE.get(key)
+            if entry is not None and entry[0] > now:
+                _CACHE_STATS["hits"] += 1
+                return _copy_result(entry[1])
+            _CACHE_STATS["misses"] += 1
+            generation = _CACHE_GENERATION
+        result = func(*args, **kwargs)
+        with _CACHE_LOCK:
+            if generation == _CACHE_GENERATION:
+                _CACHE[key] = (now + CACHE_TTL_SECONDS, result)
+        return _copy_result(result)
+
+    return wrapper
+
+
+def invalidate_cache():
+    """
+    Vide le cache catalogue.
+
+    Appelee par chaque ecriture qui touche produit/categorie/stock.
+    """
+    global _CACHE_GENERATION
+    with _CACHE_LOCK:
+        _CACHE.clear()
+        _CACHE_GENERATION += 1
+        _CACHE_STATS["invalidations"] += 1
+
+
+def catalogue_version():
+    """
+    Version du catalogue: change a chaque invalidate_cache().
+
+    Permet aux structures derivees de list_products() (index de recherche)
+    de savoir qu'elles doivent etre reconstruites.
+    """
+    with _CACHE_LOCK:
+        return _CACHE_GENERATION
+
+
+def _note_totals_change():
+    """Signale une ecriture qui modifie les totaux ventes/charges."""
+    global _TOTALS_GENERATION
+    with _CACHE_LOCK:
+        _TOTALS_GENERATION += 1
+
+
+def totals_version():
+    """
+    Version des totaux: change a chaque vente ou charge ecrite par ce process.
+
+    Permet a kpi.py de recalculer les KPI du jour des l'ecriture suivante
+    au lieu d'attendre son prochain controle periodique.
+    """
+    with _CACHE_LOCK:
+        return _TOTALS_GENERATION
+
 
-import pandas as pd
+def cache_stats():
+    """Retourne les compteurs du cache (hits, misses, ratio, entrees)."""
+    with _CACHE_LOCK:
+        stats = dict(_CACHE_STATS)
+        stats["entries"] = len(_CACHE)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
 
-from db import db_cursor
+
+def _cents_row(row):
+    """Convertit en centimes (int) les montants MONEY_COLUMNS d'une ligne dict."""
+    if row:
+        for name in MONEY_COLUMNS.intersection(row):
+            row[name] = to_cents(row[name])
+    return row
 
 
 def fetch_df(query, params=None):
@@ -24,23 +200,127 @@ def fetch_df(query, params=None):
     Execute une requete SQL et retourne un DataFrame pandas.
 
     Utilise par la plupart des fonctions list_* et par pages/reports.py
-    pour des aggregations SQL ad-hoc.
+    pour des aggregations SQL ad-hoc. Les colonnes MONEY_COLUMNS sont
+    converties en centimes int64 (money.py).
+    pandas n'est importe qu'ici, au premier DataFrame demande (demarrage
+    a froid plus rapide pour les pages qui n'en affichent pas).
     """
+    import pandas as pd
+
     with db_cursor() as (_, cur):
         cur.execute(query, params or ())
         rows = cur.fetchall()
-    return pd.DataFrame(rows)
+        started = time.perf_counter()
+        # Colonnes du resultat meme sans ligne: les pages lisent df["..."].
+        df = pd.DataFrame(rows, columns=[column[0] for column in cur.description or ()])
+        for name in MONEY_COLUMNS.intersection(df.columns):
+            df[name] = to_cents_array(df[name].to_numpy())
+        query_log.note_build(cur, time.perf_counter() - started)
+    return df
+
+
+def _frame_from_rows(columns, rows):
+    """
+    Construit un DataFrame colonne par colonne depuis des tuples.
+
+    columns: describe_columns() du resultat. Types produits:
+    - entiers: int64 (Int64 nullable si NULL),
+    - MONEY_COLUMNS: int64 en centimes (x MONEY_SCALE, NULL -> 0),
+    - autres DECIMAL (sommes de quantites...): float64,
+    - CATEGORICAL_COLUMNS: category, autres textes: object,
+    - dates: objets date/datetime (comme fetch_df()).
+    """
+    import numpy as np
+    import pandas as pd
+
+    count = len(rows)
+    data = {}
+    for position, (name, kind) in enumerate(columns):
+        # Une colonne = un passage sur les tuples (zip(*rows) copie tout le resultat).
+        column = map(itemgetter(position), rows)
+        if kind in ("int", "decimal", "float"):
+            try:
+                values = np.fromiter(column, dtype="int64" if kind == "int" else "float64", count=count)
+            except TypeError:
+                # NULL dans la colonne: conversion tolerante, plus lente.
+                values = [row[position] for row in rows]
+                if kind == "int":
+                    data[name] = pd.array(values, dtype="Int64")
+                    continue
+                values = np.array(values, dtype="float64")
+            if name in MONEY_COLUMNS:
+                # Decimal -> float64 -> centimes: exact tant que |montant| < 2**53 / 100.
+                values = np.rint(np.nan_to_num(values) * MONEY_SCALE).astype("int64")
+            data[name] = values
+        elif name in CATEGORICAL_COLUMNS:
+            data[name] = pd.Categorical(list(column))
+        else:
+            data[name] = np.array(list(column), dtype=object)
+    return pd.DataFrame(data, columns=[name for name, _ in columns], copy=False)
+
+
+def fetch_frame(query, params=None):
+    """
+    Variante colonnes de fetch_df() pour les gros resultats.
+
+    Lit des tuples (pas un dict par ligne) et construit chaque colonne
+    directement avec son dtype (cf. _frame_from_rows): montants en
+    centimes int64, categorie / type_vente en category.
+    """
+    with db_cursor(dictionary=False) as (_, cur):
+        cur.execute(query, params or ())
+        rows = cur.fetchall()
+        started = time.perf_counter()
+        df = _frame_from_rows(describe_columns(cur.description), rows)
+        query_log.note_build(cur, time.perf_counter() - started)
+    return df
 
 
 def fetch_one(query, params=None):
     """
     Execute une requete SQL et retourne une seule ligne (dict) ou None.
 
-    Utilise pour les KPI (totaux) et les lectures ponctuelles.
+    Utilise pour les KPI (totaux) et les lectures ponctuelles; les
+    montants MONEY_COLUMNS sont retournes en centimes (int).
     """
     with db_cursor() as (_, cur):
         cur.execute(query, params or ())
-        return cur.fetchone()
+        return _cents_row(cur.fetchone())
+
+
+def stream_rows(query, params=None, chunk_size=None):
+    """
+    Execute une requete et produit son resultat par paquets de tuples.
+
+    Generateur de (colonnes, lignes): colonnes = describe_columns() du
+    resultat, lignes = au plus chunk_size tuples (fetchmany sur un cursor
+    non bufferise: le serveur envoie les lignes au fil de la lecture, la
+    memoire reste bornee a un paquet). Un premier paquet est toujours
+    produit, vide si la requete ne retourne rien.
+
+    Utilise par export.py (exports CSV/Parquet). Si le consommateur
+    s'arrete avant la fin (erreur d'ecriture, generateur ferme), les lignes
+    non lues sont jetees et la transaction annulee avant de rendre la
+    connexion au pool.
+    """
+    chunk_size = chunk_size or EXPORT_CHUNK_ROWS
+    with db_cursor(dictionary=False) as (conn, cur):
+        cur.execute(query, params or ())
+        columns = describe_columns(cur.description)
+        try:
+            rows = cur.fetchmany(chunk_size)
+            yield columns, rows
+            while rows:
+                rows = cur.fetchmany(chunk_size)
+                if rows:
+                    yield columns, rows
+        except GeneratorExit:
+            # GeneratorExit n'est pas une Exception: db_cursor() ne ferait
+            # pas de rollback et la connexion reviendrait avec un resultat
+            # non lu ("Unread result found").
+            conn.consume_results()
+            conn.rollback()
+            raise
 
 
 def exec_query(query, params=None):
@@ -53,6 +333,92 @@ def exec_query(query, params=None):
         cur.execute(query, params or ())
 
 
+def _where(filters):
+    """Assemble une clause WHERE (vide si aucun filtre)."""
+    return " WHERE " + " AND ".join(filters) if filters else ""
+
+
+def _cursor_value(value):
+    """Rend une valeur de cle serialisable (numpy -> python, date -> iso)."""
+    if hasattr(value, "item"):
+        value = value.item()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def _encode_cursor(direction, values):
+    """Encode un curseur opaque: sens de lecture + valeurs de cle."""
+    payload = json.dumps([direction, [_cursor_value(value) for value in values]])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor):
+    """Decode un curseur produit par _encode_cursor()."""
+    try:
+        direction, values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as exc:
+        raise ValueError("Curseur de pagination invalide") from exc
+    if direction not in ("next", "prev"):
+        raise ValueError("Curseur de pagination invalide")
+    return direction, values
+
+
+def _keyset_page(query, filters, params, order_columns, key_fields, descending, cursor, limit, fetch=None):
+    """
+    Execute une requete en pagination par cle (keyset) et retourne une Page.
+
+    - order_columns: colonnes SQL de tri, la derniere doit etre unique
+      (ex: ("e.date_entree", "e.id_entree")),
+    - key_fields: noms des memes colonnes dans le resultat,
+    - descending: sens d'affichage (DESC pour les historiques),
+    - fetch: fonction de lecture (fetch_df par defaut, fetch_frame).
+
+    Le cout ne depend que de la taille de page (WHERE cle < curseur +
+    LIMIT), pas de la profondeur de l'historique comme un OFFSET.
+    """
+    filters = list(filters)
+    params = list(params)
+    direction, values = _decode_cursor(cursor) if cursor else ("next", None)
+    forward = direction == "next"
+    # En avant on lit dans l'ordre d'affichage, en arriere dans l'ordre inverse.
+    scan_ascending = forward != descending
+    operator = ">" if scan_ascending else "<"
+
+    if values is not None:
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y), forme indexable.
+        first, last = order_columns
+        filters.append(f"({first} {operator} %s OR ({first} = %s AND {last} {operator} %s))")
+        params.extend([values[0], values[0], values[1]])
+
+    order = "ASC" if scan_ascending else "DESC"
+    query += _where(filters)
+    query += " ORDER BY " + ", ".join(f"{column} {order}" for column in order_columns)
+    query += " LIMIT %s"
+    # Une ligne de plus pour savoir s'il existe une page au-dela.
+    params.append(limit + 1)
+
+    rows = (fetch or fetch_df)(query, params)
+    has_more = len(rows) > limit
+    rows = rows.iloc[:limit]
+    if not forward:
+        rows = rows.iloc[::-1]
+    rows = rows.reset_index(drop=True)
+    if rows.empty:
+        return Page(rows, None, None)
+
+    first_key = [rows.iloc[0][field] for field in key_fields]
+    last_key = [rows.iloc[-1][field] for field in key_fields]
+    if forward:
+        next_cursor = _encode_cursor("next", last_key) if has_more else None
+        prev_cursor = _encode_cursor("prev", first_key) if values is not None else None
+    else:
+        next_cursor = _encode_cursor("next", last_key)
+        prev_cursor = _encode_cursor("prev", first_key) if has_more else None
+    return Page(rows, next_cursor, prev_cursor)
+
+
+@_cached
 def list_categories(stockable=None):
     """
     Retourne les categories.
@@ -95,7 +461,8 @@ def create_receipt(nom_client=None):
     """
     Cree un recu et retourne son id.
 
-    Appelee dans pages/sales.py avant d'inserer les lignes de vente.
+    Saisie ligne a ligne (avec add_sale_stockable); pages/sales.py utilise
+    commit_receipt() qui cree le recu dans la meme transaction que les ventes.
     """
     with db_cursor() as (_, cur):
         cur.execute(
@@ -108,7 +475,8 @@ def create_receipt(nom_client=None):
         return cur.lastrowid
 
 
-def list_products():
+@_cached
+def list_products(cursor=None, limit=None):
     """
     Retourne le catalogue produit avec categorie jointe.
 
@@ -117,24 +485,191 @@ def list_products():
     - pages/entries.py
     - pages/sales.py
     - pages/dashboard.py (stock faible via autre fonction)
+
+    Sans limit: DataFrame complet (selectbox, edition).
+    Avec limit: Page keyset triee par (nom_produit, id_produit), cursor
+    etant un curseur opaque renvoye par un appel precedent.
     """
-    return fetch_df(
-        """
+    query = """
         SELECT p.id_produit,
                p.nom_produit,
                c.libelle AS categorie,
                p.prix_achat,
                p.prix_vente_bouteille,
                p.prix_vente_verre,
-               p.stock_actuel,
+               """ + _CURRENT_STOCK_SQL + """ AS stock_actuel,
                p.unite_vente,
                p.id_categorie,
-               p.quantite_ml
+               p.quantite_ml,
+               p.seuil_alerte
         FROM produit p
         JOIN categorie c ON p.id_categorie = c.id_categorie
-        ORDER BY p.nom_produit
         """
+    if limit is not None:
+        return _keyset_page(
+            query,
+            [],
+            [],
+            ("p.nom_produit", "p.id_produit"),
+            ("nom_produit", "id_produit"),
+            descending=False,
+            cursor=cursor,
+            limit=limit,
+        )
+    return fetch_df(query + " ORDER BY p.nom_produit, p.id_produit")
+
+
+@_cached
+def count_products():
+    """Retourne le nombre total de produits (pied de pagination)."""
+    row = fetch_one("SELECT COUNT(*) AS total FROM produit")
+    return int(row["total"]) if row else 0
+
+
+def _insert_movements(cur, movements):
+    """
+    Ajoute des mouvements au ledger mouvement_stock.
+
+    movements: iterable de (id_produit, quantite signee, type_mouvement,
+    id_entree, id_recu). Execute dans la transaction de l'ecriture metier
+    (meme cursor). Retourne le nombre de mouvements inseres.
+    """
+    movements = list(movements)
+    if not movements:
+        return 0
+    params = []
+    for movement in movements:
+        params.extend(movement)
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(movements))
+    cur.execute(
+        f"""
+        INSERT INTO mouvement_stock (
+            id_produit,
+            quantite,
+            type_mouvement,
+            id_entree,
+            id_recu
+        )
+        VALUES {placeholders}
+        """,
+        params,
+    )
+    return len(movements)
+
+
+def _current_stocks(cur, product_ids):
+    """Stock courant (snapshot + delta) des produits demandes: {id: stock}."""
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cur.execute(
+        f"""
+        SELECT p.id_produit, {_CURRENT_STOCK_SQL} AS stock_actuel
+        FROM produit p
+        WHERE p.id_produit IN ({placeholders})
+        """,
+        list(product_ids),
+    )
+    return {row["id_produit"]: int(row["stock_actuel"]) for row in cur.fetchall()}
+
+
+def _stock_levels(cur, product_ids):
+    """Stock courant et seuil d'alerte (lecture sans verrou): {id: (stock, seuil)}."""
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cur.execute(
+        f"""
+        SELECT p.id_produit, {_CURRENT_STOCK_SQL} AS stock_actuel, p.seuil_alerte
+        FROM produit p
+        WHERE p.id_produit IN ({placeholders})
+        """,
+        list(product_ids),
     )
+    return {
+        row["id_produit"]: (int(row["stock_actuel"]), int(row["seuil_alerte"]))
+        for row in cur.fetchall()
+    }
+
+
+def _flag_low_stock(cur, levels):
+    """
+    Met a jour alerte_stock dans la transaction de cur, par cle primaire.
+
+    levels: {id_produit: (stock, seuil)} deja connus de l'appelant. Un
+    produit sous son seuil entre dans l'ensemble (un produit deja en alerte
+    garde sa date d'entree et son etat de notification), un produit
+    au-dessus en sort. Aucune lecture de mouvement_stock ici: pas de verrou
+    sur le ledger, les ventes d'un meme produit ne s'attendent pas.
+    """
+    low = []
+    high = []
+    for product_id in sorted(levels):
+        stock, seuil = levels[product_id]
+        if stock <= seuil:
+            low.append((product_id, stock, seuil))
+        else:
+            high.append(product_id)
+    if high:
+        cur.execute(
+            f"DELETE FROM alerte_stock WHERE id_produit IN ({', '.join(['%s'] * len(high))})",
+            high,
+        )
+    if low:
+        params = []
+        for row in low:
+            params.extend(row)
+        cur.execute(
+            f"""
+            INSERT INTO alerte_stock (id_produit, stock, seuil)
+            VALUES {", ".join(["(%s, %s, %s)"] * len(low))}
+            ON DUPLICATE KEY UPDATE seuil = VALUES(seuil)
+            """,
+            params,
+        )
+
+
+def _flag_sale_crossings(cur, totals, products):
+    """
+    Ajoute a alerte_stock les produits qu'une vente fait passer sous leur seuil.
+
+    Calcule depuis le stock lu par _read_sale_products(): une vente ne fait
+    que baisser le stock, seuls les franchissements du seuil ecrivent (une
+    ligne par cle primaire). Deux ventes simultanees qui franchissent le
+    seuil ensemble peuvent ne pas le voir: sync_low_stock() rattrape.
+    """
+    levels = {}
+    for product_id, quantite in totals.items():
+        row = products[product_id]
+        before, seuil = row["stock_actuel"], int(row["seuil_alerte"])
+        if before > seuil >= before - quantite:
+            levels[product_id] = (before - quantite, seuil)
+    _flag_low_stock(cur, levels)
+
+
+def _note_movements(count):
+    """
+    Compte les mouvements ecrits et lance un roll-up en tache de fond tous
+    les ROLLUP_EVERY_MOVEMENTS (un seul a la fois, jamais sur le chemin de
+    la requete).
+    """
+    global _MOVEMENTS_SINCE_ROLLUP
+    if ROLLUP_EVERY_MOVEMENTS <= 0 or not count:
+        return
+    with _MOVEMENTS_LOCK:
+        _MOVEMENTS_SINCE_ROLLUP += count
+        if _MOVEMENTS_SINCE_ROLLUP < ROLLUP_EVERY_MOVEMENTS:
+            return
+        _MOVEMENTS_SINCE_ROLLUP = 0
+    if not _ROLLUP_RUNNING.acquire(blocking=False):
+        return
+    threading.Thread(target=_background_rollup, name="barlog-rollup-stock", daemon=True).start()
+
+
+def _background_rollup():
+    """Roll-up opportuniste; un echec laisse simplement un delta plus long."""
+    try:
+        rollup_stock()
+    except Exception as exc:
+        print(f"roll-up du stock en echec: {exc}", file=sys.stderr)
+    finally:
+        _ROLLUP_RUNNING.release()
 
 
 def create_product(
@@ -145,39 +680,61 @@ def create_product(
     prix_vente_verre=0,
     stock_actuel=0,
     unite_vente="bouteille",
-    quantite_ml=0
+    quantite_ml=0,
+    seuil_alerte=DEFAULT_SEUIL_ALERTE,
 ):
     """
-    Cree un nouveau produit.
+    Cree un nouveau produit et retourne son id (PRxxxxxx).
 
     Les parametres optionnels permettent de pre-remplir prix/stock
-    depuis l'UI (page produits, onglet Ajouter).
+    depuis l'UI (page produits, onglet Ajouter); prix en centimes. Le
+    stock initial est ecrit comme mouvement 'ajustement' (snapshot a 0).
+    seuil_alerte: stock a partir duquel le produit passe en alerte.
     """
-    exec_query(
-        """
-        INSERT INTO produit (
-            nom_produit,
-            id_categorie,
-            prix_achat,
-            prix_vente_bouteille,
-            prix_vente_verre,
-            stock_actuel,
-            unite_vente,
-            quantite_ml
+    with db_cursor() as (_, cur):
+        # Id reserve sur la sequence du trigger tr_produit_id pour ecrire le
+        # mouvement d'ouverture dans la meme transaction.
+        cur.execute("INSERT INTO produit_sequence VALUES (NULL)")
+        sequence = cur.lastrowid
+        if sequence > 999999:
+            raise ValueError("Limite PR999999 atteinte")
+        product_id = f"PR{sequence:06d}"
+        cur.execute(
+            """
+            INSERT INTO produit (
+                id_produit,
+                nom_produit,
+                id_categorie,
+                prix_achat,
+                prix_vente_bouteille,
+                prix_vente_verre,
+                unite_vente,
+                quantite_ml,
+                seuil_alerte
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                product_id,
+                nom,
+                id_categorie,
+                to_decimal(prix_achat),
+                to_decimal(prix_vente_bouteille),
+                to_decimal(prix_vente_verre),
+                unite_vente,
+                quantite_ml,
+                int(seuil_alerte)
+            ),
         )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """,
-        (
-            nom,
-            id_categorie,
-            prix_achat,
-            prix_vente_bouteille,
-            prix_vente_verre,
-            stock_actuel,
-            unite_vente,
-            quantite_ml
-        ),
-    )
+        written = 0
+        if int(stock_actuel):
+            written = _insert_movements(
+                cur, [(product_id, int(stock_actuel), "ajustement", None, None)]
+            )
+        _flag_low_stock(cur, {product_id: (int(stock_actuel), int(seuil_alerte))})
+    invalidate_cache()
+    _note_movements(written)
+    return product_id
 
 
 def update_product(
@@ -189,38 +746,56 @@ def update_product(
     prix_vente_verre,
     stock_actuel,
     unite_vente,
-    quantite_ml
+    quantite_ml,
+    seuil_alerte=None,
 ):
     """
     Met a jour un produit.
 
-    Utilise par l'onglet "Modifier" de pages/products.py.
+    Utilise par l'onglet "Modifier" de pages/products.py (prix en centimes).
+    stock_actuel est le stock saisi: l'ecart avec le stock courant est
+    ecrit comme mouvement 'ajustement' (le snapshot n'est pas modifie).
+    seuil_alerte None: seuil inchange.
     """
-    exec_query(
-        """
-        UPDATE produit
-        SET nom_produit = %s,
-            id_categorie = %s,
-            prix_achat = %s,
-            prix_vente_bouteille = %s,
-            prix_vente_verre = %s,
-            stock_actuel = %s,
-            unite_vente = %s,
-            quantite_ml = %s
-        WHERE id_produit = %s
-        """,
-        (
-            nom,
-            id_categorie,
-            prix_achat,
-            prix_vente_bouteille,
-            prix_vente_verre,
-            stock_actuel,
-            unite_vente,
-            quantite_ml,
-            product_id,
-        ),
-    )
+    with db_cursor() as (_, cur):
+        # Serialise deux editions du meme produit (sinon double ajustement).
+        cur.execute("SELECT id_produit FROM produit WHERE id_produit = %s FOR UPDATE", (product_id,))
+        if not cur.fetchone():
+            raise ValueError("Produit introuvable")
+        current = _current_stocks(cur, [product_id])[product_id]
+        cur.execute(
+            """
+            UPDATE produit
+            SET nom_produit = %s,
+                id_categorie = %s,
+                prix_achat = %s,
+                prix_vente_bouteille = %s,
+                prix_vente_verre = %s,
+                unite_vente = %s,
+                quantite_ml = %s,
+                seuil_alerte = COALESCE(%s, seuil_alerte)
+            WHERE id_produit = %s
+            """,
+            (
+                nom,
+                id_categorie,
+                to_decimal(prix_achat),
+                to_decimal(prix_vente_bouteille),
+                to_decimal(prix_vente_verre),
+                unite_vente,
+                quantite_ml,
+                seuil_alerte,
+                product_id,
+            ),
+        )
+        written = 0
+        if int(stock_actuel) != current:
+            written = _insert_movements(
+                cur, [(product_id, int(stock_actuel) - current, "ajustement", None, None)]
+            )
+        _flag_low_stock(cur, _stock_levels(cur, [product_id]))
+    invalidate_cache()
+    _note_movements(written)
 
 
 def delete_product(product_id):
@@ -228,8 +803,11 @@ def delete_product(product_id):
     Supprime un produit par id.
 
     Appelee depuis pages/products.py (onglet suppression).
+    Ses mouvements de stock et snapshots sont supprimes en cascade; un
+    produit avec entrees ou ventes reste protege par leurs cles etrangeres.
     """
     exec_query("DELETE FROM produit WHERE id_produit = %s", (product_id,))
+    invalidate_cache()
 
 
 def add_stock_entry(
@@ -240,11 +818,13 @@ def add_stock_entry(
 
     Flux metier:
     1) insertion dans entree_stock (historique),
-    2) incrementation stock_actuel dans produit,
-    3) mise a jour prix_achat + prix de vente selon l'unite cible.
+    2) mouvement 'entree' dans le ledger (stock courant),
+    3) mise a jour prix_achat + prix de vente selon l'unite cible
+       (prix en centimes).
 
     Appelee uniquement depuis pages/entries.py.
     """
+    prices = (to_decimal(prix_achat), to_decimal(prix_vente))
     with db_cursor() as (_, cur):
         # Historisation de l'entree brute.
         cur.execute(
@@ -254,209 +834,738 @@ def add_stock_entry(
             """,
             (date_entree, quantite, product_id),
         )
+        _insert_movements(cur, [(product_id, quantite, "entree", cur.lastrowid, None)])
+        _flag_low_stock(cur, _stock_levels(cur, [product_id]))
 
         # Le prix de vente stocke depend de l'unite de vente choisie.
         if unite_vente == "verre":
             cur.execute(
                 """
                 UPDATE produit
-                SET stock_actuel = stock_actuel + %s,
-                    prix_achat = %s,
+                SET prix_achat = %s,
                     prix_vente_verre = %s,
                     unite_vente = %s
                 WHERE id_produit = %s
                 """,
-                (quantite, prix_achat, prix_vente, unite_vente, product_id),
+                (*prices, unite_vente, product_id),
             )
         else:
             cur.execute(
                 """
                 UPDATE produit
-                SET stock_actuel = stock_actuel + %s,
-                    prix_achat = %s,
+                SET prix_achat = %s,
                     prix_vente_bouteille = %s,
                     unite_vente = %s
                 WHERE id_produit = %s
                 """,
-                (quantite, prix_achat, prix_vente, unite_vente, product_id),
+                (*prices, unite_vente, product_id),
             )
+    invalidate_cache()
+    _note_movements(1)
 
 
-def add_sale_stockable(product_id, quantite, date_vente, type_vente, receipt_id):
+def _sale_amount(product_row, type_vente, quantite):
     """
-    Enregistre une vente de produit stockable et decremente le stock.
-
-    Flux transactionnel (dans le meme db_cursor):
-    1) lock ligne produit (FOR UPDATE),
-    2) validations (produit existe, stock suffisant, prix defini),
-    3) insertion dans vente,
-    4) decrementation de stock.
+    Calcule le montant d'une ligne de vente a partir de la ligne produit.
 
-    Appelee depuis pages/sales.py.
+    Le prix utilise depend de l'unite vendue (bouteille/verre).
+    Partage par add_sale_stockable() et commit_receipt(). Centimes.
     """
-    with db_cursor() as (_, cur):
-        # Lock pessimiste pour eviter les ventes concurrentes incoherentes.
-        cur.execute(
-            """
-            SELECT stock_actuel,
-                   prix_vente_bouteille,
-                   prix_vente_verre,
-                   id_categorie
-            FROM produit
-            WHERE id_produit = %s
-            FOR UPDATE
-            """,
-            (product_id,),
-        )
-        row = cur.fetchone()
-        if not row:
-            raise ValueError("Produit introuvable")
-        if row["stock_actuel"] < quantite:
-            raise ValueError("Stock insuffisant")
+    if type_vente == "verre":
+        prix_vente = product_row["prix_vente_verre"]
+    else:
+        prix_vente = product_row["prix_vente_bouteille"]
+    if prix_vente <= 0:
+        raise ValueError("Prix de vente non defini pour cette unite")
+    return prix_vente * int(quantite)
 
-        # Le prix utilise depend de l'unite vendue (bouteille/verre).
-        if type_vente == "verre":
-            prix_vente = row["prix_vente_verre"]
-        else:
-            prix_vente = row["prix_vente_bouteille"]
-        if prix_vente <= 0:
-            raise ValueError("Prix de vente non defini pour cette unite")
-
-        montant = (prix_vente * Decimal(quantite)).quantize(Decimal("0.01"))
 
-        # Ecriture de la ligne de vente.
-        cur.execute(
-            """
-            INSERT INTO vente (
-                date_vente,
-                quantite,
-                montant,
-                nom_preparation,
-                type_vente,
-                id_produit,
-                id_categorie,
-                id_recu
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                date_vente,
-                quantite,
-                montant,
-                None,
-                type_vente,
-                product_id,
-                row["id_categorie"],
-                receipt_id,
-            ),
-        )
+def _unit_cost(product_row, type_vente):
+    """
+    Retourne le cout unitaire a figer sur la ligne de vente.
 
-        # Mise a jour stock apres la vente.
-        cur.execute(
-            """
-            UPDATE produit
-            SET stock_actuel = stock_actuel - %s
-            WHERE id_produit = %s
-            """,
-            (quantite, product_id),
-        )
+    Regle unique du module margin.py (bouteille: prix d'achat, verre:
+    rendement de la bouteille), en centimes. Fige au moment de la vente:
+    un changement de prix ulterieur ne modifie plus les marges passees.
+    """
+    return unit_cost(
+        product_row["prix_achat"],
+        product_row["prix_vente_bouteille"],
+        product_row.get("quantite_ml"),
+        type_vente,
+    )
 
 
-def add_sale_non_stockable(
-    category_id,
-    nom_preparation,
-    quantite,
-    prix_vente,
-    date_vente,
-    type_vente,
-    receipt_id,
-):
+def _bump_sales_summary(cur, lines):
     """
-    Enregistre une vente non stockable.
+    Reporte des lignes de vente dans le resume journalier vente_jour.
 
-    Actuellement non utilisee dans l'UI principale, mais utile pour
-    categories/preparations sans gestion de stock.
+    lines: iterable de (date_vente, id_categorie, id_produit, type_vente,
+    quantite, montant, cout). Execute dans la transaction de la vente
+    (meme cursor) pour que vente et vente_jour restent coherents.
+    montant et cout en centimes.
     """
-    montant = (Decimal(str(prix_vente)) * Decimal(quantite)).quantize(
-        Decimal("0.01")
-    )
-    exec_query(
-        """
-        INSERT INTO vente (
+    lines = list(lines)
+    if not lines:
+        return
+    params = []
+    for date_vente, id_categorie, id_produit, type_vente, quantite, montant, cout in lines:
+        # '' pour les preparations non stockables (cle primaire non nulle).
+        params.extend(
+            (
+                date_vente,
+                id_categorie,
+                id_produit or "",
+                type_vente,
+                quantite,
+                to_decimal(montant),
+                to_decimal(cout),
+            )
+        )
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(lines))
+    cur.execute(
+        f"""
+        INSERT INTO vente_jour (
             date_vente,
+            id_categorie,
+            id_produit,
+            type_vente,
             quantite,
             montant,
-            nom_preparation,
-            type_vente,
-            id_produit,
-            id_categorie,
-            id_recu
+            cout
         )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES {placeholders}
+        ON DUPLICATE KEY UPDATE
+            quantite = quantite + VALUES(quantite),
+            montant = montant + VALUES(montant),
+            cout = cout + VALUES(cout)
         """,
-        (
-            date_vente,
-            quantite,
-            montant,
-            nom_preparation,
-            type_vente,
-            None,
-            category_id,
-            receipt_id,
-        ),
+        params,
     )
 
 
-def add_charge(type_charge, montant, date_charge):
-    """
-    Cree une charge.
+def _sale_mode(mode):
+    """Valide le mode de controle du stock d'une vente (defaut: SALE_MODE)."""
+    mode = mode or SALE_MODE
+    if mode not in SALE_MODES:
+        raise ValueError(f"Mode de vente inconnu: {mode}")
+    return mode
 
-    Utilisee dans pages/charges.py (onglet Ajouter).
-    """
-    exec_query(
-        """
-        INSERT INTO charge (type_charge, montant, date_charge)
-        VALUES (%s, %s, %s)
-        """,
-        (type_charge, montant, date_charge),
-    )
 
+def _count_sale(key, count=1):
+    """Incremente un compteur de sale_stats()."""
+    with _SALE_STATS_LOCK:
+        _SALE_STATS[key] += count
 
-def update_charge(charge_id, type_charge, montant, date_charge):
-    """
-    Met a jour une charge existante.
 
-    Utilisee dans pages/charges.py (onglet Modifier).
+def sale_stats():
+    """Compteurs des ventes stockables (transactions, reprises, conflits de stock, surventes)."""
+    with _SALE_STATS_LOCK:
+        return dict(_SALE_STATS)
+
+
+def recent_oversells():
+    """Dernieres surventes constatees par ce process: liste de dict id_produit, stock, detected_at."""
+    with _SALE_STATS_LOCK:
+        return [dict(entry) for entry in _OVERSELLS]
+
+
+def _check_oversells(product_ids):
     """
-    exec_query(
-        """
-        UPDATE charge
-        SET type_charge = %s,
-            montant = %s,
-            date_charge = %s
-        WHERE id_charge = %s
-        """,
-        (type_charge, montant, date_charge, charge_id),
+    Relit le stock des produits vendus apres le commit (mode ledger et
+    rejeu du journal de caisse, replay_receipts).
+
+    Le controle de la vente est une lecture sans verrou: deux caisses
+    peuvent vendre ensemble le dernier article. Cette relecture (nouvelle
+    transaction, voit les ventes concurrentes validees) compte chaque
+    stock devenu negatif dans sale_stats()["oversells"], le garde dans
+    recent_oversells() et le signale sur stderr. Au moins une des ventes
+    en cause le voit. Un echec de relecture n'annule pas la vente.
+    """
+    try:
+        with db_cursor() as (_, cur):
+            levels = _stock_levels(cur, sorted(product_ids))
+    except Exception as exc:
+        print(f"controle de survente en echec: {exc}", file=sys.stderr)
+        return
+    negative = {product_id: stock for product_id, (stock, _) in levels.items() if stock < 0}
+    if not negative:
+        return
+    now = time.time()
+    with _SALE_STATS_LOCK:
+        _SALE_STATS["oversells"] += len(negative)
+        for product_id, stock in sorted(negative.items()):
+            _OVERSELLS.append({"id_produit": product_id, "stock": stock, "detected_at": now})
+    print(
+        "survente constatee: "
+        + ", ".join(f"{product_id} stock {stock}" for product_id, stock in sorted(negative.items())),
+        file=sys.stderr,
     )
 
 
-def delete_charge(charge_id):
+def _run_with_retries(transaction):
     """
-    Supprime une charge.
+    Execute transaction() (un db_cursor complet) et la rejoue sur deadlock
+    ou lock wait timeout, au plus SALE_MAX_ATTEMPTS fois.
 
-    Utilisee dans pages/charges.py (onglet Supprimer).
+    Backoff exponentiel borne avec jitter: deux caisses en conflit ne se
+    represent pas au meme instant. Les autres erreurs (ValueError metier,
+    connexion) remontent tout de suite.
     """
-    exec_query("DELETE FROM charge WHERE id_charge = %s", (charge_id,))
-
-
-def list_entries(start_date=None, end_date=None, product_id=None):
+    for attempt in range(1, SALE_MAX_ATTEMPTS + 1):
+        _count_sale("transactions")
+        try:
+            return transaction()
+        except Exception as exc:
+            if not is_transient_error(exc) or attempt == SALE_MAX_ATTEMPTS:
+                raise
+            _count_sale("retries")
+            delay = min(SALE_RETRY_MAX_SECONDS, SALE_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+
+def _read_sale_products(cur, product_ids, mode):
     """
-    Retourne l'historique des entrees de stock avec filtres optionnels.
+    Lit les produits vendus + leur stock courant: {id_produit: row}.
 
-    Utilisee par pages/entries.py (bloc Historique).
+    En mode pessimiste, les lignes produit sont d'abord verrouillees
+    (FOR UPDATE, tri par id_produit pour un ordre de verrouillage stable):
+    la lecture du stock qui suit voit alors les ventes deja validees par
+    les caisses precedentes. Prix des lignes en centimes.
     """
-    query = (
-        """
+    product_ids = sorted(product_ids)
+    id_placeholders = ", ".join(["%s"] * len(product_ids))
+    if mode == "pessimiste":
+        cur.execute(
+            f"""
+            SELECT id_produit
+            FROM produit
+            WHERE id_produit IN ({id_placeholders})
+            ORDER BY id_produit
+            FOR UPDATE
+            """,
+            product_ids,
+        )
+        cur.fetchall()
+    cur.execute(
+        f"""
+        SELECT p.id_produit,
+               p.nom_produit,
+               {_CURRENT_STOCK_SQL} AS stock_actuel,
+               p.prix_achat,
+               p.prix_vente_bouteille,
+               p.prix_vente_verre,
+               p.quantite_ml,
+               p.id_categorie,
+               p.seuil_alerte
+        FROM produit p
+        WHERE p.id_produit IN ({id_placeholders})
+        """,
+        product_ids,
+    )
+    return {row["id_produit"]: _cents_row(row) for row in cur.fetchall()}
+
+
+def _write_sale_movements(cur, totals, receipt_id, mode, products):
+    """
+    Ecrit un mouvement 'vente' par produit (totals: {id_produit: quantite}).
+
+    Modes ledger/pessimiste: le stock a deja ete controle a la lecture.
+    Mode optimiste: INSERT ... SELECT conditionnel (stock courant >= quantite)
+    puis controle du nombre de lignes ecrites. En REPEATABLE READ (defaut
+    InnoDB) le SELECT pose des verrous partages: deux ventes simultanees du
+    meme produit finissent en deadlock, l'une est rejouee par
+    _run_with_retries() et revoit le stock a jour.
+    Les produits passes sous leur seuil entrent dans alerte_stock
+    (_flag_sale_crossings, ecriture par cle primaire, sans lecture du ledger).
+    """
+    product_ids = sorted(totals)
+    if mode != "optimiste":
+        _insert_movements(
+            cur,
+            [(product_id, -totals[product_id], "vente", None, receipt_id) for product_id in product_ids],
+        )
+        _flag_sale_crossings(cur, totals, products)
+        return
+
+    id_placeholders = ", ".join(["%s"] * len(product_ids))
+    cases = " ".join(["WHEN %s THEN %s"] * len(product_ids))
+    case_params = []
+    for product_id in product_ids:
+        case_params.extend((product_id, totals[product_id]))
+    cur.execute(
+        f"""
+        INSERT INTO mouvement_stock (id_produit, quantite, type_mouvement, id_recu)
+        SELECT p.id_produit, -(CASE p.id_produit {cases} END), 'vente', %s
+        FROM produit p
+        WHERE p.id_produit IN ({id_placeholders})
+          AND {_CURRENT_STOCK_SQL} >= CASE p.id_produit {cases} END
+        """,
+        case_params + [receipt_id] + product_ids + case_params,
+    )
+    if cur.rowcount != len(product_ids):
+        _count_sale("conflicts")
+        short = [
+            products[product_id]["nom_produit"]
+            for product_id in product_ids
+            if products[product_id]["stock_actuel"] < totals[product_id]
+        ]
+        raise ValueError(f"Stock insuffisant ({', '.join(short)})" if short else "Stock insuffisant")
+    _flag_sale_crossings(cur, totals, products)
+
+
+def add_sale_stockable(product_id, quantite, date_vente, type_vente, receipt_id, mode=None):
+    """
+    Enregistre une vente de produit stockable et decremente le stock.
+
+    Flux transactionnel (dans le meme db_cursor):
+    1) lecture produit + stock courant (snapshot + delta),
+    2) validations (produit existe, stock suffisant, prix defini),
+    3) mouvement 'vente' dans le ledger (aucune ecriture sur produit),
+    4) insertion dans vente + cumul dans vente_jour.
+
+    mode (defaut SALE_MODE, variable BARLOG_SALE_MODE):
+    - "ledger": lecture sans verrou, deux caisses ne se serialisent pas;
+      deux ventes simultanees du dernier article peuvent passer le
+      controle toutes les deux (stock negatif, corrige par un ajustement):
+      le stock est relu apres le commit et chaque survente est comptee et
+      signalee (_check_oversells, sale_stats()["oversells"]),
+    - "pessimiste": verrou FOR UPDATE sur la ligne produit, controle exact,
+      les ventes d'un meme produit s'attendent,
+    - "optimiste": pas de verrou explicite, insertion conditionnelle du
+      mouvement (cf. _write_sale_movements) et reprise bornee sur conflit.
+    Deadlocks et lock wait timeouts sont rejoues (SALE_MAX_ATTEMPTS).
+    Vente unitaire; pour un recu complet, preferer commit_receipt().
+    """
+    mode = _sale_mode(mode)
+    quantite = _check_quantity(quantite)
+
+    def transaction():
+        with db_cursor() as (_, cur):
+            row = _read_sale_products(cur, [product_id], mode).get(product_id)
+            if not row:
+                raise ValueError("Produit introuvable")
+            if mode != "optimiste" and row["stock_actuel"] < quantite:
+                raise ValueError("Stock insuffisant")
+
+            montant = _sale_amount(row, type_vente, quantite)
+            cout_unitaire = _unit_cost(row, type_vente)
+            _write_sale_movements(cur, {product_id: quantite}, receipt_id, mode, {product_id: row})
+
+            # Ecriture de la ligne de vente (cout unitaire fige).
+            cur.execute(
+                """
+                INSERT INTO vente (
+                    date_vente,
+                    quantite,
+                    montant,
+                    cout_unitaire,
+                    nom_preparation,
+                    type_vente,
+                    id_produit,
+                    id_categorie,
+                    id_recu
+                )
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                (
+                    date_vente,
+                    quantite,
+                    to_decimal(montant),
+                    to_decimal(cout_unitaire),
+                    None,
+                    type_vente,
+                    product_id,
+                    row["id_categorie"],
+                    receipt_id,
+                ),
+            )
+            _bump_sales_summary(
+                cur,
+                [
+                    (
+                        date_vente,
+                        row["id_categorie"],
+                        product_id,
+                        type_vente,
+                        quantite,
+                        montant,
+                        cout_unitaire * quantite,
+                    )
+                ],
+            )
+
+    _run_with_retries(transaction)
+    invalidate_cache()
+    _note_totals_change()
+    _note_movements(1)
+    if mode == "ledger":
+        _check_oversells([product_id])
+
+
+def _check_quantity(quantite):
+    """Valide la quantite d'une ligne de vente (1..MAX_SALE_QUANTITY) et la retourne en int."""
+    quantite = int(quantite)
+    if quantite <= 0:
+        raise ValueError("La quantite doit etre superieure a 0")
+    if quantite > MAX_SALE_QUANTITY:
+        raise ValueError(f"La quantite ne peut pas depasser {MAX_SALE_QUANTITY}")
+    return quantite
+
+
+def _receipt_totals(items):
+    """Quantite cumulee par produit d'un recu (un produit peut revenir sur plusieurs lignes)."""
+    if not items:
+        raise ValueError("Recu vide")
+    totals = {}
+    for item in items:
+        quantite = _check_quantity(item["quantite"])
+        totals[item["product_id"]] = totals.get(item["product_id"], 0) + quantite
+    return totals
+
+
+def check_receipt(items):
+    """
+    Valide un recu sans acces base (recu non vide, quantites 1..MAX_SALE_QUANTITY).
+
+    Appelee par write_queue.submit() avant l'ecriture dans le journal: un
+    recu refuse ici n'entre pas dans la file. Leve ValueError.
+    """
+    _receipt_totals(items)
+
+
+def check_receipt_stock(items):
+    """
+    Controle un recu contre le catalogue courant, sans rien ecrire.
+
+    Memes refus que commit_receipt() (produit introuvable, stock
+    insuffisant sur la quantite cumulee, prix non defini), sur une lecture
+    sans verrou: appelee par write_queue.submit() quand la base repond,
+    pour que la caisse refuse une vente impossible avant de la journaliser.
+    Une vente concurrente peut encore passer entre ce controle et le rejeu
+    (recu "conflict", survente comptee). Leve ValueError.
+    """
+    totals = _receipt_totals(items)
+    with db_cursor() as (_, cur):
+        products = _read_sale_products(cur, totals, "ledger")
+    for product_id in sorted(totals):
+        row = products.get(product_id)
+        if not row:
+            raise ValueError(f"Produit introuvable ({product_id})")
+        if row["stock_actuel"] < totals[product_id]:
+            raise ValueError(f"Stock insuffisant ({row['nom_produit']})")
+    for item in items:
+        _sale_amount(products[item["product_id"]], item["unite_vente"], item["quantite"])
+
+
+def _write_receipt(cur, items, nom_client, uuid_recu, mode, allow_negative, date_recu):
+    """
+    Ecrit un recu dans la transaction de cur (cf. commit_receipt).
+
+    Retourne (id_recu, ruptures): ruptures liste les produits dont le stock
+    devient negatif (seulement si allow_negative, sinon ValueError).
+    Un uuid_recu deja enregistre retourne ce recu sans rien ecrire.
+    """
+    totals = _receipt_totals(items)
+    product_ids = sorted(totals)
+    if uuid_recu:
+        cur.execute("SELECT id_recu FROM recu WHERE uuid_recu = %s", (uuid_recu,))
+        existing = cur.fetchone()
+        if existing:
+            return existing["id_recu"], []
+
+    products = _read_sale_products(cur, product_ids, mode)
+    shortages = []
+    for product_id in product_ids:
+        row = products.get(product_id)
+        if not row:
+            raise ValueError(f"Produit introuvable ({product_id})")
+        if row["stock_actuel"] < totals[product_id]:
+            if allow_negative:
+                shortages.append(
+                    {
+                        "id_produit": product_id,
+                        "nom_produit": row["nom_produit"],
+                        "stock": row["stock_actuel"],
+                        "quantite": totals[product_id],
+                    }
+                )
+            elif mode != "optimiste":
+                raise ValueError(f"Stock insuffisant ({row['nom_produit']})")
+
+    cur.execute(
+        """
+        INSERT INTO recu (date_recu, nom_client, uuid_recu)
+        VALUES (%s, %s, %s)
+        """,
+        (date_recu or datetime.now(), nom_client, uuid_recu),
+    )
+    receipt_id = cur.lastrowid
+    # Vente deja faite au comptoir (rejeu): mouvement ecrit sans condition.
+    _write_sale_movements(cur, totals, receipt_id, "ledger" if allow_negative else mode, products)
+
+    sale_params = []
+    summary_lines = []
+    for item in items:
+        row = products[item["product_id"]]
+        quantite = int(item["quantite"])
+        montant = _sale_amount(row, item["unite_vente"], quantite)
+        cout_unitaire = _unit_cost(row, item["unite_vente"])
+        sale_params.extend(
+            (
+                item["date_vente"],
+                quantite,
+                to_decimal(montant),
+                to_decimal(cout_unitaire),
+                None,
+                item["unite_vente"],
+                item["product_id"],
+                row["id_categorie"],
+                receipt_id,
+            )
+        )
+        summary_lines.append(
+            (
+                item["date_vente"],
+                row["id_categorie"],
+                item["product_id"],
+                item["unite_vente"],
+                quantite,
+                montant,
+                cout_unitaire * quantite,
+            )
+        )
+    sale_placeholders = ", ".join(
+        ["(%s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(items)
+    )
+    cur.execute(
+        f"""
+        INSERT INTO vente (
+            date_vente,
+            quantite,
+            montant,
+            cout_unitaire,
+            nom_preparation,
+            type_vente,
+            id_produit,
+            id_categorie,
+            id_recu
+        )
+        VALUES {sale_placeholders}
+        """,
+        sale_params,
+    )
+    _bump_sales_summary(cur, summary_lines)
+    return receipt_id, shortages
+
+
+def commit_receipt(items, nom_client=None, mode=None, uuid_recu=None):
+    """
+    Enregistre un recu complet (toutes ses lignes) en une seule transaction.
+
+    items: liste de dict {product_id, quantite, date_vente, unite_vente}
+    (format de st.session_state["receipt_items"] dans pages/sales.py).
+
+    Flux transactionnel (un seul db_cursor, un seul commit):
+    1) lecture de tous les produits touches + stock courant en un SELECT
+       (verrouillage selon mode, cf. add_sale_stockable),
+    2) validations sur la quantite cumulee par produit,
+    3) insertion du recu, puis un mouvement 'vente' par produit dans le
+       ledger (INSERT multi-lignes, conditionnel en mode optimiste),
+    4) insertion de toutes les lignes vente (INSERT multi-lignes) et cumul
+       dans vente_jour.
+
+    Si une ligne est invalide, rien n'est ecrit (ni recu, ni vente, ni stock).
+    La transaction est rejouee sur deadlock / lock wait timeout.
+
+    uuid_recu: identifiant genere cote caisse (write_queue.py). Idempotent:
+    si un recu porte deja cet uuid, rien n'est ecrit et son id est retourne
+    (rejeu apres une erreur reseau dont on ignore si le commit a eu lieu).
+    Retourne l'id du recu cree.
+    """
+    mode = _sale_mode(mode)
+    product_count = len(_receipt_totals(items))
+
+    def transaction():
+        with db_cursor() as (_, cur):
+            receipt_id, _ = _write_receipt(cur, items, nom_client, uuid_recu, mode, False, None)
+            return receipt_id
+
+    try:
+        receipt_id = _run_with_retries(transaction)
+    except Exception as exc:
+        if not (uuid_recu and is_duplicate_error(exc)):
+            raise
+        # Meme uuid enregistre entre-temps par une autre transaction.
+        existing = fetch_one("SELECT id_recu FROM recu WHERE uuid_recu = %s", (uuid_recu,))
+        if not existing:
+            raise
+        return existing["id_recu"]
+    invalidate_cache()
+    _note_totals_change()
+    _note_movements(product_count)
+    if mode == "ledger":
+        _check_oversells(_receipt_totals(items))
+    return receipt_id
+
+
+def replay_receipts(receipts):
+    """
+    Rejoue un lot de recus du journal local en une seule transaction.
+
+    receipts: liste de dict {uuid_recu, items, nom_client, date_recu}.
+    Les ventes ont deja eu lieu au comptoir: le stock peut devenir negatif
+    (allow_negative), chaque rupture est retournee pour signalement au
+    lieu de rejeter le recu. Les recus deja presents (meme uuid) ne sont
+    pas reecrits. Une erreur metier (produit supprime, prix absent) annule
+    tout le lot: l'appelant rejoue alors recu par recu pour l'isoler.
+    Appelee par write_queue.py. Retourne une liste de dict {uuid_recu,
+    id_recu, ruptures} dans l'ordre du lot.
+    Apres le commit, le stock des produits du lot est relu
+    (_check_oversells): les surventes sont comptees comme en mode ledger.
+    """
+    def transaction():
+        results = []
+        with db_cursor() as (_, cur):
+            for receipt in receipts:
+                receipt_id, shortages = _write_receipt(
+                    cur,
+                    receipt["items"],
+                    receipt.get("nom_client"),
+                    receipt["uuid_recu"],
+                    "ledger",
+                    True,
+                    receipt.get("date_recu"),
+                )
+                results.append(
+                    {"uuid_recu": receipt["uuid_recu"], "id_recu": receipt_id, "ruptures": shortages}
+                )
+        return results
+
+    results = _run_with_retries(transaction)
+    invalidate_cache()
+    _note_totals_change()
+    product_ids = set()
+    for receipt in receipts:
+        product_ids.update(_receipt_totals(receipt["items"]))
+    _note_movements(sum(len(_receipt_totals(receipt["items"])) for receipt in receipts))
+    _check_oversells(product_ids)
+    return results
+
+
+def add_sale_non_stockable(
+    category_id,
+    nom_preparation,
+    quantite,
+    prix_vente,
+    date_vente,
+    type_vente,
+    receipt_id,
+):
+    """
+    Enregistre une vente non stockable.
+
+    Actuellement non utilisee dans l'UI principale, mais utile pour
+    categories/preparations sans gestion de stock. prix_vente en centimes.
+    """
+    montant = int(prix_vente) * int(quantite)
+    with db_cursor() as (_, cur):
+        cur.execute(
+            """
+            INSERT INTO vente (
+                date_vente,
+                quantite,
+                montant,
+                nom_preparation,
+                type_vente,
+                id_produit,
+                id_categorie,
+                id_recu
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                date_vente,
+                quantite,
+                to_decimal(montant),
+                nom_preparation,
+                type_vente,
+                None,
+                category_id,
+                receipt_id,
+            ),
+        )
+        # Preparation sans cout d'achat suivi: cout 0 dans le resume.
+        _bump_sales_summary(
+            cur,
+            [(date_vente, category_id, None, type_vente, quantite, montant, 0)],
+        )
+    _note_totals_change()
+
+
+def add_charge(type_charge, montant, date_charge):
+    """
+    Cree une charge.
+
+    Utilisee dans pages/charges.py (onglet Ajouter); montant en centimes.
+    """
+    exec_query(
+        """
+        INSERT INTO charge (type_charge, montant, date_charge)
+        VALUES (%s, %s, %s)
+        """,
+        (type_charge, to_decimal(montant), date_charge),
+    )
+    _note_totals_change()
+
+
+def update_charge(charge_id, type_charge, montant, date_charge):
+    """
+    Met a jour une charge existante.
+
+    Utilisee dans pages/charges.py (onglet Modifier); montant en centimes.
+    """
+    exec_query(
+        """
+        UPDATE charge
+        SET type_charge = %s,
+            montant = %s,
+            date_charge = %s
+        WHERE id_charge = %s
+        """,
+        (type_charge, to_decimal(montant), date_charge, charge_id),
+    )
+    _note_totals_change()
+
+
+def delete_charge(charge_id):
+    """
+    Supprime une charge.
+
+    Utilisee dans pages/charges.py (onglet Supprimer).
+    """
+    exec_query("DELETE FROM charge WHERE id_charge = %s", (charge_id,))
+    _note_totals_change()
+
+
+def _entries_filters(start_date=None, end_date=None, product_id=None):
+    """Construit les filtres SQL de l'historique des entrees."""
+    filters = []
+    params = []
+    if start_date:
+        filters.append("e.date_entree >= %s")
+        params.append(start_date)
+    if end_date:
+        filters.append("e.date_entree <= %s")
+        params.append(end_date)
+    if product_id:
+        filters.append("e.id_produit = %s")
+        params.append(product_id)
+    return filters, params
+
+
+# Colonnes de l'historique des entrees (liste et export).
+_ENTRIES_SELECT = """
         SELECT e.id_entree,
                e.date_entree,
                e.quantite,
@@ -466,31 +1575,61 @@ def list_entries(start_date=None, end_date=None, product_id=None):
         JOIN produit p ON e.id_produit = p.id_produit
         JOIN categorie c ON p.id_categorie = c.id_categorie
         """
-    )
+
+
+def list_entries(start_date=None, end_date=None, product_id=None, cursor=None, limit=None):
+    """
+    Retourne l'historique des entrees de stock avec filtres optionnels.
+
+    Utilisee par pages/entries.py (bloc Historique).
+    Avec limit: Page keyset triee par (date_entree, id_entree) DESC.
+    """
+    query = _ENTRIES_SELECT
+    filters, params = _entries_filters(start_date, end_date, product_id)
+    if limit is not None:
+        return _keyset_page(
+            query,
+            filters,
+            params,
+            ("e.date_entree", "e.id_entree"),
+            ("date_entree", "id_entree"),
+            descending=True,
+            cursor=cursor,
+            limit=limit,
+        )
+    query += _where(filters)
+    query += " ORDER BY e.date_entree DESC, e.id_entree DESC"
+    return fetch_df(query, params)
+
+
+def count_entries(start_date=None, end_date=None, product_id=None):
+    """Compte les entrees de stock (memes filtres que list_entries)."""
+    filters, params = _entries_filters(start_date, end_date, product_id)
+    row = fetch_one("SELECT COUNT(*) AS total FROM entree_stock e" + _where(filters), params)
+    return int(row["total"]) if row else 0
+
+
+def _sales_filters(start_date=None, end_date=None, product_id=None, category_id=None):
+    """Construit les filtres SQL de l'historique des ventes."""
     filters = []
     params = []
     if start_date:
-        filters.append("e.date_entree >= %s")
+        filters.append("v.date_vente >= %s")
         params.append(start_date)
     if end_date:
-        filters.append("e.date_entree <= %s")
+        filters.append("v.date_vente <= %s")
         params.append(end_date)
     if product_id:
-        filters.append("e.id_produit = %s")
+        filters.append("v.id_produit = %s")
         params.append(product_id)
-    if filters:
-        query += " WHERE " + " AND ".join(filters)
-    query += " ORDER BY e.date_entree DESC, e.id_entree DESC"
-    return fetch_df(query, params)
+    if category_id:
+        filters.append("v.id_categorie = %s")
+        params.append(category_id)
+    return filters, params
 
 
-def list_sales(start_date=None, end_date=None, product_id=None, category_id=None):
-    """
-    Retourne l'historique des ventes avec un calcul de marge intelligent 
-    (rendement pour les verres vs coût d'achat pour les bouteilles).
-    """
-    query = (
-        """
+# Colonnes de l'historique des ventes (liste et export).
+_SALES_SELECT = """
         SELECT v.id_vente,
                v.date_vente,
                v.quantite,
@@ -503,41 +1642,75 @@ def list_sales(start_date=None, end_date=None, product_id=None, category_id=None
                    WHEN v.id_produit IS NOT NULL THEN p.nom_produit
                    ELSE v.nom_preparation
                END AS article,
-               -- CALCUL DE LA MARGE CORRIGÉ
-               CASE 
-                   -- Si c'est un verre : Marge = Montant - (Prix Bouteille / Nombre de verres possibles)
-                   WHEN v.type_vente = 'verre' AND p.id_produit IS NOT NULL AND COALESCE(p.quantite_ml, 0) > 0 THEN 
-                       v.montant - ((p.prix_vente_bouteille / (CAST(p.quantite_ml AS FLOAT) / 50.0)) * v.quantite)
-                   
-                   -- Si c'est une bouteille ou une préparation : Marge = Montant - (Prix Achat * Quantité)
-                   ELSE 
-                       v.montant - (COALESCE(p.prix_achat, 0) * v.quantite)
-               END AS marge
+               -- Marge sur cout unitaire fige a la vente (pas de prix courant).
+               """ + margin_sql("v") + """ AS marge
         FROM vente v
         JOIN categorie c ON v.id_categorie = c.id_categorie
         LEFT JOIN produit p ON v.id_produit = p.id_produit
         """
-    )
+
+
+def list_sales(
+    start_date=None,
+    end_date=None,
+    product_id=None,
+    category_id=None,
+    cursor=None,
+    limit=None,
+):
+    """
+    Retourne l'historique des ventes avec leur marge.
+
+    La marge utilise le cout unitaire fige sur la ligne (rendement pour les
+    verres vs cout d'achat pour les bouteilles, cf. margin.py).
+
+    Les pages doivent toujours passer une periode (start_date, end_date):
+    sans bornes la requete parcourt toute la table vente.
+    Avec limit: Page keyset triee par (date_vente, id_vente) DESC.
+    Construit par fetch_frame(): montant et marge en centimes (int64),
+    categorie / type_vente en category.
+    """
+    query = _SALES_SELECT
+    filters, params = _sales_filters(start_date, end_date, product_id, category_id)
+    if limit is not None:
+        return _keyset_page(
+            query,
+            filters,
+            params,
+            ("v.date_vente", "v.id_vente"),
+            ("date_vente", "id_vente"),
+            descending=True,
+            cursor=cursor,
+            limit=limit,
+            fetch=fetch_frame,
+        )
+    query += _where(filters)
+    query += " ORDER BY v.date_vente DESC, v.id_vente DESC"
+    return fetch_frame(query, params)
+
+
+def count_sales(start_date=None, end_date=None, product_id=None, category_id=None):
+    """Compte les lignes de vente (memes filtres que list_sales)."""
+    filters, params = _sales_filters(start_date, end_date, product_id, category_id)
+    row = fetch_one("SELECT COUNT(*) AS total FROM vente v" + _where(filters), params)
+    return int(row["total"]) if row else 0
+
+
+_CHARGES_SELECT = "SELECT id_charge, type_charge, montant, date_charge FROM charge"
+
+
+def _charges_filters(start_date=None, end_date=None):
+    """Construit les filtres SQL de periode des charges."""
     filters = []
     params = []
     if start_date:
-        filters.append("v.date_vente >= %s")
+        filters.append("date_charge >= %s")
         params.append(start_date)
     if end_date:
-        filters.append("v.date_vente <= %s")
+        filters.append("date_charge <= %s")
         params.append(end_date)
-    if product_id:
-        filters.append("v.id_produit = %s")
-        params.append(product_id)
-    if category_id:
-        filters.append("v.id_categorie = %s")
-        params.append(category_id)
-    
-    if filters:
-        query += " WHERE " + " AND ".join(filters)
-    
-    query += " ORDER BY v.date_vente DESC, v.id_vente DESC"
-    return fetch_df(query, params)
+    return filters, params
+
 
 def list_charges(start_date=None, end_date=None):
     """
@@ -546,46 +1719,272 @@ def list_charges(start_date=None, end_date=None):
     Utilisee dans pages/charges.py (liste + edition + suppression)
     et indirectement par pages/dashboard.py / pages/reports.py via totaux.
     """
-    query = "SELECT id_charge, type_charge, montant, date_charge FROM charge"
-    filters = []
-    params = []
-    if start_date:
-        filters.append("date_charge >= %s")
-        params.append(start_date)
-    if end_date:
-        filters.append("date_charge <= %s")
-        params.append(end_date)
-    if filters:
-        query += " WHERE " + " AND ".join(filters)
+    filters, params = _charges_filters(start_date, end_date)
+    query = _CHARGES_SELECT + _where(filters)
     query += " ORDER BY date_charge DESC, id_charge DESC"
     return fetch_df(query, params)
 
 
+# Exports: (SELECT, construction des filtres, colonnes de tri chronologique).
+_EXPORTS = {
+    "ventes": (_SALES_SELECT, _sales_filters, ("v.date_vente", "v.id_vente")),
+    "entrees": (_ENTRIES_SELECT, _entries_filters, ("e.date_entree", "e.id_entree")),
+    "charges": (_CHARGES_SELECT, _charges_filters, ("date_charge", "id_charge")),
+}
+EXPORT_KINDS = tuple(_EXPORTS)
+
+
+def export_rows(kind, start_date=None, end_date=None, chunk_size=None, **filters):
+    """
+    Lignes d'un export par paquets (cf. stream_rows), ordre chronologique.
+
+    kind: "ventes" (filtres product_id, category_id), "entrees" (product_id)
+    ou "charges"; memes colonnes et filtres que list_sales / list_entries /
+    list_charges.
+    """
+    if kind not in _EXPORTS:
+        raise ValueError(f"Export inconnu: {kind}")
+    select, build_filters, order_columns = _EXPORTS[kind]
+    conditions, params = build_filters(start_date, end_date, **filters)
+    query = select + _where(conditions) + " ORDER BY " + ", ".join(order_columns)
+    return stream_rows(query, params, chunk_size)
+
+
 def get_sales_totals(start_date, end_date):
     """
-    Retourne les totaux de ventes et marge sur une periode.
+    Retourne les totaux de ventes et marge sur une periode (centimes).
 
+    Lit le resume journalier vente_jour (une ligne par jour x produit x
+    type_vente) au lieu des lignes brutes de vente.
     Utilisee par pages/dashboard.py et pages/reports.py.
     """
     return fetch_one(
         """
         SELECT
-            COALESCE(SUM(v.montant), 0) AS total_ventes,
-            GREATEST(
-                COALESCE(SUM(v.montant - (COALESCE(p.prix_achat, 0) * v.quantite)), 0),
-                0
-            ) AS marge
-        FROM vente v
-        LEFT JOIN produit p ON v.id_produit = p.id_produit
-        WHERE v.date_vente BETWEEN %s AND %s
+            COALESCE(SUM(montant), 0) AS total_ventes,
+            COALESCE(SUM(montant - cout), 0) AS marge
+        FROM vente_jour
+        WHERE date_vente BETWEEN %s AND %s
         """,
         (start_date, end_date),
     )
 
 
+def sales_by_day(start_date, end_date):
+    """
+    Retourne ventes et marge par jour sur une periode (depuis vente_jour).
+
+    Utilisee par pages/reports.py (tableau "Ventes par jour").
+    """
+    return fetch_df(
+        """
+        SELECT date_vente,
+               SUM(montant) AS total_ventes,
+               SUM(montant - cout) AS marge
+        FROM vente_jour
+        WHERE date_vente BETWEEN %s AND %s
+        GROUP BY date_vente
+        ORDER BY date_vente
+        """,
+        (start_date, end_date),
+    )
+
+
+def sales_by_month(start_date, end_date):
+    """
+    Retourne ventes et marge par mois sur une periode (depuis vente_jour).
+
+    Utilisee par pages/reports.py (tableau "Ventes par mois").
+    """
+    return fetch_df(
+        """
+        SELECT DATE_FORMAT(date_vente, '%Y-%m') AS mois,
+               SUM(montant) AS total_ventes,
+               SUM(montant - cout) AS marge
+        FROM vente_jour
+        WHERE date_vente BETWEEN %s AND %s
+        GROUP BY DATE_FORMAT(date_vente, '%Y-%m')
+        ORDER BY mois
+        """,
+        (start_date, end_date),
+    )
+
+
+def backfill_unit_costs(only_missing=True):
+    """
+    Recalcule vente.cout_unitaire avec les prix produit actuels.
+
+    Rattrapage des lignes sans cout (only_missing=True: cout_unitaire = 0),
+    par exemple des ventes importees. Meme regle que le chemin d'ecriture
+    (margin.unit_cost_sql). Penser a reconstruire vente_jour ensuite.
+    Appelee par maintenance.py (commande backfill-cout).
+    """
+    query = (
+        """
+        UPDATE vente v
+        JOIN produit p ON v.id_produit = p.id_produit
+        SET v.cout_unitaire = """
+        + unit_cost_sql("v.type_vente", "p")
+    )
+    if only_missing:
+        query += " WHERE v.cout_unitaire = 0"
+    with db_cursor() as (_, cur):
+        cur.execute(query)
+        return cur.rowcount
+
+
+def rebuild_sales_summary(start_date=None, end_date=None):
+    """
+    Reconstruit vente_jour depuis les lignes brutes de vente.
+
+    Sert aux backfills (migration, import de ventes, correction manuelle):
+    supprime puis recalcule le resume sur la periode (tout l'historique si
+    aucune borne), dans une seule transaction.
+    Appelee par maintenance.py (commande rebuild-vente-jour).
+    """
+    filters = []
+    params = []
+    if start_date:
+        filters.append("date_vente >= %s")
+        params.append(start_date)
+    if end_date:
+        filters.append("date_vente <= %s")
+        params.append(end_date)
+    with db_cursor() as (_, cur):
+        cur.execute("DELETE FROM vente_jour" + _where(filters), params)
+        cur.execute(
+            """
+            INSERT INTO vente_jour (
+                date_vente,
+                id_categorie,
+                id_produit,
+                type_vente,
+                quantite,
+                montant,
+                cout
+            )
+            SELECT v.date_vente,
+                   v.id_categorie,
+                   COALESCE(v.id_produit, ''),
+                   v.type_vente,
+                   SUM(v.quantite),
+                   SUM(v.montant),
+                   SUM(v.cout_unitaire * v.quantite)
+            FROM vente v
+            """
+            + _where(["v." + condition for condition in filters])
+            + """
+            GROUP BY v.date_vente, v.id_categorie, COALESCE(v.id_produit, ''), v.type_vente
+            """,
+            params,
+        )
+        return cur.rowcount
+
+
+def rollup_stock():
+    """
+    Recale les snapshots de stock sur le ledger (roll-up).
+
+    Pour chaque produit ayant des mouvements posterieurs a son snapshot:
+    produit.stock_actuel += somme de ces mouvements jusqu'au watermark
+    (MAX(id_mouvement) au depart), id_mouvement_snapshot = watermark, et
+    une ligne est ajoutee a stock_snapshot. Le stock courant lu par les
+    pages ne change pas, seul le delta a sommer raccourcit.
+
+    La somme est une lecture verrouillante: elle attend les ventes encore
+    en cours dont l'id est sous le watermark (sinon le snapshot les
+    ignorerait pour toujours). Un produit dont le stock serait negatif
+    (ventes concurrentes) reste en delta jusqu'a son ajustement.
+    Appelee par maintenance.py (commande rollup-stock) et en tache de fond
+    par les ecritures (ROLLUP_EVERY_MOVEMENTS). Retourne le nombre de
+    produits recales.
+    """
+    with db_cursor() as (_, cur):
+        cur.execute("SELECT COALESCE(MAX(id_mouvement), 0) AS watermark FROM mouvement_stock")
+        watermark = cur.fetchone()["watermark"]
+        cur.execute(
+            """
+            SELECT p.id_produit,
+                   p.stock_actuel + SUM(m.quantite) AS stock
+            FROM produit p
+            JOIN mouvement_stock m ON m.id_produit = p.id_produit
+            WHERE m.id_mouvement > p.id_mouvement_snapshot
+              AND m.id_mouvement <= %s
+            GROUP BY p.id_produit, p.stock_actuel
+            ORDER BY p.id_produit
+            LOCK IN SHARE MODE
+            """,
+            (watermark,),
+        )
+        stocks = [(row["id_produit"], int(row["stock"])) for row in cur.fetchall() if row["stock"] >= 0]
+        if not stocks:
+            return 0
+
+        product_ids = [product_id for product_id, _ in stocks]
+        id_placeholders = ", ".join(["%s"] * len(product_ids))
+        stock_cases = " ".join(["WHEN %s THEN %s"] * len(stocks))
+        stock_params = []
+        snapshot_params = []
+        for product_id, stock in stocks:
+            stock_params.extend((product_id, stock))
+            snapshot_params.extend((product_id, watermark, stock))
+        cur.execute(
+            f"""
+            UPDATE produit
+            SET stock_actuel = CASE id_produit {stock_cases} END,
+                id_mouvement_snapshot = %s
+            WHERE id_produit IN ({id_placeholders})
+            """,
+            stock_params + [watermark] + product_ids,
+        )
+        snapshot_placeholders = ", ".join(["(%s, %s, %s)"] * len(stocks))
+        cur.execute(
+            f"""
+            INSERT INTO stock_snapshot (id_produit, id_mouvement, stock)
+            VALUES {snapshot_placeholders}
+            """,
+            snapshot_params,
+        )
+        return len(stocks)
+
+
+def get_stock_at(product_id, at):
+    """
+    Retourne le stock d'un produit a une date/heure passee.
+
+    Point de depart: dernier stock_snapshot anterieur a at, puis somme des
+    mouvements suivants enregistres avant at. Les dates sont celles
+    d'enregistrement des mouvements (pas date_vente/date_entree saisies).
+    Avant la mise en place du ledger (migration 003), le stock vaut 0.
+    """
+    with db_cursor() as (_, cur):
+        cur.execute(
+            """
+            SELECT id_mouvement, stock
+            FROM stock_snapshot
+            WHERE id_produit = %s AND date_snapshot <= %s
+            ORDER BY id_mouvement DESC
+            LIMIT 1
+            """,
+            (product_id, at),
+        )
+        snapshot = cur.fetchone() or {"id_mouvement": 0, "stock": 0}
+        cur.execute(
+            """
+            SELECT COALESCE(SUM(quantite), 0) AS delta
+            FROM mouvement_stock
+            WHERE id_produit = %s
+              AND id_mouvement > %s
+              AND date_mouvement <= %s
+            """,
+            (product_id, snapshot["id_mouvement"], at),
+        )
+        return int(snapshot["stock"]) + int(cur.fetchone()["delta"])
+
+
 def get_charge_total(start_date, end_date):
     """
-    Retourne la somme des charges sur une periode.
+    Retourne la somme des charges sur une periode (centimes).
 
     Utilisee par pages/dashboard.py et pages/reports.py pour calculer le net.
     """
@@ -600,22 +1999,149 @@ def get_charge_total(start_date, end_date):
     return row["total_charges"] if row else 0
 
 
-def list_low_stock(threshold):
+def get_day_totals(day):
     """
-    Retourne les produits dont le stock est inferieur/egal au seuil.
+    Retourne ventes, marge et charges d'un jour en une requete (centimes).
 
-    Utilisee par pages/dashboard.py.
+    Lit vente_jour et charge par leurs index de date. Utilisee par kpi.py
+    (KPI du jour du tableau de bord).
     """
-    return fetch_df(
+    return fetch_one(
         """
-        SELECT p.id_produit,
+        SELECT v.total_ventes, v.marge, c.total_charges
+        FROM (
+            SELECT COALESCE(SUM(montant), 0) AS total_ventes,
+                   COALESCE(SUM(montant - cout), 0) AS marge
+            FROM vente_jour
+            WHERE date_vente = %s
+        ) v
+        CROSS JOIN (
+            SELECT COALESCE(SUM(montant), 0) AS total_charges
+            FROM charge
+            WHERE date_charge = %s
+        ) c
+        """,
+        (day, day),
+    )
+
+
+def get_totals_watermark():
+    """
+    Derniers ids de vente et de charge: (id_vente, id_charge).
+
+    Lecture en bout d'index primaire (quasi gratuite): kpi.py la compare a
+    la precedente pour detecter les ecritures des autres process.
+    """
+    row = fetch_one(
+        """
+        SELECT (SELECT MAX(id_vente) FROM vente) AS id_vente,
+               (SELECT MAX(id_charge) FROM charge) AS id_charge
+        """
+    )
+    return (row["id_vente"], row["id_charge"]) if row else (None, None)
+
+
+@_cached
+def list_low_stock():
+    """
+    Retourne les produits sous leur seuil d'alerte (stock <= seuil_alerte).
+
+    Part de l'ensemble alerte_stock tenu a jour par les ecritures de stock
+    (quelques lignes) au lieu de calculer le stock de tout le catalogue;
+    le stock courant n'est calcule que pour ces produits (un produit
+    remonte au-dessus de son seuil mais pas encore resynchronise est
+    ecarte). En cache process comme le catalogue: chaque ecriture de stock
+    appelle invalidate_cache(). Utilisee par pages/dashboard.py.
+    """
+    return fetch_df(
+        f"""
+        SELECT a.id_produit,
                p.nom_produit,
                c.libelle AS categorie,
-               p.stock_actuel
-        FROM produit p
+               {_CURRENT_STOCK_SQL} AS stock_actuel,
+               p.seuil_alerte,
+               a.depuis
+        FROM alerte_stock a
+        JOIN produit p ON p.id_produit = a.id_produit
         JOIN categorie c ON p.id_categorie = c.id_categorie
-        WHERE p.stock_actuel <= %s
-        ORDER BY p.stock_actuel ASC, p.nom_produit
-        """,
-        (threshold,),
+        HAVING stock_actuel <= seuil_alerte
+        ORDER BY stock_actuel ASC, p.nom_produit
+        """
     )
+
+
+def sync_low_stock():
+    """
+    Recalcule tout l'ensemble alerte_stock depuis le stock courant.
+
+    Filet de securite (alerts.py periodiquement, maintenance.py
+    alertes-stock): rattrape les ecarts laisses par des ventes simultanees
+    du meme produit ou par des ecritures hors application.
+    Le stock est lu sans verrou (lecture coherente, aucun verrou sur
+    mouvement_stock); seules les lignes d'alerte_stock qui changent sont
+    ecrites, par cle primaire. Retourne le nombre de produits en alerte.
+    """
+    with db_cursor() as (_, cur):
+        cur.execute(
+            f"""
+            SELECT s.id_produit, s.stock_actuel, s.seuil_alerte
+            FROM (
+                SELECT p.id_produit, {_CURRENT_STOCK_SQL} AS stock_actuel, p.seuil_alerte
+                FROM produit p
+            ) s
+            WHERE s.stock_actuel <= s.seuil_alerte
+            """
+        )
+        low = {
+            row["id_produit"]: (int(row["stock_actuel"]), int(row["seuil_alerte"]))
+            for row in cur.fetchall()
+        }
+        cur.execute("SELECT id_produit FROM alerte_stock")
+        flagged = {row["id_produit"] for row in cur.fetchall()}
+        removed = sorted(flagged - set(low))
+        if removed:
+            cur.execute(
+                f"DELETE FROM alerte_stock WHERE id_produit IN ({', '.join(['%s'] * len(removed))})",
+                removed,
+            )
+        added = {product_id: low[product_id] for product_id in set(low) - flagged}
+        _flag_low_stock(cur, added)
+    if removed or added:
+        invalidate_cache()
+    return len(low)
+
+
+def claim_stock_alerts(limit=50):
+    """
+    Reserve les alertes stock pas encore notifiees et les retourne.
+
+    Chaque alerte est marquee notifiee par un UPDATE conditionnel: avec
+    plusieurs process, une alerte n'est retournee qu'a un seul. Retourne
+    une liste de dict id_produit, nom_produit, stock, seuil, depuis.
+    Utilisee par alerts.py.
+    """
+    claimed = []
+    with db_cursor() as (_, cur):
+        cur.execute(
+            """
+            SELECT a.id_produit, p.nom_produit, a.stock, a.seuil, a.depuis
+            FROM alerte_stock a
+            JOIN produit p ON p.id_produit = a.id_produit
+            WHERE a.notifie_le IS NULL
+            ORDER BY a.depuis, a.id_produit
+            LIMIT %s
+            """,
+            (limit,),
+        )
+        for row in cur.fetchall():
+            cur.execute(
+                """
+                UPDATE alerte_stock
+                SET notifie_le = NOW()
+                WHERE id_produit = %s AND notifie_le IS NULL
+                """,
+                (row["id_produit"],),
+            )
+            if cur.rowcount == 1:
+                claimed.append(row)
+    return claimed
@@ -5,18 +5,62 @@ Interaction avec les autres modules:
 - data_access.py ne parle jamais directement a mysql.connector.
 - data_access.py passe uniquement par db_cursor() pour chaque requete.
 - en cas d'erreur de configuration DB, st.stop() arrete proprement l'app.
+- les connexions viennent d'un pool unique par process, partage entre
+  reruns et sessions Streamlit (pas de handshake TCP+auth par requete).
 """
 
 from contextlib import contextmanager
 import os
+import threading
+import time
 
-import mysql.connector
+from mysql.connector import FieldType, pooling
+from mysql.connector.errors import DataError, IntegrityError, PoolError, ProgrammingError
 import streamlit as st
 from streamlit.errors import StreamlitSecretNotFoundError
 
+import query_log
+
 # Clés minimales obligatoires pour etablir une connexion.
 REQUIRED_KEYS = ("host", "user", "password", "database")
 
+# Taille par defaut du pool (surchargeable via secrets ou DB_POOL_SIZE).
+DEFAULT_POOL_SIZE = 5
+# Attente max (secondes) d'une connexion libre quand le pool est sature.
+POOL_TIMEOUT_SECONDS = 10
+# Erreurs MySQL qui annulent la transaction mais peuvent etre rejouees:
+# 1213 = deadlock detecte, 1205 = lock wait timeout.
+TRANSIENT_ERRNOS = (1205, 1213)
+# Violation de cle unique (ex: recu deja enregistre sous le meme uuid).
+DUPLICATE_KEY_ERRNO = 1062
+# Violations de contrainte CHECK (MySQL 3819, MariaDB 4025): donnee refusee,
+# un rejeu echouerait de la meme facon.
+CHECK_VIOLATION_ERRNOS = (3819, 4025)
+# Type de colonne MySQL -> type logique (exports types, DataFrames colonnes).
+_FIELD_KINDS = {
+    **dict.fromkeys(
+        (FieldType.TINY, FieldType.SHORT, FieldType.INT24, FieldType.LONG, FieldType.LONGLONG, FieldType.YEAR),
+        "int",
+    ),
+    **dict.fromkeys((FieldType.DECIMAL, FieldType.NEWDECIMAL), "decimal"),
+    **dict.fromkeys((FieldType.FLOAT, FieldType.DOUBLE), "float"),
+    **dict.fromkeys((FieldType.DATE, FieldType.NEWDATE), "date"),
+    **dict.fromkeys((FieldType.DATETIME, FieldType.TIMESTAMP), "datetime"),
+}
+# Pool unique du process: cle de config -> MySQLConnectionPool.
+_POOL = None
+_POOL_KEY = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool_size(value):
+    """Normalise la taille du pool dans les bornes de mysql.connector."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        size = DEFAULT_POOL_SIZE
+    return max(1, min(size, pooling.CNX_POOL_MAXSIZE))
+
 
 def _has_keys(cfg, keys):
     """Verifie qu'une config contient toutes les cles attendues."""
@@ -46,6 +90,7 @@ def _from_secrets():
         "user": cfg.get("user"),
         "password": cfg.get("password"),
         "database": cfg.get("database"),
+        "pool_size": _pool_size(cfg.get("pool_size", DEFAULT_POOL_SIZE)),
     }
 
 
@@ -69,6 +114,7 @@ def _from_env():
         "user": user,
         "password": password,
         "database": database,
+        "pool_size": _pool_size(os.getenv("DB_POOL_SIZE", DEFAULT_POOL_SIZE)),
     }
 
 
@@ -91,33 +137,129 @@ def get_db_config():
     return cfg
 
 
+def _get_pool(cfg):
+    """
+    Retourne le pool de connexions du process (cree a la premiere demande).
+
+    Le pool vit au niveau module: il survit aux reruns Streamlit et il est
+    partage par toutes les sessions. Si la config change (secrets edites),
+    un nouveau pool est construit.
+    """
+    global _POOL, _POOL_KEY
+    key = (
+        cfg["host"],
+        cfg["port"],
+        cfg["user"],
+        cfg["password"],
+        cfg["database"],
+        cfg["pool_size"],
+    )
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_KEY != key:
+            _POOL = pooling.MySQLConnectionPool(
+                pool_name="barstock",
+                pool_size=cfg["pool_size"],
+                pool_reset_session=True,
+                host=cfg["host"],
+                port=cfg["port"],
+                user=cfg["user"],
+                password=cfg["password"],
+                database=cfg["database"],
+            )
+            _POOL_KEY = key
+        return _POOL
+
+
+def _checkout(pool):
+    """
+    Emprunte une connexion au pool et verifie qu'elle est vivante.
+
+    - attend une connexion libre jusqu'a POOL_TIMEOUT_SECONDS,
+    - ping(reconnect=True) remplace une connexion coupee par le serveur
+      (wait_timeout, redemarrage MySQL) avant de la rendre au code appelant.
+    """
+    deadline = time.monotonic() + POOL_TIMEOUT_SECONDS
+    while True:
+        try:
+            conn = pool.get_connection()
+            break
+        except PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+    try:
+        conn.ping(reconnect=True, attempts=2, delay=0)
+    except Exception:
+        # Connexion inutilisable: on la rend au pool puis on remonte l'erreur.
+        try:
+            conn.close()
+        except Exception:
+            pass
+        raise
+    return conn
+
+
+def is_transient_error(exc):
+    """Vrai si l'erreur (deadlock, lock wait timeout) justifie de rejouer la transaction."""
+    return getattr(exc, "errno", None) in TRANSIENT_ERRNOS
+
+
+def is_duplicate_error(exc):
+    """Vrai si l'erreur est une violation de cle unique."""
+    return getattr(exc, "errno", None) == DUPLICATE_KEY_ERRNO
+
+
+def is_permanent_error(exc):
+    """
+    Vrai si la base refuse la donnee elle-meme (rejouer ne changerait rien).
+
+    DataError (valeur hors limites, texte trop long), ProgrammingError,
+    IntegrityError hors cle unique (cle etrangere, NOT NULL) et violations
+    de CHECK. Les doublons de cle unique, deadlocks et erreurs de connexion
+    ne le sont pas.
+    """
+    if getattr(exc, "errno", None) in CHECK_VIOLATION_ERRNOS:
+        return True
+    if isinstance(exc, IntegrityError):
+        return not is_duplicate_error(exc)
+    return isinstance(exc, (DataError, ProgrammingError))
+
+
+def describe_columns(description):
+    """
+    Colonnes d'un resultat: [(nom, type logique)] depuis cursor.description.
+
+    Types: "int", "decimal", "float", "date", "datetime", "str" (defaut).
+    """
+    return [(column[0], _FIELD_KINDS.get(column[1], "str")) for column in description or ()]
+
+
 @contextmanager
-def db_cursor():
+def db_cursor(dictionary=True):
     """
     Context manager transactionnel pour toutes les operations SQL.
 
     Contrat:
-    - ouvre une connexion + un cursor en dictionnaire (rows type dict),
+    - emprunte une connexion au pool + un cursor en dictionnaire (rows dict;
+      tuples avec dictionary=False, pour les lectures volumineuses),
     - yield (conn, cursor) au code appelant (dans data_access.py),
     - commit si tout se passe bien,
     - rollback si exception,
-    - fermeture systematique cursor + connexion.
-    """
-    cfg = get_db_config()
-    conn = mysql.connector.connect(
-        host=cfg["host"],
-        port=cfg["port"],
-        user=cfg["user"],
-        password=cfg["password"],
-        database=cfg["database"],
-    )
+    - fermeture systematique du cursor; close() rend la connexion au pool,
+    - chaque requete est mesuree par query_log (connexion, execute, fetch).
+    """
+    started = time.perf_counter()
+    conn = _checkout(_get_pool(get_db_config()))
+    connect_seconds = time.perf_counter() - started
+    cursor = None
     try:
-        cursor = conn.cursor(dictionary=True)
+        cursor = query_log.instrument(conn.cursor(dictionary=dictionary), connect_seconds)
         yield conn, cursor
         conn.commit()
     except Exception:
         conn.rollback()
         raise
     finally:
-        cursor.close()
+        if cursor is not None:
+            cursor.close()
         conn.close()
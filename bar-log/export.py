@@ -0,0 +1,161 @@
+"""
+Exports CSV / Parquet des ventes, entrees et charges.
+
+Les lignes arrivent par paquets de data_access.export_rows() (fetchmany)
+et sont ecrites au fil de l'eau dans un fichier temporaire: la memoire
+reste bornee a un paquet (CSV) ou a un groupe de lignes (Parquet), quelle
+que soit la periode exportee.
+
+Interaction:
+- pages/reports.py appelle write_export() puis propose le fichier en
+  telechargement,
+- Parquet necessite pyarrow (dependance optionnelle): sans lui seul le CSV
+  est propose (available_formats()).
+
+Les fichiers vivent dans EXPORT_DIR et sont supprimes apres
+EXPORT_MAX_AGE_SECONDS (purge a chaque nouvel export).
+"""
+
+import csv
+from datetime import date
+import importlib.util
+import os
+from pathlib import Path
+import tempfile
+import time
+
+import data_access
+
+EXPORT_DIR = Path(os.getenv("BARLOG_EXPORT_DIR", Path(tempfile.gettempdir()) / "barlog-exports"))
+EXPORT_MAX_AGE_SECONDS = 3600
+# Lignes par groupe Parquet (les paquets de fetchmany sont regroupes).
+PARQUET_ROW_GROUP_ROWS = 50000
+
+FORMATS = {
+    "csv": ("CSV", "text/csv"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet"),
+}
+
+
+def available_formats():
+    """Formats disponibles dans cet environnement (Parquet si pyarrow est installe)."""
+    formats = ["csv"]
+    if importlib.util.find_spec("pyarrow") is not None:
+        formats.append("parquet")
+    return formats
+
+
+def _write_csv(path, chunks):
+    """Ecrit les paquets en CSV (UTF-8 avec BOM pour Excel). Retourne le nombre de lignes."""
+    count = 0
+    with open(path, "w", encoding="utf-8-sig", newline="") as handle:
+        writer = csv.writer(handle)
+        for index, (columns, rows) in enumerate(chunks):
+            if index == 0:
+                writer.writerow([name for name, _ in columns])
+            # Decimal, date et None sont rendus par str() / "" par le module csv.
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+
+def _arrow_schema(columns):
+    """Schema pyarrow depuis les types logiques de db.describe_columns()."""
+    import pyarrow as pa
+
+    types = {
+        "int": pa.int64(),
+        "decimal": pa.decimal128(18, 2),
+        "float": pa.float64(),
+        "date": pa.date32(),
+        "datetime": pa.timestamp("us"),
+        "str": pa.string(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _write_parquet(path, chunks):
+    """Ecrit les paquets en Parquet, par groupes de PARQUET_ROW_GROUP_ROWS lignes."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    count = 0
+    writer = None
+    schema = None
+    pending = []
+
+    def flush():
+        columns = list(zip(*pending)) if pending else [[] for _ in schema]
+        arrays = [pa.array(values, type=field.type) for values, field in zip(columns, schema)]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        pending.clear()
+
+    try:
+        for columns, rows in chunks:
+            if writer is None:
+                schema = _arrow_schema(columns)
+                writer = pq.ParquetWriter(path, schema)
+            pending.extend(rows)
+            count += len(rows)
+            if len(pending) >= PARQUET_ROW_GROUP_ROWS:
+                flush()
+        if writer is not None and (pending or not count):
+            flush()
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+_WRITERS = {"csv": _write_csv, "parquet": _write_parquet}
+
+
+def _purge():
+    """Supprime les exports plus vieux que EXPORT_MAX_AGE_SECONDS."""
+    cutoff = time.time() - EXPORT_MAX_AGE_SECONDS
+    for path in EXPORT_DIR.glob("*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def _label(value):
+    """Borne de periode pour le nom de fichier."""
+    return value.isoformat() if isinstance(value, date) else "tout"
+
+
+def write_export(kind, fmt, start_date=None, end_date=None, **filters):
+    """
+    Ecrit un export dans EXPORT_DIR et retourne son resume.
+
+    kind / filters: cf. data_access.export_rows(); fmt: "csv" ou "parquet".
+    Retour: dict path, file_name, mime, rows, bytes, seconds.
+    """
+    if fmt not in _WRITERS:
+        raise ValueError(f"Format inconnu: {fmt}")
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    _purge()
+    file_name = f"{kind}_{_label(start_date)}_{_label(end_date)}.{fmt}"
+    handle, temp_name = tempfile.mkstemp(prefix=f"{kind}-", suffix=f".{fmt}", dir=EXPORT_DIR)
+    os.close(handle)
+    path = Path(temp_name)
+    started = time.perf_counter()
+    chunks = data_access.export_rows(kind, start_date, end_date, **filters)
+    try:
+        rows = _WRITERS[fmt](path, chunks)
+    except Exception:
+        path.unlink(missing_ok=True)
+        raise
+    finally:
+        # Ecriture interrompue: rend la connexion tout de suite (cf. stream_rows).
+        chunks.close()
+    return {
+        "path": path,
+        "file_name": file_name,
+        "mime": FORMATS[fmt][1],
+        "rows": rows,
+        "bytes": path.stat().st_size,
+        "seconds": time.perf_counter() - started,
+    }
@@ -0,0 +1,231 @@
+"""
+Journal local des recus (SQLite), source de verite de la caisse.
+
+Chaque recu est d'abord ecrit ici (fichier local, fsync au commit) puis
+rejoue vers MySQL par write_queue.py: une coupure du lien vers la base ne
+fait plus perdre de vente, la saisie n'est limitee que par le disque local.
+
+Interaction:
+- write_queue.submit() appelle append(), le syncer de write_queue.py lit
+  pending() par lots et note le resultat (mark_synced / mark_failed /
+  note_attempt),
+- pages/sales.py lit l'etat des recus via write_queue.statuses(),
+- le journal survit aux redemarrages: les recus en attente sont rejoues
+  au demarrage suivant.
+
+Fichier: BARLOG_JOURNAL (defaut journal/ventes.sqlite3 a cote de l'app).
+Les lignes ne sont jamais reecrites hormis leur etat de synchronisation;
+les recus synchronises depuis plus de RETENTION_DAYS sont purges.
+"""
+
+from datetime import date, datetime, timedelta
+import json
+import os
+from pathlib import Path
+import sqlite3
+import threading
+
+JOURNAL_PATH = Path(
+    os.getenv("BARLOG_JOURNAL", Path(__file__).resolve().parent / "journal" / "ventes.sqlite3")
+)
+RETENTION_DAYS = 30
+
+PENDING = "pending"
+CONFIRMED = "confirmed"
+CONFLICT = "conflict"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recu_journal (
+  seq INTEGER PRIMARY KEY AUTOINCREMENT,
+  uuid_recu TEXT NOT NULL UNIQUE,
+  created_at TEXT NOT NULL,
+  payload TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'pending',
+  attempts INTEGER NOT NULL DEFAULT 0,
+  id_recu INTEGER,
+  error TEXT,
+  conflicts TEXT,
+  synced_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_recu_journal_status ON recu_journal (status, seq);
+"""
+
+_INIT_LOCK = threading.Lock()
+_INITIALIZED = set()
+
+
+def _connect():
+    """Connexion au journal (schema cree au premier acces du process)."""
+    path = JOURNAL_PATH
+    with _INIT_LOCK:
+        if path not in _INITIALIZED:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(path)
+            try:
+                # WAL: ecritures sequentielles, lecteurs non bloques par le syncer.
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+            finally:
+                conn.close()
+            _INITIALIZED.add(path)
+    conn = sqlite3.connect(path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    # FULL: un recu confirme a la caisse est sur disque (coupure de courant).
+    conn.execute("PRAGMA synchronous=FULL")
+    return conn
+
+
+def _encode_item(item):
+    """Ligne de recu serialisable (dates en ISO)."""
+    return {key: value.isoformat() if isinstance(value, date) else value for key, value in item.items()}
+
+
+def _decode_item(item):
+    """Inverse de _encode_item() pour date_vente."""
+    item = dict(item)
+    if isinstance(item.get("date_vente"), str):
+        item["date_vente"] = date.fromisoformat(item["date_vente"])
+    return item
+
+
+def append(uuid_recu, items, nom_client=None):
+    """Ajoute un recu au journal (durable au retour). Retourne son numero de sequence."""
+    payload = json.dumps(
+        {"items": [_encode_item(item) for item in items], "nom_client": nom_client},
+        ensure_ascii=False,
+    )
+    conn = _connect()
+    try:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO recu_journal (uuid_recu, created_at, payload) VALUES (?, ?, ?)",
+                (uuid_recu, datetime.now().isoformat(timespec="seconds"), payload),
+            )
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def _entry(row):
+    """Ligne du journal -> dict (payload et conflits decodes)."""
+    payload = json.loads(row["payload"])
+    return {
+        "seq": row["seq"],
+        "uuid": row["uuid_recu"],
+        "status": row["status"],
+        "attempts": row["attempts"],
+        "receipt_id": row["id_recu"],
+        "error": row["error"],
+        "conflicts": json.loads(row["conflicts"]) if row["conflicts"] else [],
+        "items": [_decode_item(item) for item in payload["items"]],
+        "nom_client": payload.get("nom_client"),
+        "lines": len(payload["items"]),
+        "submitted_at": datetime.fromisoformat(row["created_at"]),
+        "synced_at": datetime.fromisoformat(row["synced_at"]) if row["synced_at"] else None,
+    }
+
+
+def pending(limit):
+    """Recus a synchroniser, dans l'ordre de saisie."""
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT * FROM recu_journal WHERE status = ? ORDER BY seq LIMIT ?",
+            (PENDING, limit),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [_entry(row) for row in rows]
+
+
+def statuses(uuids):
+    """Etat des recus demandes, dans l'ordre donne (inconnus omis)."""
+    uuids = list(uuids)
+    if not uuids:
+        return []
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            f"SELECT * FROM recu_journal WHERE uuid_recu IN ({', '.join('?' * len(uuids))})",
+            uuids,
+        ).fetchall()
+    finally:
+        conn.close()
+    by_uuid = {row["uuid_recu"]: _entry(row) for row in rows}
+    return [by_uuid[key] for key in uuids if key in by_uuid]
+
+
+def counts():
+    """Nombre de recus par etat."""
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT status, COUNT(*) FROM recu_journal GROUP BY status").fetchall()
+    finally:
+        conn.close()
+    return {status: count for status, count in rows}
+
+
+def _update(sql, params):
+    """Execute une mise a jour d'etat en une transaction."""
+    conn = _connect()
+    try:
+        with conn:
+            conn.executemany(sql, params)
+    finally:
+        conn.close()
+
+
+def mark_synced(results):
+    """
+    Note les recus appliques en base.
+
+    results: dict {uuid_recu, id_recu, ruptures} de data_access.replay_receipts();
+    un recu avec ruptures de stock passe en "conflict" (enregistre, a verifier).
+    """
+    now = datetime.now().isoformat(timespec="seconds")
+    _update(
+        "UPDATE recu_journal SET status = ?, id_recu = ?, conflicts = ?, error = NULL, "
+        "attempts = attempts + 1, synced_at = ? WHERE uuid_recu = ?",
+        [
+            (
+                CONFLICT if result["ruptures"] else CONFIRMED,
+                result["id_recu"],
+                json.dumps(result["ruptures"], ensure_ascii=False) if result["ruptures"] else None,
+                now,
+                result["uuid_recu"],
+            )
+            for result in results
+        ],
+    )
+
+
+def mark_failed(uuid_recu, error):
+    """Recu refuse par la base (erreur metier): ne sera plus rejoue."""
+    _update(
+        "UPDATE recu_journal SET status = ?, error = ?, attempts = attempts + 1 WHERE uuid_recu = ?",
+        [(FAILED, error, uuid_recu)],
+    )
+
+
+def note_attempt(uuids, error):
+    """Tentative en echec technique (base injoignable): les recus restent en attente."""
+    _update(
+        "UPDATE recu_journal SET attempts = attempts + 1, error = ? WHERE uuid_recu = ? AND status = ?",
+        [(error, uuid_recu, PENDING) for uuid_recu in uuids],
+    )
+
+
+def purge(days=RETENTION_DAYS):
+    """Supprime les recus synchronises depuis plus de days jours. Retourne le nombre supprime."""
+    cutoff = (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds")
+    conn = _connect()
+    try:
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM recu_journal WHERE status IN (?, ?) AND synced_at < ?",
+                (CONFIRMED, CONFLICT, cutoff),
+            )
+        return cursor.rowcount
+    finally:
+        conn.close()
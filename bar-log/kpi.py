@@ -0,0 +1,168 @@
+"""
+KPI du jour (ventes, marge, charges, net) partages par toutes les sessions.
+
+Un seul calcul par process au lieu de deux requetes par rerun et par
+session: today_totals() sert un instantane en memoire, tenu a jour par:
+- les ecritures du process: data_access.totals_version() change a chaque
+  vente/charge ecrite, l'instantane est recalcule a la lecture suivante,
+- un thread de fond qui controle toutes les KPI_POLL_SECONDS le filigrane
+  data_access.get_totals_watermark() (derniers ids de vente et de charge):
+  une vente ou une charge ajoutee par un autre process declenche un
+  recalcul,
+- un recalcul complet au plus tard KPI_MAX_AGE_SECONDS apres le precedent
+  (modifications/suppressions d'un autre process, invisibles au filigrane),
+  et au changement de jour.
+
+Interaction:
+- pages/dashboard.py affiche today_totals() et son age,
+- data_access.get_day_totals() fait le calcul (vente_jour + charge, une
+  requete, montants en centimes).
+
+Le retard est borne et affiche: au plus KPI_POLL_SECONDS pour une vente
+d'un autre process, KPI_MAX_AGE_SECONDS pour une modification; au-dela
+de KPI_STALE_SECONDS sans controle reussi (base injoignable), l'instantane
+est signale comme perime.
+"""
+
+from datetime import date
+import os
+import threading
+import time
+
+import data_access
+
+KPI_POLL_SECONDS = float(os.getenv("BARLOG_KPI_POLL_SECONDS", "5"))
+KPI_MAX_AGE_SECONDS = float(os.getenv("BARLOG_KPI_MAX_AGE_SECONDS", "60"))
+# Age du dernier controle reussi au-dela duquel les KPI sont signales perimes.
+KPI_STALE_SECONDS = max(3 * KPI_POLL_SECONDS, 30.0)
+
+_WAKE = threading.Event()
+_LOCK = threading.Lock()
+# Un seul recalcul a la fois (thread de fond ou session qui lit).
+_REFRESH_LOCK = threading.Lock()
+_WORKER = None
+_STATE = {
+    "day": None,
+    "totals": None,
+    "version": None,
+    "watermark": None,
+    "computed_at": None,
+    "checked_at": None,
+    "last_error": None,
+    "refreshes": 0,
+    "polls": 0,
+}
+
+
+def start():
+    """Demarre le thread de rafraichissement du process s'il ne tourne pas deja."""
+    global _WORKER
+    with _LOCK:
+        if _WORKER is None or not _WORKER.is_alive():
+            _WORKER = threading.Thread(target=_run, name="barlog-kpi", daemon=True)
+            _WORKER.start()
+
+
+def _refresh(force=False):
+    """
+    Controle le filigrane et recalcule les KPI du jour si besoin.
+
+    La version locale et le filigrane sont lus avant les totaux: une
+    ecriture concurrente est au pire vue au controle suivant.
+    """
+    with _REFRESH_LOCK:
+        day = date.today()
+        version = data_access.totals_version()
+        watermark = data_access.get_totals_watermark()
+        now = time.time()
+        with _LOCK:
+            state = dict(_STATE)
+        changed = (
+            force
+            or state["totals"] is None
+            or state["day"] != day
+            or state["version"] != version
+            or state["watermark"] != watermark
+            or now - state["computed_at"] >= KPI_MAX_AGE_SECONDS
+        )
+        totals = data_access.get_day_totals(day) if changed else None
+        with _LOCK:
+            _STATE["polls"] += 1
+            _STATE["checked_at"] = now
+            _STATE["last_error"] = None
+            if changed:
+                _STATE.update(
+                    day=day,
+                    totals=totals,
+                    version=version,
+                    watermark=watermark,
+                    computed_at=now,
+                )
+                _STATE["refreshes"] += 1
+
+
+def _run():
+    """Boucle du thread: un controle toutes les KPI_POLL_SECONDS (ou sur reveil)."""
+    while True:
+        _WAKE.wait(KPI_POLL_SECONDS)
+        _WAKE.clear()
+        try:
+            _refresh()
+        except Exception as exc:
+            with _LOCK:
+                _STATE["last_error"] = str(exc)
+
+
+def today_totals():
+    """
+    KPI du jour depuis la memoire du process (centimes).
+
+    Retour: dict total_ventes, marge, total_charges, net, computed_at et
+    checked_at (timestamps), age_seconds (depuis le dernier controle
+    reussi), stale (bool) et last_error.
+    Premier appel du jour ou ecriture locale depuis l'instantane: recalcul
+    immediat (une requete); sinon aucune requete.
+    """
+    start()
+    with _LOCK:
+        state = dict(_STATE)
+    if (
+        state["totals"] is None
+        or state["day"] != date.today()
+        or state["version"] != data_access.totals_version()
+    ):
+        try:
+            _refresh()
+        except Exception as exc:
+            with _LOCK:
+                _STATE["last_error"] = str(exc)
+            # Sans chiffres du jour, rien de fiable a afficher.
+            if state["totals"] is None or state["day"] != date.today():
+                raise
+        with _LOCK:
+            state = dict(_STATE)
+
+    totals = state["totals"]
+    age = time.time() - state["checked_at"]
+    return {
+        "total_ventes": totals["total_ventes"],
+        "marge": totals["marge"],
+        "total_charges": totals["total_charges"],
+        "net": totals["marge"] - totals["total_charges"],
+        "computed_at": state["computed_at"],
+        "checked_at": state["checked_at"],
+        "age_seconds": age,
+        "stale": age > KPI_STALE_SECONDS,
+        "last_error": state["last_error"],
+    }
+
+
+def kpi_stats():
+    """Compteurs du service (controles, recalculs, derniere erreur)."""
+    with _LOCK:
+        return {
+            "polls": _STATE["polls"],
+            "refreshes": _STATE["refreshes"],
+            "computed_at": _STATE["computed_at"],
+            "last_error": _STATE["last_error"],
+        }
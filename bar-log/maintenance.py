@@ -0,0 +1,103 @@
+"""
+Commandes de maintenance de la base BarStock (hors interface Streamlit).
+
+Usage (depuis bar-log/, config DB via secrets ou variables DB_*):
+    python maintenance.py rebuild-vente-jour [--start AAAA-MM-JJ] [--end AAAA-MM-JJ]
+    python maintenance.py backfill-cout [--all]
+    python maintenance.py rollup-stock
+    python maintenance.py alertes-stock
+
+Interaction:
+- passe uniquement par data_access.py (meme SQL que l'application),
+- pensee pour les backfills ponctuels et les taches planifiees (cron).
+"""
+
+import argparse
+from datetime import date
+import sys
+
+import data_access
+
+
+def _parse_date(value):
+    """Convertit un argument AAAA-MM-JJ en date."""
+    try:
+        return date.fromisoformat(value)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"Date invalide: {value}") from exc
+
+
+def _rebuild_vente_jour(args):
+    """Reconstruit le resume journalier vente_jour."""
+    rows = data_access.rebuild_sales_summary(args.start, args.end)
+    print(f"vente_jour reconstruit: {rows} ligne(s) de resume")
+
+
+def _backfill_cout(args):
+    """Recalcule vente.cout_unitaire puis le resume journalier."""
+    rows = data_access.backfill_unit_costs(only_missing=not args.all)
+    print(f"cout_unitaire recalcule sur {rows} vente(s)")
+    if rows:
+        data_access.rebuild_sales_summary()
+        print("vente_jour reconstruit")
+
+
+def _rollup_stock(args):
+    """Recale les snapshots produit.stock_actuel sur le ledger de stock."""
+    rows = data_access.rollup_stock()
+    print(f"snapshot de stock recale sur {rows} produit(s)")
+
+
+def _alertes_stock(args):
+    """Recalcule l'ensemble alerte_stock (produits sous leur seuil)."""
+    total = data_access.sync_low_stock()
+    print(f"alerte_stock recalcule: {total} produit(s) sous leur seuil")
+
+
+def build_parser():
+    """Declare les sous-commandes disponibles."""
+    parser = argparse.ArgumentParser(description="Maintenance BarStock")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser(
+        "rebuild-vente-jour",
+        help="Recalcule vente_jour depuis les lignes de vente",
+    )
+    rebuild.add_argument("--start", type=_parse_date, default=None)
+    rebuild.add_argument("--end", type=_parse_date, default=None)
+    rebuild.set_defaults(handler=_rebuild_vente_jour)
+
+    backfill = commands.add_parser(
+        "backfill-cout",
+        help="Valorise vente.cout_unitaire avec les prix actuels",
+    )
+    backfill.add_argument(
+        "--all",
+        action="store_true",
+        help="Recalcule toutes les ventes (par defaut: cout_unitaire = 0)",
+    )
+    backfill.set_defaults(handler=_backfill_cout)
+
+    rollup = commands.add_parser(
+        "rollup-stock",
+        help="Integre les mouvements de stock recents dans les snapshots produit",
+    )
+    rollup.set_defaults(handler=_rollup_stock)
+
+    low_stock = commands.add_parser(
+        "alertes-stock",
+        help="Recalcule la liste des produits sous leur seuil d'alerte",
+    )
+    low_stock.set_defaults(handler=_alertes_stock)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
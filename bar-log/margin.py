@@ -0,0 +1,124 @@
+"""
+Moteur de marge unique de l'application BarStock.
+
+Une seule regle de cout, declinee en trois formes qui donnent les memes
+chiffres:
+- unit_cost(): centimes (int) pour le chemin d'ecriture (data_access.py fige
+  vente.cout_unitaire au moment de la vente),
+- unit_cost_sql() / margin_sql(): expressions SQL pour les requetes et
+  backfills (data_access.py, maintenance.py),
+- unit_costs() / sale_lines(): version vectorisee pandas/NumPy pour les
+  DataFrame (brouillon de recu dans pages/sales.py, historiques en masse).
+
+Regle:
+- bouteille: cout = prix d'achat,
+- verre: cout = prix de vente bouteille / nombre de verres de la bouteille
+  (contenance / VERRE_MESURE_ML), si la contenance est connue; sinon prix
+  d'achat.
+Prix et couts en centimes entiers (money.py): le cout au verre est une
+division entiere arrondie au centime, demi vers le haut (comme ROUND()
+MySQL), sans Decimal ni float.
+
+numpy/pandas ne sont importes que par les fonctions vectorisees:
+data_access.py n'utilise que les formes entieres et SQL.
+"""
+
+# Volume d'un verre de mesure (ml) pour le rendement bouteille -> verres.
+VERRE_MESURE_ML = 50
+
+
+def _glass_cost(prix_vente_bouteille, quantite_ml):
+    """prix bouteille / (quantite_ml / VERRE_MESURE_ML), arrondi demi vers le haut."""
+    return (2 * prix_vente_bouteille * VERRE_MESURE_ML + quantite_ml) // (2 * quantite_ml)
+
+
+def unit_cost(prix_achat, prix_vente_bouteille, quantite_ml, type_vente):
+    """Retourne le cout unitaire (centimes) d'une unite vendue."""
+    quantite_ml = int(quantite_ml or 0)
+    if type_vente == "verre" and quantite_ml > 0:
+        return _glass_cost(int(prix_vente_bouteille or 0), quantite_ml)
+    return int(prix_achat or 0)
+
+
+def unit_cost_sql(type_vente="v.type_vente", produit="p"):
+    """
+    Expression SQL du cout unitaire (meme regle que unit_cost()).
+
+    type_vente: colonne/expression du type vendu,
+    produit: alias de la table produit jointe.
+    """
+    return (
+        f"CASE WHEN {type_vente} = 'verre' AND COALESCE({produit}.quantite_ml, 0) > 0 "
+        f"THEN ROUND({produit}.prix_vente_bouteille / ({produit}.quantite_ml / {VERRE_MESURE_ML}), 2) "
+        f"ELSE COALESCE({produit}.prix_achat, 0) END"
+    )
+
+
+def margin_sql(vente="v"):
+    """Expression SQL de la marge d'une ligne de vente (cout fige)."""
+    return f"({vente}.montant - {vente}.cout_unitaire * {vente}.quantite)"
+
+
+def _int_array(series):
+    """Colonne entiere (centimes, quantites; NULL -> 0) -> ndarray int64."""
+    import numpy as np
+    import pandas as pd
+
+    values = series.to_numpy()
+    if values.dtype.kind in "iu":
+        # Chemin rapide: colonne deja entiere (centimes de data_access.py).
+        return values.astype("int64", copy=False)
+    # Valeurs manquantes (float NaN, objets): conversion tolerante, plus lente.
+    values = pd.to_numeric(series, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    return np.rint(np.nan_to_num(values)).astype("int64")
+
+
+def _is_verre(df):
+    """Masque booleen des lignes vendues au verre."""
+    return df["type_vente"].to_numpy() == "verre"
+
+
+def unit_costs(df):
+    """
+    Version vectorisee de unit_cost() sur un DataFrame.
+
+    Colonnes attendues: type_vente, prix_achat, prix_vente_bouteille
+    (centimes), quantite_ml. Retourne un ndarray int64 aligne sur df.
+    """
+    import numpy as np
+
+    prix_achat = _int_array(df["prix_achat"])
+    prix_bouteille = _int_array(df["prix_vente_bouteille"])
+    quantite_ml = _int_array(df["quantite_ml"])
+    is_verre = _is_verre(df) & (quantite_ml > 0)
+
+    # Contenance 1 hors verres: division sans effet, resultat ignore.
+    glass = _glass_cost(prix_bouteille, np.where(is_verre, quantite_ml, 1))
+    return np.where(is_verre, glass, prix_achat)
+
+
+def sale_lines(df):
+    """
+    Calcule montant, cout et marge de lignes de vente en une passe vectorisee.
+
+    Colonnes attendues: quantite, type_vente, prix_achat,
+    prix_vente_bouteille, prix_vente_verre (centimes), quantite_ml.
+    Retourne une copie de df avec cout_unitaire, montant et marge (int64,
+    centimes: exacts, sans arrondi).
+    """
+    import numpy as np
+
+    result = df.copy()
+    quantite = _int_array(df["quantite"])
+    is_verre = _is_verre(df)
+    prix = np.where(
+        is_verre,
+        _int_array(df["prix_vente_verre"]),
+        _int_array(df["prix_vente_bouteille"]),
+    )
+    cout_unitaire = unit_costs(df)
+    montant = prix * quantite
+    result["cout_unitaire"] = cout_unitaire
+    result["montant"] = montant
+    result["marge"] = montant - cout_unitaire * quantite
+    return result
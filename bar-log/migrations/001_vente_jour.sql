@@ -0,0 +1,29 @@
+-- Resume journalier des ventes lu par les rapports et le tableau de bord.
+-- A executer une fois sur une base existante, puis l'application maintient
+-- la table a chaque vente. Rejouable a tout moment via:
+--   python maintenance.py rebuild-vente-jour
+
+CREATE TABLE IF NOT EXISTS vente_jour (
+  date_vente DATE NOT NULL,
+  id_categorie INT NOT NULL,
+  id_produit CHAR(8) NOT NULL DEFAULT '',
+  type_vente VARCHAR(20) NOT NULL,
+  quantite INT NOT NULL DEFAULT 0,
+  montant DECIMAL(14,2) NOT NULL DEFAULT 0,
+  cout DECIMAL(14,2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (date_vente, id_categorie, id_produit, type_vente)
+) ENGINE=InnoDB;
+
+DELETE FROM vente_jour;
+
+INSERT INTO vente_jour (date_vente, id_categorie, id_produit, type_vente, quantite, montant, cout)
+SELECT v.date_vente,
+       v.id_categorie,
+       COALESCE(v.id_produit, ''),
+       v.type_vente,
+       SUM(v.quantite),
+       SUM(v.montant),
+       SUM(COALESCE(p.prix_achat, 0) * v.quantite)
+FROM vente v
+LEFT JOIN produit p ON v.id_produit = p.id_produit
+GROUP BY v.date_vente, v.id_categorie, COALESCE(v.id_produit, ''), v.type_vente;
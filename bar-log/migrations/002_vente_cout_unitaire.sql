@@ -0,0 +1,30 @@
+-- Cout unitaire fige sur chaque ligne de vente: les marges deviennent des
+-- sommes mono-table et ne bougent plus quand les prix produit changent.
+-- Les ventes existantes sont valorisees avec les prix actuels (seule
+-- information disponible), selon la meme regle que l'application:
+-- bouteille -> prix_achat, verre -> prix_vente_bouteille / (quantite_ml / 50).
+
+ALTER TABLE vente
+  ADD COLUMN cout_unitaire DECIMAL(10,2) NOT NULL DEFAULT 0 AFTER montant;
+
+UPDATE vente v
+JOIN produit p ON v.id_produit = p.id_produit
+SET v.cout_unitaire = CASE
+  WHEN v.type_vente = 'verre' AND COALESCE(p.quantite_ml, 0) > 0
+    THEN ROUND(p.prix_vente_bouteille / (p.quantite_ml / 50), 2)
+  ELSE p.prix_achat
+END;
+
+-- Le resume journalier reprend les nouveaux couts.
+DELETE FROM vente_jour;
+
+INSERT INTO vente_jour (date_vente, id_categorie, id_produit, type_vente, quantite, montant, cout)
+SELECT v.date_vente,
+       v.id_categorie,
+       COALESCE(v.id_produit, ''),
+       v.type_vente,
+       SUM(v.quantite),
+       SUM(v.montant),
+       SUM(v.cout_unitaire * v.quantite)
+FROM vente v
+GROUP BY v.date_vente, v.id_categorie, COALESCE(v.id_produit, ''), v.type_vente;
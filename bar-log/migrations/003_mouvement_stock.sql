@@ -0,0 +1,56 @@
+-- Ledger des mouvements de stock: produit.stock_actuel devient un snapshot
+-- (fige a produit.id_mouvement_snapshot) et le stock courant vaut
+-- snapshot + mouvements posterieurs. Les ventes n'ecrivent plus dans produit.
+-- Le stock existant est repris en mouvement d'ouverture ('ajustement'),
+-- deja inclus dans le snapshot. A executer une fois sur une base existante.
+
+CREATE TABLE IF NOT EXISTS mouvement_stock (
+  id_mouvement BIGINT AUTO_INCREMENT PRIMARY KEY,
+  date_mouvement DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  id_produit CHAR(8) NOT NULL,
+  quantite INT NOT NULL,
+  type_mouvement VARCHAR(20) NOT NULL CHECK (type_mouvement IN ('entree', 'vente', 'ajustement')),
+  id_entree INT NULL,
+  id_recu INT NULL,
+  CONSTRAINT fk_mouvement_produit
+    FOREIGN KEY (id_produit) REFERENCES produit (id_produit)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS stock_snapshot (
+  id_produit CHAR(8) NOT NULL,
+  id_mouvement BIGINT NOT NULL,
+  stock INT NOT NULL,
+  date_snapshot DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (id_produit, id_mouvement),
+  CONSTRAINT fk_snapshot_produit
+    FOREIGN KEY (id_produit) REFERENCES produit (id_produit)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+CREATE INDEX idx_mouvement_produit ON mouvement_stock (id_produit, id_mouvement, quantite);
+CREATE INDEX idx_mouvement_date ON mouvement_stock (id_produit, date_mouvement);
+
+ALTER TABLE produit
+  ADD COLUMN id_mouvement_snapshot BIGINT NOT NULL DEFAULT 0 AFTER stock_actuel;
+
+-- Mouvement d'ouverture = stock actuel de chaque produit.
+INSERT INTO mouvement_stock (id_produit, quantite, type_mouvement)
+SELECT id_produit, stock_actuel, 'ajustement'
+FROM produit
+WHERE stock_actuel <> 0;
+
+UPDATE produit p
+JOIN (
+  SELECT id_produit, MAX(id_mouvement) AS id_mouvement
+  FROM mouvement_stock
+  GROUP BY id_produit
+) m ON m.id_produit = p.id_produit
+SET p.id_mouvement_snapshot = m.id_mouvement;
+
+INSERT INTO stock_snapshot (id_produit, id_mouvement, stock)
+SELECT id_produit, id_mouvement_snapshot, stock_actuel
+FROM produit
+WHERE id_mouvement_snapshot > 0;
@@ -0,0 +1,7 @@
+-- Identifiant de recu genere par la caisse (file d'ecriture asynchrone,
+-- rejeu): commit_receipt() ne cree qu'un recu par uuid_recu, un rejeu
+-- retourne le recu deja enregistre. NULL pour les recus existants.
+
+ALTER TABLE recu
+  ADD COLUMN uuid_recu CHAR(36) NULL AFTER nom_client,
+  ADD CONSTRAINT uk_recu_uuid UNIQUE (uuid_recu);
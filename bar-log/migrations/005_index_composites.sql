@@ -0,0 +1,30 @@
+-- Index composites alignes sur les requetes de data_access.py.
+-- InnoDB ajoute la cle primaire a chaque index secondaire: (a, b) se lit
+-- comme (a, b, id) et sert aussi le tri "b DESC, id DESC" des historiques.
+--
+-- vente (list_sales / count_sales: periode + categorie ou produit, tri
+-- date_vente DESC, id_vente DESC): egalite puis plage puis tri dans
+-- l'index, sans filesort; COUNT(*) couvert. idx_vente_categorie devient
+-- redondant, l'index implicite de fk_vente_produit est remplace par
+-- idx_vente_produit_date (MySQL le supprime de lui-meme).
+ALTER TABLE vente
+  ADD INDEX idx_vente_categorie_date (id_categorie, date_vente),
+  ADD INDEX idx_vente_produit_date (id_produit, date_vente),
+  DROP INDEX idx_vente_categorie;
+
+-- entree_stock (list_entries / count_entries: periode, produit optionnel):
+-- index couvrants, id_entree explicite pour garder l'ordre du tri keyset,
+-- la jointure produit se fait ensuite par cle primaire.
+ALTER TABLE entree_stock
+  ADD INDEX idx_entree_date_cover (date_entree, id_entree, id_produit, quantite),
+  ADD INDEX idx_entree_produit_date (id_produit, date_entree, id_entree, quantite),
+  DROP INDEX idx_entree_date;
+
+-- charge (list_charges / get_charge_total: periode, tri date DESC, id DESC):
+-- couvrant, la table n'est plus lue.
+ALTER TABLE charge
+  ADD INDEX idx_charge_date_cover (date_charge, id_charge, montant, type_charge),
+  DROP INDEX idx_charge_date;
+
+-- produit (list_products pagine: tri nom_produit, id_produit).
+CREATE INDEX idx_produit_nom ON produit (nom_produit);
@@ -0,0 +1,41 @@
+-- Seuil de reapprovisionnement par produit et ensemble des produits sous
+-- leur seuil (alerte_stock), tenu a jour par les ecritures qui changent le
+-- stock (data_access._flag_low_stock). Le tableau de bord ne lit plus que
+-- ces lignes au lieu de calculer le stock de tout le catalogue.
+-- notifie_le: date de l'alerte poussee par alerts.py (NULL = a notifier);
+-- la ligne disparait quand le stock repasse au-dessus du seuil, un
+-- nouveau franchissement est donc notifie a nouveau.
+
+ALTER TABLE produit
+  ADD COLUMN seuil_alerte INT NOT NULL DEFAULT 5 CHECK (seuil_alerte >= 0) AFTER quantite_ml;
+
+CREATE TABLE IF NOT EXISTS alerte_stock (
+  id_produit CHAR(8) PRIMARY KEY,
+  stock INT NOT NULL,
+  seuil INT NOT NULL,
+  depuis DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  notifie_le DATETIME NULL,
+  CONSTRAINT fk_alerte_produit
+    FOREIGN KEY (id_produit) REFERENCES produit (id_produit)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+CREATE INDEX idx_alerte_notifie ON alerte_stock (notifie_le, depuis);
+
+-- Etat initial: produits deja sous leur seuil, consideres comme notifies
+-- (pas de rafale d'alertes a la mise en service).
+INSERT INTO alerte_stock (id_produit, stock, seuil, notifie_le)
+SELECT s.id_produit, s.stock, s.seuil_alerte, NOW()
+FROM (
+  SELECT p.id_produit,
+         p.seuil_alerte,
+         CAST(p.stock_actuel + COALESCE((
+           SELECT SUM(m.quantite)
+           FROM mouvement_stock m
+           WHERE m.id_produit = p.id_produit
+             AND m.id_mouvement > p.id_mouvement_snapshot
+         ), 0) AS SIGNED) AS stock
+  FROM produit p
+) s
+WHERE s.stock <= s.seuil_alerte;
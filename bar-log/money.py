@@ -0,0 +1,83 @@
+"""
+Montants en centimes entiers (virgule fixe) de l'application BarStock.
+
+La base garde des DECIMAL(.., 2); tout le reste du code manipule des
+entiers en centimes (int Python, ndarray/Series int64). La conversion se
+fait une seule fois, a la frontiere base:
+- lectures: data_access.py convertit les colonnes MONEY_COLUMNS
+  (to_cents / to_cents_array),
+- ecritures: data_access.py repasse les centimes en Decimal pour MySQL
+  (to_decimal).
+
+Interaction:
+- ui.py formate les centimes (fmt_fcfa, fmt_int_series) sans Decimal,
+- pages/*.py convertissent la saisie (number_input en FCFA) par
+  from_input() et la pre-remplissent par to_input(),
+- margin.py calcule couts et marges en centimes.
+
+Les colonnes sont reconnues par leur nom (alias SQL): une somme de
+quantites revient aussi en DECIMAL et ne doit pas etre multipliee.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+
+MONEY_SCALE = 100
+
+# Colonnes monetaires des resultats SQL (noms ou alias).
+MONEY_COLUMNS = frozenset(
+    {
+        "prix_achat",
+        "prix_vente",
+        "prix_vente_bouteille",
+        "prix_vente_verre",
+        "montant",
+        "marge",
+        "cout",
+        "cout_unitaire",
+        "total_ventes",
+        "total_charges",
+    }
+)
+
+
+def to_cents(value):
+    """Montant (Decimal/int/float/None) -> centimes (int), demi vers le haut."""
+    if value is None:
+        return 0
+    if isinstance(value, Decimal):
+        # Exact: les DECIMAL(.., 2) de la base ont au plus deux decimales.
+        return int((value * MONEY_SCALE).to_integral_value(rounding=ROUND_HALF_UP))
+    return int(round(float(value) * MONEY_SCALE))
+
+
+def to_cents_array(values):
+    """Colonne de montants (Decimal/float/None) -> ndarray int64 de centimes (NULL -> 0)."""
+    import numpy as np
+    import pandas as pd
+
+    try:
+        floats = np.asarray(values, dtype="float64")
+    except (TypeError, ValueError):
+        floats = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype="float64")
+    # float64 -> centimes: exact tant que |montant| < 2**53 / 100.
+    return np.rint(np.nan_to_num(floats) * MONEY_SCALE).astype("int64")
+
+
+def to_decimal(cents):
+    """Centimes -> Decimal a deux decimales (parametre SQL)."""
+    return Decimal(int(cents or 0)).scaleb(-2)
+
+
+def from_input(value):
+    """Saisie en FCFA (number_input, float) -> centimes."""
+    return int(round(float(value or 0) * MONEY_SCALE))
+
+
+def to_input(cents):
+    """Centimes -> FCFA (float) pour pre-remplir un number_input."""
+    return int(cents or 0) / MONEY_SCALE
+
+
+def to_units(cents):
+    """Centimes -> FCFA entiers, demi vers le haut (int ou ndarray int64)."""
+    return (cents + MONEY_SCALE // 2) // MONEY_SCALE
@@ -0,0 +1,141 @@
+"""
+Page "Diagnostics": requetes SQL les plus couteuses par rendu de page.
+
+Interaction:
+- streamlit_app.py n'ajoute cette page au menu que si BARLOG_ADMIN=1,
+- query_log.py fournit les rendus et requetes mesures (ring buffer process),
+- data_access.cache_stats() donne l'etat du cache catalogue,
+- search.index_stats() celui de l'index de recherche produit,
+- kpi.kpi_stats() celui du service des KPI du jour,
+- alerts.alert_stats() celui du notificateur d'alertes stock,
+- data_access.sale_stats() / recent_oversells() les surventes constatees.
+"""
+
+import streamlit as st
+
+from alerts import alert_stats
+from data_access import cache_stats, recent_oversells, sale_stats
+from kpi import kpi_stats
+import query_log
+from search import index_stats
+from ui import render_page_title, show_dataframe
+
+# Label de la page dans le menu (ses propres rendus sont exclus de la liste).
+ADMIN_PAGE_LABEL = "Diagnostics"
+
+_QUERY_COLUMNS = [
+    "fingerprint_id",
+    "caller",
+    "calls",
+    "distinct_params",
+    "rows",
+    "total_ms",
+    "max_ms",
+    "connect_ms",
+    "execute_ms",
+    "fetch_ms",
+    "build_ms",
+    "fingerprint",
+]
+
+
+def _render_label(render):
+    """Libelle d'un rendu dans le selecteur."""
+    return (
+        f"#{render['render_id']} {render['page']} ({render['started']}) - "
+        f"{render['duration_ms']:.0f} ms, {render['queries']} req., {render['sql_ms']:.0f} ms SQL"
+    )
+
+
+def _queries_frame(rows, columns=_QUERY_COLUMNS):
+    """DataFrame d'affichage des requetes (agregees ou brutes si columns=None)."""
+    import pandas as pd
+
+    return pd.DataFrame(rows, columns=columns)
+
+
+def render_admin():
+    """Rend le panneau Diagnostics (rendus recents + top N requetes)."""
+    render_page_title(ADMIN_PAGE_LABEL, "Requetes SQL par rendu de page")
+
+    settings = query_log.settings()
+    if not settings["enabled"]:
+        st.info("Instrumentation desactivee (BARLOG_QUERY_LOG=0)")
+        return
+    slow_log = settings["slow_query_log"] or "desactive"
+    st.caption(
+        f"Ring buffer: {settings['ring_size']} requetes - seuil lent: "
+        f"{settings['slow_query_ms']:.0f} ms - journal JSONL: {slow_log}"
+    )
+
+    stats = cache_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Cache hits", stats["hits"])
+    col2.metric("Cache misses", stats["misses"])
+    col3.metric("Hit ratio", f"{stats['hit_ratio']:.0%}")
+    col4.metric("Entrees cache", stats["entries"])
+
+    search_stats = index_stats()
+    if search_stats["version"] is not None:
+        st.caption(
+            f"Index de recherche: {search_stats['products']} produits, {search_stats['words']} mots, "
+            f"construit en {search_stats['build_ms']:.1f} ms (catalogue v{search_stats['version']})"
+        )
+    kpi_state = kpi_stats()
+    if kpi_state["polls"]:
+        error = f" - derniere erreur: {kpi_state['last_error']}" if kpi_state["last_error"] else ""
+        st.caption(
+            f"KPI du jour: {kpi_state['polls']} controles, {kpi_state['refreshes']} recalculs{error}"
+        )
+    alert_state = alert_stats()
+    if alert_state["checked_at"] or alert_state["last_error"]:
+        error = f" - derniere erreur: {alert_state['last_error']}" if alert_state["last_error"] else ""
+        st.caption(
+            f"Alertes stock: {alert_state['notified']} notifiees, "
+            f"{alert_state['webhook_errors']} echecs webhook{error}"
+        )
+
+    sales = sale_stats()
+    if sales["transactions"]:
+        st.caption(
+            f"Ventes stockables: {sales['transactions']} transactions, {sales['retries']} reprises, "
+            f"{sales['conflicts']} conflits de stock, {sales['oversells']} surventes"
+        )
+    oversells = recent_oversells()
+    if oversells:
+        last = oversells[-1]
+        st.warning(
+            f"{len(oversells)} survente(s) constatee(s), derniere: "
+            f"{last['id_produit']} (stock {last['stock']}). Corriger par un ajustement de stock "
+            "(page Produits). Ventes simultanees a la caisse ou recus saisis hors ligne: "
+            "BARLOG_SALE_MODE ne s'applique pas a la caisse, seulement aux API directes."
+        )
+
+    limit = st.slider("Top N requetes", min_value=5, max_value=50, value=10, step=5)
+    renders = [render for render in query_log.renders() if render["page"] != ADMIN_PAGE_LABEL]
+
+    st.subheader("Par rendu de page")
+    if not renders:
+        st.info("Aucun rendu mesure pour le moment: naviguez sur une page puis revenez ici")
+    else:
+        by_id = {render["render_id"]: render for render in renders}
+        selected_id = st.selectbox(
+            "Rendu",
+            list(by_id.keys()),
+            format_func=lambda render_id: _render_label(by_id[render_id]),
+            key="admin_render",
+        )
+        show_dataframe(
+            _queries_frame(query_log.top_queries(limit, render_id=selected_id)),
+            "Aucune requete SQL sur ce rendu",
+        )
+
+    st.subheader("Toutes pages (ring buffer)")
+    show_dataframe(_queries_frame(query_log.top_queries(limit)), "Aucune requete mesuree")
+
+    with st.expander("Dernieres requetes"):
+        show_dataframe(_queries_frame(query_log.recent(limit * 5), columns=None), "Aucune requete mesuree")
+
+    if st.button("Vider les mesures", key="admin_clear"):
+        query_log.clear()
+        st.rerun()
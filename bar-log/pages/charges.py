@@ -12,7 +12,8 @@ from datetime import date
 import streamlit as st
 
 from data_access import add_charge, delete_charge, list_charges, update_charge
-from ui import render_page_title, show_dataframe
+from money import from_input, to_input
+from ui import money_frame, render_page_title, show_dataframe
 
 
 def render_charges():
@@ -59,7 +60,7 @@ def render_charges():
             if not type_charge:
                 st.error("Type charge requis")
             else:
-                add_charge(type_charge, montant, date_charge)
+                add_charge(type_charge, from_input(montant), date_charge)
                 st.session_state["charge_added"] = True
                 st.session_state["charge_reset"] = True
                 st.rerun()
@@ -73,7 +74,7 @@ def render_charges():
             st.info("Aucune charge a modifier")
         else:
             event = st.dataframe(
-                charges_df,
+                money_frame(charges_df),
                 use_container_width=True,
                 hide_index=True,
                 on_select="rerun",
@@ -90,7 +91,7 @@ def render_charges():
                 if st.button("Charger pour modifier", key="load_charge_edit"):
                     st.session_state["edit_charge_id"] = selected_charge["id_charge"]
                     st.session_state["edit_charge_type"] = selected_charge["type_charge"]
-                    st.session_state["edit_charge_montant"] = float(
+                    st.session_state["edit_charge_montant"] = to_input(
                         selected_charge["montant"]
                     )
                     st.session_state["edit_charge_date"] = selected_charge[
@@ -116,7 +117,7 @@ def render_charges():
                         update_charge(
                             st.session_state["edit_charge_id"],
                             type_charge,
-                            montant,
+                            from_input(montant),
                             date_charge,
                         )
                         st.success("Charge modifiee")
@@ -3,20 +3,25 @@ Page "Tableau de bord".
 
 Interaction:
 - Appelee depuis streamlit_app.py via le mapping PAGES.
-- Lit les KPI et listes via data_access.py.
+- Lit les KPI du jour via kpi.py (memoire du process) et les listes via
+  data_access.py.
+- Affiche les alertes stock notifiees par alerts.py (toasts).
 - Reutilise les composants d'affichage communs de ui.py.
 """
 
-from datetime import date
-from decimal import Decimal
-from html import escape
 from textwrap import dedent
 
 import streamlit as st
 
-from data_access import get_charge_total, get_sales_totals, list_low_stock
+from data_access import list_low_stock
+import alerts
+import kpi
+from profiling import profiled
+import ui
 from ui import fmt_fcfa, render_page_title
 
+ALERT_TOASTS = 5
+
 
 def _dashboard_category_class(category_name):
     """Retourne la classe CSS de badge selon la categorie."""
@@ -30,39 +35,42 @@ def _dashboard_category_class(category_name):
     return "dashboard-pill-gray"
 
 
-def _build_low_stock_table_html(low_stock_df):
-    """Construit le tableau HTML de stock faible (style maquette)."""
-    rows = low_stock_df.to_dict("records")
-    body_rows = []
-
-    if not rows:
-        body_rows.append(
-            "<tr><td colspan='4' class='dashboard-low-stock-empty'>Aucun produit sous le seuil</td></tr>"
-        )
+@profiled("html")
+def _build_low_stock_table_html(low_stock_df, max_rows=None):
+    """Construit le tableau HTML de stock faible (style maquette, rendu par colonnes)."""
+    # Resultat vide: etat vide sans lire de colonne.
+    if low_stock_df.empty:
+        body_rows = ""
     else:
-        for row in rows:
-            product_id = escape(str(row.get("id_produit") or "-"))
-            product_name = escape(str(row.get("nom_produit") or "-"))
-            category = str(row.get("categorie") or "Sans categorie")
-            stock = escape(str(row.get("stock_actuel") or 0))
-            category_safe = escape(category)
-            badge_class = _dashboard_category_class(category)
-
-            body_rows.append(
-                dedent(
-                    f"""
-                    <tr>
-                      <td class="dashboard-low-stock-id">{product_id}</td>
-                      <td>{product_name}</td>
-                      <td><span class="dashboard-pill {badge_class}">{category_safe}</span></td>
-                      <td class="dashboard-low-stock-value">{stock}</td>
-                    </tr>
-                    """
-                ).strip()
-            )
+        if max_rows:
+            low_stock_df = low_stock_df.head(max_rows)
+        category = low_stock_df["categorie"].astype(object).where(low_stock_df["categorie"].notna(), "Sans categorie")
+        category = category.where(category.astype(str) != "", "Sans categorie")
+
+        body_rows = ui.html_rows(
+            [
+                '<tr><td class="dashboard-low-stock-id">',
+                ui.escape_series(low_stock_df["id_produit"], "-"),
+                "</td><td>",
+                ui.escape_series(low_stock_df["nom_produit"], "-"),
+                '</td><td><span class="dashboard-pill ',
+                ui.class_series(category, _dashboard_category_class),
+                '">',
+                ui.escape_series(category),
+                '</span></td><td class="dashboard-low-stock-value">',
+                ui.escape_series(low_stock_df["stock_actuel"].fillna(0), "0"),
+                '</td><td class="dashboard-low-stock-value">',
+                ui.escape_series(low_stock_df["seuil_alerte"].fillna(0), "0"),
+                "</td></tr>",
+            ],
+            low_stock_df.index,
+        )
+
+    if not body_rows:
+        body_rows = "<tr><td colspan='5' class='dashboard-low-stock-empty'>Aucun produit sous le seuil</td></tr>"
 
     return dedent(
-        f"""
+        """
         <div class="dashboard-low-stock-wrap">
           <table class="dashboard-low-stock-table">
             <thead>
@@ -71,18 +79,43 @@ def _build_low_stock_table_html(low_stock_df):
                 <th>NOM_PRODUIT</th>
                 <th>CATEGORIE</th>
                 <th class="dashboard-low-stock-right">STOCK_ACTUEL</th>
+                <th class="dashboard-low-stock-right">SEUIL</th>
               </tr>
             </thead>
             <tbody>
-              {''.join(body_rows)}
+              {rows}
             </tbody>
           </table>
           <div class="dashboard-low-stock-foot">
-            Affichage des produits dont le stock est inferieur au seuil defini.
+            Affichage des produits dont le stock est inferieur ou egal a leur seuil d'alerte.
           </div>
         </div>
         """
-    ).strip()
+    ).strip().replace("{rows}", body_rows)
+
+
+def _render_kpi_freshness(totals):
+    """Affiche l'age des KPI du jour (avertissement s'ils sont perimes)."""
+    age = int(totals["age_seconds"])
+    if totals["stale"]:
+        reason = f" ({totals['last_error']})" if totals["last_error"] else ""
+        st.warning(f"Chiffres du jour non actualises depuis {age} s{reason}")
+    else:
+        st.caption(f"Chiffres du jour controles il y a {age} s")
+
+
+def _show_new_alerts():
+    """Affiche en toast les alertes stock notifiees depuis le dernier rendu de la session."""
+    seen = st.session_state.get("dashboard_alert_seen", 0)
+    new_alerts = alerts.recent_alerts(seen)
+    # Quelques toasts au plus (premiere visite: historique du process).
+    for alert in new_alerts[-ALERT_TOASTS:]:
+        st.toast(
+            f"Stock bas: {alert['nom_produit']} ({alert['stock']} / seuil {alert['seuil']})",
+            icon=":material/warning:",
+        )
+    if new_alerts:
+        st.session_state["dashboard_alert_seen"] = new_alerts[-1]["sequence"]
 
 
 def render_dashboard():
@@ -92,30 +125,28 @@ def render_dashboard():
     - tableau des produits en stock faible.
     """
     render_page_title("Tableau de bord", "Vue globale du jour")
-    today = date.today()
+    alerts.start()
+    _show_new_alerts()
 
-    # Lecture des donnees de la journee depuis la couche SQL.
-    totals = get_sales_totals(today, today)
-    total_ventes = totals["total_ventes"] if totals else 0
-    marge = totals["marge"] if totals else 0
-    total_charges = get_charge_total(today, today)
-    net = Decimal(str(marge)) - Decimal(str(total_charges))
+    # KPI du jour servis par la memoire du process (kpi.py), pas par SQL.
+    totals = kpi.today_totals()
 
     # Affichage des KPI financiers.
     col1, col2, col4 = st.columns(3)
-    col1.metric("Ventes du jour", fmt_fcfa(total_ventes))
-    col2.metric("Marge du jour", fmt_fcfa(marge))
-    col4.metric("Net du jour", fmt_fcfa(net))
+    col1.metric("Ventes du jour", fmt_fcfa(totals["total_ventes"]))
+    col2.metric("Marge du jour", fmt_fcfa(totals["marge"]))
+    col4.metric("Net du jour", fmt_fcfa(totals["net"]))
+    _render_kpi_freshness(totals)
 
-    # Monitoring stock: un seuil utilisateur pilote la requete list_low_stock().
+    # Monitoring stock: seuil par produit, ensemble alerte_stock tenu a jour
+    # par les ecritures de stock (aucun calcul de stock ici).
     st.subheader("Stock faible")
     with st.container(border=True, key="dashboard_low_stock_card"):
-        threshold = st.number_input(
-            "Seuil stock faible",
-            min_value=0,
-            value=5,
-            step=1,
-            width="stretch",
+        low_stock_df = list_low_stock()
+        low_stock_cap = ui.get_row_cap("dashboard_low_stock_rows")
+        st.markdown(_build_low_stock_table_html(low_stock_df, low_stock_cap), unsafe_allow_html=True)
+        ui.render_load_more(
+            "dashboard_low_stock_rows",
+            min(low_stock_cap, len(low_stock_df)),
+            len(low_stock_df),
         )
-        low_stock_df = list_low_stock(threshold)
-        st.markdown(_build_low_stock_table_html(low_stock_df), unsafe_allow_html=True)
@@ -2,19 +2,22 @@
 Page "Entrees de stock".
 
 Interaction:
-- utilise list_products() pour proposer les articles existants,
+- utilise list_products() pour proposer les articles existants (filtres
+  et classes par la recherche de la sidebar, search.py),
 - utilise add_stock_entry() pour creer l'entree + mettre a jour le stock,
 - utilise list_entries() pour afficher l'historique filtre.
 """
 
-import math
 from datetime import date
-from html import escape
 from textwrap import dedent
 
 import streamlit as st
 
-from data_access import add_stock_entry, list_entries, list_products
+from data_access import add_stock_entry, count_entries, list_entries, list_products
+from money import from_input
+from profiling import profiled
+from search import filter_product_map
+import ui
 from ui import build_product_map, render_page_title
 
 
@@ -50,48 +53,44 @@ def _entry_icon_for_category(category_name):
     return "inventory_2", "entries-icon-gray"
 
 
+@profiled("html")
 def _build_entries_table_html(entries_df):
-    """Construit le tableau HTML de l'historique des entrees."""
-    rows_html = []
-    rows = entries_df.to_dict("records")
-
-    for row in rows:
-        date_text = escape(str(row.get("date_entree") or ""))
-        product_name = escape(str(row.get("nom_produit") or "-"))
-        category = str(row.get("categorie") or "Sans categorie")
-        category_safe = escape(category)
-        qty_text = escape(str(row.get("quantite") or 0))
-
-        badge_class = _entry_category_class(category)
-        icon_name, icon_class = _entry_icon_for_category(category)
-
-        rows_html.append(
-            dedent(
-                f"""
-                <tr>
-                  <td>{date_text}</td>
-                  <td>
-                    <div class="entries-product-cell">
-                      <div class="entries-product-icon {icon_class}">
-                        <span class="material-symbols-outlined">{icon_name}</span>
-                      </div>
-                      <div class="entries-product-name">{product_name}</div>
-                    </div>
-                  </td>
-                  <td><span class="entries-pill {badge_class}">{category_safe}</span></td>
-                  <td class="entries-col-right">{qty_text}</td>
-                </tr>
-                """
-            ).strip()
+    """Construit le tableau HTML de l'historique des entrees (rendu par colonnes)."""
+    # Resultat vide: etat vide sans lire de colonne.
+    if entries_df.empty:
+        rows_html = ""
+    else:
+        category = entries_df["categorie"].astype(object).where(entries_df["categorie"].notna(), "Sans categorie")
+        category = category.where(category.astype(str) != "", "Sans categorie")
+        icon_name = ui.class_series(category, lambda name: _entry_icon_for_category(name)[0])
+        icon_class = ui.class_series(category, lambda name: _entry_icon_for_category(name)[1])
+
+        rows_html = ui.html_rows(
+            [
+                "<tr><td>",
+                ui.escape_series(entries_df["date_entree"]),
+                '</td><td><div class="entries-product-cell"><div class="entries-product-icon ',
+                icon_class,
+                '"><span class="material-symbols-outlined">',
+                icon_name,
+                '</span></div><div class="entries-product-name">',
+                ui.escape_series(entries_df["nom_produit"], "-"),
+                '</div></div></td><td><span class="entries-pill ',
+                ui.class_series(category, _entry_category_class),
+                '">',
+                ui.escape_series(category),
+                '</span></td><td class="entries-col-right">',
+                ui.escape_series(entries_df["quantite"].fillna(0), "0"),
+                "</td></tr>",
+            ],
+            entries_df.index,
         )
 
     if not rows_html:
-        rows_html.append(
-            "<tr><td colspan='4' class='entries-empty'>Aucune entree sur la periode</td></tr>"
-        )
+        rows_html = "<tr><td colspan='4' class='entries-empty'>Aucune entree sur la periode</td></tr>"
 
     return dedent(
-        f"""
+        """
         <div class="entries-history-table-wrap">
           <table class="entries-history-table">
             <thead>
@@ -103,12 +102,12 @@ def _build_entries_table_html(entries_df):
               </tr>
             </thead>
             <tbody>
-              {''.join(rows_html)}
+              {rows}
             </tbody>
           </table>
         </div>
         """
-    ).strip()
+    ).strip().replace("{rows}", rows_html)
 
 
 def render_entries():
@@ -116,6 +115,13 @@ def render_entries():
     render_page_title("Entrees de stock", "Approvisionnements et historique")
     products_df = list_products()
     product_map = build_product_map(products_df) if not products_df.empty else {}
+    # Recherche de la sidebar: options de saisie restreintes et classees par
+    # pertinence (le filtre de l'historique garde tout le catalogue).
+    picker_map = filter_product_map(
+        product_map,
+        st.session_state.get("sidebar_search", ""),
+        keep=st.session_state.get("entry_product"),
+    )
 
     # Reinitialisation controlee des widgets apres un enregistrement reussi.
     if st.session_state.get("entry_reset"):
@@ -217,9 +223,9 @@ def render_entries():
             else:
                 selected = st.selectbox(
                     "Produit",
-                    list(product_map.keys()),
+                    list(picker_map.keys()),
                     index=None,
-                    placeholder="Selectionner un produit",
+                    placeholder="Selectionner un produit" if picker_map else "Aucun produit pour la recherche",
                     key="entry_product",
                     width="stretch",
                 )
@@ -295,12 +301,10 @@ def render_entries():
         product_id = None
         if product_filter != "Tous les produits":
             product_id = product_map[product_filter]["id_produit"]
-        entries_df = list_entries(start_date, end_date, product_id)
-
+        # Pagination serveur (keyset): une page lue par rerun, total via COUNT.
         page_size = 5
-        total_entries = len(entries_df)
-        total_pages = max(1, math.ceil(total_entries / page_size))
         page_key = "entries_history_page"
+        cursor_key = "entries_history_cursor"
         filters_key = (
             str(start_date),
             str(end_date),
@@ -310,17 +314,28 @@ def render_entries():
         if st.session_state.get("entries_history_filters") != filters_key:
             st.session_state["entries_history_filters"] = filters_key
             st.session_state[page_key] = 1
+            st.session_state[cursor_key] = None
+
+        total_entries = count_entries(start_date, end_date, product_id)
+        page = list_entries(
+            start_date,
+            end_date,
+            product_id,
+            cursor=st.session_state.get(cursor_key),
+            limit=page_size,
+        )
+        if page.rows.empty and st.session_state.get(cursor_key):
+            st.session_state[cursor_key] = None
+            st.session_state[page_key] = 1
+            page = list_entries(start_date, end_date, product_id, limit=page_size)
 
-        current_page = st.session_state.get(page_key, 1)
-        if current_page < 1:
+        current_page = max(1, st.session_state.get(page_key, 1))
+        if page.prev_cursor is None:
             current_page = 1
-        if current_page > total_pages:
-            current_page = total_pages
         st.session_state[page_key] = current_page
 
         start_index = (current_page - 1) * page_size
-        end_index = min(start_index + page_size, total_entries)
-        page_df = entries_df.iloc[start_index:end_index] if total_entries else entries_df
+        end_index = start_index + len(page.rows)
 
         with st.container(border=True, key="entries_history_card"):
             st.markdown(
@@ -332,13 +347,13 @@ def render_entries():
                 ),
                 unsafe_allow_html=True,
             )
-            st.markdown(_build_entries_table_html(page_df), unsafe_allow_html=True)
+            st.markdown(_build_entries_table_html(page.rows), unsafe_allow_html=True)
 
             footer_cols = st.columns([5, 0.45, 0.45], vertical_alignment="center")
             footer_cols[0].markdown(
                 (
                     "<div class='entries-history-count'>"
-                    f"Affichage de {start_index + 1 if total_entries else 0} a {end_index} "
+                    f"Affichage de {start_index + 1 if end_index else 0} a {end_index} "
                     f"sur {total_entries} resultats"
                     "</div>"
                 ),
@@ -349,19 +364,21 @@ def render_entries():
                 "‹",
                 key="entries_hist_prev",
                 width="stretch",
-                disabled=current_page <= 1,
+                disabled=page.prev_cursor is None,
             )
             next_clicked = footer_cols[2].button(
                 "›",
                 key="entries_hist_next",
                 width="stretch",
-                disabled=current_page >= total_pages,
+                disabled=page.next_cursor is None,
             )
 
             if prev_clicked:
+                st.session_state[cursor_key] = page.prev_cursor
                 st.session_state[page_key] = current_page - 1
                 st.rerun()
             if next_clicked:
+                st.session_state[cursor_key] = page.next_cursor
                 st.session_state[page_key] = current_page + 1
                 st.rerun()
 
@@ -378,8 +395,8 @@ def render_entries():
                 product["id_produit"],
                 quantite,
                 date_entree,
-                prix_achat,
-                prix_vente,
+                from_input(prix_achat),
+                from_input(prix_vente),
                 unite_vente,
             )
             st.session_state["entry_added"] = True
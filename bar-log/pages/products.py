@@ -7,20 +7,25 @@ Interaction:
 - ui.py fournit les helpers visuels et de mapping utilises ici.
 """
 
-import math
-from decimal import Decimal
 from html import escape
 from textwrap import dedent
 
+import numpy as np
+import pandas as pd
 import streamlit as st
 
 from data_access import (
+    DEFAULT_SEUIL_ALERTE,
+    count_products,
     create_product,
     delete_product,
     list_categories,
     list_products,
     update_product,
 )
+from money import from_input, to_input
+from profiling import profiled
+import ui
 from ui import (
     build_category_map,
     get_category_key,
@@ -28,20 +33,6 @@ from ui import (
 )
 
 
-def _to_decimal(value):
-    """Convertit une valeur numerique en Decimal de maniere robuste."""
-    try:
-        return Decimal(str(value))
-    except Exception:
-        return Decimal("0")
-
-
-def _fmt_int(value):
-    """Formate un montant en entier avec separateur espace."""
-    number = int(_to_decimal(value).quantize(Decimal("1")))
-    return f"{number:,}".replace(",", " ")
-
-
 def _product_category_class(category_name):
     """Retourne la classe CSS de badge selon la categorie."""
     name = (category_name or "").lower()
@@ -58,19 +49,6 @@ def _product_category_class(category_name):
     return "products-pill-gray"
 
 
-def _stock_class(stock_value):
-    """Retourne la classe CSS de couleur de stock."""
-    try:
-        stock = int(stock_value)
-    except Exception:
-        stock = 0
-    if stock <= 0:
-        return "products-stock-red"
-    if stock <= 10:
-        return "products-stock-amber"
-    return "products-stock-green"
-
-
 def _fmt_product_id(raw_id):
     """Normalise l'ID produit au format de la maquette (PR000001)."""
     value = str(raw_id or "").strip()
@@ -83,47 +61,81 @@ def _fmt_product_id(raw_id):
     return value
 
 
+def _fmt_product_id_series(ids):
+    """Version colonne de _fmt_product_id() (PR000001)."""
+    text = ids.astype(object).where(ids.notna(), "").astype(str).str.strip()
+    upper = text.str.upper()
+    digits = "PR" + text.str.lstrip("0").str.zfill(6)
+    result = np.where(
+        upper.str.startswith("PR"),
+        upper,
+        np.where(text.str.isdigit(), digits, text),
+    )
+    result = pd.Series(result, index=ids.index)
+    return result.where(result != "", "-")
+
+
+def _stock_values(products_df):
+    """Colonne stock_actuel en int64 (0 si vide)."""
+    return pd.to_numeric(products_df["stock_actuel"], errors="coerce").fillna(0).astype("int64")
+
+
+def _stock_class_series(stock):
+    """Retourne la classe CSS de couleur de stock, par ligne."""
+    values = stock.to_numpy()
+    return pd.Series(
+        np.select(
+            [values <= 0, values <= 10],
+            ["products-stock-red", "products-stock-amber"],
+            "products-stock-green",
+        ),
+        index=stock.index,
+    )
+
+
+@profiled("html")
 def _build_products_list_html(products_df):
-    """Construit le HTML du tableau liste des produits."""
-    rows_html = []
-    for row in products_df.to_dict("records"):
-        product_id = escape(_fmt_product_id(row.get("id_produit")))
-        product_name = escape(str(row.get("nom_produit") or "-"))
-        category = str(row.get("categorie") or "Sans categorie")
-        category_safe = escape(category)
-        category_class = _product_category_class(category)
-        prix_achat = escape(_fmt_int(row.get("prix_achat")))
-        prix_btl = escape(_fmt_int(row.get("prix_vente_bouteille")))
-        prix_verre = escape(_fmt_int(row.get("prix_vente_verre")))
-        stock_raw = row.get("stock_actuel") or 0
-        stock_safe = escape(str(stock_raw))
-        stock_class = _stock_class(stock_raw)
-        unite = escape(str(row.get("unite_vente") or "-"))
-
-        rows_html.append(
-            dedent(
-                f"""
-                <tr>
-                  <td class="products-col-id">{product_id}</td>
-                  <td class="products-col-name">{product_name}</td>
-                  <td><span class="products-pill {category_class}">{category_safe}</span></td>
-                  <td class="products-col-number">{prix_achat}</td>
-                  <td class="products-col-number">{prix_btl}</td>
-                  <td class="products-col-number">{prix_verre}</td>
-                  <td class="products-col-stock {stock_class}">{stock_safe}</td>
-                  <td class="products-col-unit">{unite}</td>
-                </tr>
-                """
-            ).strip()
+    """Construit le HTML du tableau liste des produits (rendu par colonnes)."""
+    # Resultat vide: etat vide sans lire de colonne.
+    if products_df.empty:
+        rows_html = ""
+    else:
+        index = products_df.index
+        category = products_df["categorie"].astype(object).where(products_df["categorie"].notna(), "Sans categorie")
+        stock = _stock_values(products_df)
+
+        rows_html = ui.html_rows(
+            [
+                '<tr><td class="products-col-id">',
+                ui.escape_series(_fmt_product_id_series(products_df["id_produit"])),
+                '</td><td class="products-col-name">',
+                ui.escape_series(products_df["nom_produit"], "-"),
+                '</td><td><span class="products-pill ',
+                ui.class_series(category, _product_category_class),
+                '">',
+                ui.escape_series(category, "Sans categorie"),
+                '</span></td><td class="products-col-number">',
+                ui.fmt_int_series(products_df["prix_achat"]),
+                '</td><td class="products-col-number">',
+                ui.fmt_int_series(products_df["prix_vente_bouteille"]),
+                '</td><td class="products-col-number">',
+                ui.fmt_int_series(products_df["prix_vente_verre"]),
+                '</td><td class="products-col-stock ',
+                _stock_class_series(stock),
+                '">',
+                stock.astype(str),
+                '</td><td class="products-col-unit">',
+                ui.escape_series(products_df["unite_vente"], "-"),
+                "</td></tr>",
+            ],
+            index,
         )
 
     if not rows_html:
-        rows_html.append(
-            "<tr><td colspan='8' class='products-list-empty'>Aucun produit</td></tr>"
-        )
+        rows_html = "<tr><td colspan='8' class='products-list-empty'>Aucun produit</td></tr>"
 
     return dedent(
-        f"""
+        """
         <div class="products-list-card">
           <table class="products-list-table">
             <thead>
@@ -139,105 +151,115 @@ def _build_products_list_html(products_df):
               </tr>
             </thead>
             <tbody>
-              {''.join(rows_html)}
+              {rows}
             </tbody>
           </table>
         </div>
         """
-    ).strip()
-
-
-def _stock_bar_width(stock_value):
-    """Retourne une largeur de barre (0-100) pour visualiser le stock."""
-    try:
-        stock = max(0, int(stock_value))
-    except Exception:
-        stock = 0
-    return min(100, int((stock / 30) * 100)) if stock > 0 else 0
+    ).strip().replace("{rows}", rows_html)
 
 
+@profiled("html")
 def _build_products_edit_html(
-    products_df, selected_id=None, target_tab="Modifier", query_key="edit_product"
+    products_df,
+    selected_id=None,
+    target_tab="Modifier",
+    query_key="edit_product",
+    max_rows=None,
 ):
-    """Construit le HTML du tableau de selection pour les onglets action (Modifier/Supprimer)."""
-
-    def row_cell_button(product_id, inner_html):
-        safe_id = escape(str(product_id), quote=True)
-        safe_tab = escape(str(target_tab), quote=True)
-        safe_query_key = escape(str(query_key), quote=True)
-        return (
-            "<form method='get' class='products-edit-row-form'>"
-            f"<input type='hidden' name='products_tab' value='{safe_tab}'/>"
-            f"<input type='hidden' name='{safe_query_key}' value='{safe_id}'/>"
-            f"<button type='submit' class='products-edit-row-link'>{inner_html}</button>"
-            "</form>"
-        )
-
-    rows_html = []
-    selected_id_text = str(selected_id) if selected_id is not None else ""
-
-    for row in products_df.to_dict("records"):
-        product_id_raw = row.get("id_produit")
-        product_id_text = str(product_id_raw)
-        is_selected = product_id_text == selected_id_text
-        radio_class = (
-            "products-edit-radio products-edit-radio-selected"
-            if is_selected
-            else "products-edit-radio"
-        )
+    """
+    Construit le HTML du tableau de selection pour les onglets action (Modifier/Supprimer).
 
-        product_id = escape(_fmt_product_id(product_id_raw))
-        product_name = escape(str(row.get("nom_produit") or "-"))
-        category = str(row.get("categorie") or "Sans categorie")
-        category_safe = escape(category)
-        category_class = _product_category_class(category)
-        prix_achat = escape(_fmt_int(row.get("prix_achat")))
-        unite = str(row.get("unite_vente") or "bouteille").lower()
-        if unite == "verre":
-            prix_vente_value = row.get("prix_vente_verre")
-        else:
-            prix_vente_value = row.get("prix_vente_bouteille")
-        prix_vente = escape(_fmt_int(prix_vente_value))
-        stock_raw = row.get("stock_actuel") or 0
-        stock_safe = escape(str(stock_raw))
-        stock_class = _stock_class(stock_raw)
-        stock_width = _stock_bar_width(stock_raw)
-        unite_safe = escape(unite)
-        radio_html = f'<span class="{radio_class}"></span>'
-        category_html = f'<span class="products-pill {category_class}">{category_safe}</span>'
-        stock_html = (
-            '<div class="products-edit-stock-wrap">'
-            f'<span class="products-edit-stock-num {stock_class}">{stock_safe}</span>'
-            '<div class="products-edit-stock-track">'
-            f'<div class="products-edit-stock-fill {stock_class}" style="width:{stock_width}%"></div>'
-            "</div>"
-            "</div>"
-        )
+    Chaque cellule est un petit formulaire GET (clic ligne -> query params).
+    Rendu par colonnes; max_rows limite les lignes rendues (la ligne
+    selectionnee est toujours incluse).
+    """
+    if max_rows and len(products_df) > max_rows:
+        view = products_df.head(max_rows)
+        if selected_id is not None and not (view["id_produit"].astype(str) == str(selected_id)).any():
+            selected_rows = products_df[products_df["id_produit"].astype(str) == str(selected_id)]
+            view = pd.concat([selected_rows, view])
+        products_df = view
+
+    index = products_df.index
+    safe_tab = escape(str(target_tab), quote=True)
+    safe_query_key = escape(str(query_key), quote=True)
+    product_ids = products_df["id_produit"].astype(str)
+
+    # Ouverture/fermeture du formulaire commun a toutes les cellules d'une ligne.
+    form_open = (
+        "<form method='get' class='products-edit-row-form'>"
+        f"<input type='hidden' name='products_tab' value='{safe_tab}'/>"
+        f"<input type='hidden' name='{safe_query_key}' value='"
+        + ui.escape_series(product_ids)
+        + "'/><button type='submit' class='products-edit-row-link'>"
+    )
+    form_close = "</button></form>"
 
-        rows_html.append(
-            dedent(
-                f"""
-                <tr>
-                  <td class="products-edit-radio-col">{row_cell_button(product_id_text, radio_html)}</td>
-                  <td class="products-edit-id">{row_cell_button(product_id_text, product_id)}</td>
-                  <td class="products-edit-name">{row_cell_button(product_id_text, product_name)}</td>
-                  <td>{row_cell_button(product_id_text, category_html)}</td>
-                  <td class="products-edit-number">{row_cell_button(product_id_text, prix_achat)}</td>
-                  <td class="products-edit-number">{row_cell_button(product_id_text, prix_vente)}</td>
-                  <td>{row_cell_button(product_id_text, stock_html)}</td>
-                  <td class="products-col-unit">{row_cell_button(product_id_text, unite_safe)}</td>
-                </tr>
-                """
-            ).strip()
-        )
+    selected_id_text = str(selected_id) if selected_id is not None else ""
+    radio_class = pd.Series(
+        np.where(
+            (product_ids == selected_id_text).to_numpy(),
+            "products-edit-radio products-edit-radio-selected",
+            "products-edit-radio",
+        ),
+        index=index,
+    )
+
+    category = products_df["categorie"].astype(object).where(products_df["categorie"].notna(), "Sans categorie")
+    unite = products_df["unite_vente"].fillna("bouteille").astype(str).str.lower()
+    unite = unite.where(unite != "", "bouteille")
+    prix_vente = products_df["prix_vente_bouteille"].where(unite != "verre", products_df["prix_vente_verre"])
+    stock = _stock_values(products_df)
+    stock_class = _stock_class_series(stock)
+    stock_width = pd.Series(
+        np.clip(np.floor(stock.to_numpy() / 30 * 100), 0, 100).astype("int64"), index=index
+    ).astype(str)
+
+    radio_html = '<span class="' + radio_class + '"></span>'
+    category_html = (
+        '<span class="products-pill '
+        + ui.class_series(category, _product_category_class)
+        + '">'
+        + ui.escape_series(category, "Sans categorie")
+        + "</span>"
+    )
+    stock_html = (
+        '<div class="products-edit-stock-wrap"><span class="products-edit-stock-num '
+        + stock_class
+        + '">'
+        + stock.astype(str)
+        + '</span><div class="products-edit-stock-track"><div class="products-edit-stock-fill '
+        + stock_class
+        + '" style="width:'
+        + stock_width
+        + '%"></div></div></div>'
+    )
+
+    def cell(css_class, inner):
+        """Fragments d'une cellule cliquable."""
+        opening = f'<td class="{css_class}">' if css_class else "<td>"
+        return [opening, form_open, inner, form_close, "</td>"]
+
+    rows_html = ui.html_rows(
+        ["<tr>"]
+        + cell("products-edit-radio-col", radio_html)
+        + cell("products-edit-id", ui.escape_series(_fmt_product_id_series(products_df["id_produit"])))
+        + cell("products-edit-name", ui.escape_series(products_df["nom_produit"], "-"))
+        + cell("", category_html)
+        + cell("products-edit-number", ui.fmt_int_series(products_df["prix_achat"]))
+        + cell("products-edit-number", ui.fmt_int_series(prix_vente))
+        + cell("", stock_html)
+        + cell("products-col-unit", ui.escape_series(unite))
+        + ["</tr>"],
+        index,
+    )
 
     if not rows_html:
-        rows_html.append(
-            "<tr><td colspan='8' class='products-list-empty'>Aucun produit</td></tr>"
-        )
+        rows_html = "<tr><td colspan='8' class='products-list-empty'>Aucun produit</td></tr>"
 
     return dedent(
-        f"""
+        """
         <div class="products-edit-card">
           <table class="products-edit-table">
             <thead>
@@ -253,12 +275,12 @@ def _build_products_edit_html(
               </tr>
             </thead>
             <tbody>
-              {''.join(rows_html)}
+              {rows}
             </tbody>
           </table>
         </div>
         """
-    ).strip()
+    ).strip().replace("{rows}", rows_html)
 
 
 def _sync_edit_price_from_unit():
@@ -314,30 +336,36 @@ def render_products():
     tab_list, tab_add, tab_edit, tab_delete = st.tabs(tabs_labels, default=default_tab)
 
     with tab_list:
+        # Pagination serveur (keyset): seule la page affichee est lue en base,
+        # le total vient d'un COUNT separe.
         page_size = 6
-        total_products = len(products_df)
-        total_pages = max(1, math.ceil(total_products / page_size))
+        total_products = count_products()
         page_key = "products_list_page"
+        cursor_key = "products_list_cursor"
+
+        page = list_products(cursor=st.session_state.get(cursor_key), limit=page_size)
+        if page.rows.empty and st.session_state.get(cursor_key):
+            # Curseur perime (produits supprimes): retour a la premiere page.
+            st.session_state[cursor_key] = None
+            st.session_state[page_key] = 1
+            page = list_products(limit=page_size)
 
-        current_page = st.session_state.get(page_key, 1)
-        if current_page < 1:
+        current_page = max(1, st.session_state.get(page_key, 1))
+        if page.prev_cursor is None:
             current_page = 1
-        if current_page > total_pages:
-            current_page = total_pages
         st.session_state[page_key] = current_page
 
         start_index = (current_page - 1) * page_size
-        end_index = min(start_index + page_size, total_products)
-        page_df = products_df.iloc[start_index:end_index] if total_products else products_df
+        end_index = start_index + len(page.rows)
 
-        st.markdown(_build_products_list_html(page_df), unsafe_allow_html=True)
+        st.markdown(_build_products_list_html(page.rows), unsafe_allow_html=True)
 
         with st.container(key="products_list_footer"):
             left_col, prev_col, next_col = st.columns([5, 1, 1], vertical_alignment="center")
             left_col.markdown(
                 (
                     "<div class='products-list-foot-text'>"
-                    f"Affichage de {start_index + 1 if total_products else 0} a {end_index} "
+                    f"Affichage de {start_index + 1 if end_index else 0} a {end_index} "
                     f"sur {total_products} produits"
                     "</div>"
                 ),
@@ -348,8 +376,9 @@ def render_products():
                 "Precedent",
                 key="products_list_prev",
                 width="stretch",
-                disabled=current_page <= 1,
+                disabled=page.prev_cursor is None,
             ):
+                st.session_state[cursor_key] = page.prev_cursor
                 st.session_state[page_key] = current_page - 1
                 st.rerun()
 
@@ -357,8 +386,9 @@ def render_products():
                 "Suivant",
                 key="products_list_next",
                 width="stretch",
-                disabled=current_page >= total_pages,
+                disabled=page.next_cursor is None,
             ):
+                st.session_state[cursor_key] = page.next_cursor
                 st.session_state[page_key] = current_page + 1
                 st.rerun()
 
@@ -408,6 +438,12 @@ def render_products():
                 quantite_ml = st.number_input(
                     "Quantité contenu en mL", min_value=10, step=1
                 ) # Declarer la quantité contenu dans la bouteille
+                seuil_alerte = st.number_input(
+                    "Seuil d'alerte stock",
+                    min_value=0,
+                    value=DEFAULT_SEUIL_ALERTE,
+                    step=1,
+                )
                 submitted = st.form_submit_button("Ajouter")
 
         # Traitement submit + validation metier.
@@ -418,17 +454,20 @@ def render_products():
                 st.error("Nom du produit requis")
             else:
                 category = category_map[categorie_key]
+                # Saisie en FCFA -> centimes (money.py).
+                prix_vente = from_input(prix_vente)
                 prix_vente_bouteille = prix_vente if unite_vente == "bouteille" else 0
                 prix_vente_verre = prix_vente if unite_vente == "verre" else 0
                 create_product(
                     nom,
                     category["id_categorie"],
-                    prix_achat=prix_achat,
+                    prix_achat=from_input(prix_achat),
                     prix_vente_bouteille=prix_vente_bouteille,
                     prix_vente_verre=prix_vente_verre,
                     stock_actuel=stock_initial,
                     unite_vente=unite_vente,
-                    quantite_ml=quantite_ml
+                    quantite_ml=quantite_ml,
+                    seuil_alerte=seuil_alerte,
                 )
                 st.session_state["product_added"] = True
                 st.rerun()
@@ -458,16 +497,22 @@ def render_products():
                         selected_id = row["id_produit"]
                         break
 
-            st.markdown(_build_products_edit_html(products_df, selected_id), unsafe_allow_html=True)
+            edit_cap = ui.get_row_cap("products_edit_rows")
+            st.markdown(
+                _build_products_edit_html(products_df, selected_id, max_rows=edit_cap),
+                unsafe_allow_html=True,
+            )
+            ui.render_load_more("products_edit_rows", min(edit_cap, len(products_df)), len(products_df))
 
             if selected_product is not None and st.session_state.get("edit_loaded_id") != selected_id:
                 st.session_state["edit_loaded_id"] = selected_product["id_produit"]
                 st.session_state["edit_nom"] = selected_product["nom_produit"]
-                st.session_state["edit_prix_achat"] = float(selected_product["prix_achat"])
-                st.session_state["edit_prix_vente_bouteille"] = float(
+                # Centimes -> FCFA pour les number_input.
+                st.session_state["edit_prix_achat"] = to_input(selected_product["prix_achat"])
+                st.session_state["edit_prix_vente_bouteille"] = to_input(
                     selected_product["prix_vente_bouteille"]
                 )
-                st.session_state["edit_prix_vente_verre"] = float(
+                st.session_state["edit_prix_vente_verre"] = to_input(
                     selected_product["prix_vente_verre"]
                 )
                 st.session_state["edit_stock"] = int(selected_product["stock_actuel"])
@@ -476,6 +521,7 @@ def render_products():
                         "quantite_ml"
                     ]
                 st.session_state["edit_categorie_id"] = selected_product["id_categorie"]
+                st.session_state["edit_seuil_alerte"] = int(selected_product["seuil_alerte"])
                 _sync_edit_price_from_unit()
 
             if selected_product is None:
@@ -540,6 +586,13 @@ def render_products():
                             min_value=0, step=1,
                             key="edit_quantite_ml",placeholder=0
                     )
+                        seuil_alerte = st.number_input(
+                            "Seuil d'alerte stock",
+                            min_value=0,
+                            step=1,
+                            key="edit_seuil_alerte",
+                            width="stretch",
+                        )
                         submitted = st.form_submit_button(
                             "Mettre a jour",
                             key="edit_submit_btn",
@@ -566,12 +619,13 @@ def render_products():
                             st.session_state["edit_loaded_id"],
                             nom,
                             category["id_categorie"],
-                            prix_achat,
-                            prix_vente_bouteille,
-                            prix_vente_verre,
+                            from_input(prix_achat),
+                            from_input(prix_vente_bouteille),
+                            from_input(prix_vente_verre),
                             stock_actuel,
                             unite_vente,
-                            quantite_ml
+                            quantite_ml,
+                            seuil_alerte,
                         )
                         st.session_state["product_updated"] = True
                         st.session_state.pop("edit_loaded_id", None)
@@ -623,15 +677,18 @@ def render_products():
                         selected_id = row["id_produit"]
                         break
 
+            delete_cap = ui.get_row_cap("products_delete_rows")
             st.markdown(
                 _build_products_edit_html(
                     products_df,
                     selected_id=selected_id,
                     target_tab="Supprimer",
                     query_key="delete_product",
+                    max_rows=delete_cap,
                 ),
                 unsafe_allow_html=True,
             )
+            ui.render_load_more("products_delete_rows", min(delete_cap, len(products_df)), len(products_df))
 
             if selected_product is None:
                 st.markdown(
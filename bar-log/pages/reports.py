@@ -3,17 +3,89 @@ Page "Rapports": vue analytique de la periode.
 
 Interaction:
 - consomme les agregations de data_access.py (totaux ventes/charges),
-- execute aussi 2 requetes SQL analytiques via fetch_df() pour les tableaux,
-- reutilise ui.py pour titre, format monetaire et affichage dataframe.
+- lit les series jour/mois depuis le resume vente_jour (sales_by_day/month),
+- reutilise ui.py pour titre, format monetaire et affichage dataframe,
+- exporte ventes / entrees / charges de la periode via export.py (CSV ou
+  Parquet ecrit par paquets, puis bouton de telechargement).
 """
 
 from datetime import date
-from decimal import Decimal
 
 import streamlit as st
 
-from data_access import fetch_df, get_charge_total, get_sales_totals
-from ui import fmt_fcfa, render_page_title, show_dataframe
+from data_access import (
+    get_charge_total,
+    get_sales_totals,
+    list_categories,
+    list_products,
+    sales_by_day,
+    sales_by_month,
+)
+import export
+from ui import build_category_map, build_product_map, fmt_fcfa, render_page_title, show_dataframe
+
+# Jeux exportables: label -> (cle data_access.export_rows, filtres proposes).
+EXPORT_DATASETS = {
+    "Ventes": ("ventes", ("product_id", "category_id")),
+    "Entrees de stock": ("entrees", ("product_id",)),
+    "Charges": ("charges", ()),
+}
+
+
+def _export_filters(filter_names):
+    """Filtres optionnels de l'export (produit, categorie)."""
+    filters = {}
+    cols = st.columns(2)
+    if "product_id" in filter_names:
+        product_map = build_product_map(list_products())
+        label = cols[0].selectbox("Produit", ["Tous les produits"] + list(product_map), key="export_product")
+        if label in product_map:
+            filters["product_id"] = product_map[label]["id_produit"]
+    if "category_id" in filter_names:
+        category_map = build_category_map(list_categories())
+        label = cols[1].selectbox(
+            "Categorie", ["Toutes les categories"] + list(category_map), key="export_category"
+        )
+        if label in category_map:
+            filters["category_id"] = int(category_map[label]["id_categorie"])
+    return filters
+
+
+def _render_export(start_date, end_date):
+    """
+    Export de la periode: le fichier est ecrit par paquets (memoire bornee)
+    puis propose en telechargement.
+    """
+    st.subheader("Export")
+    dataset_col, format_col = st.columns([2, 1])
+    dataset = dataset_col.selectbox("Donnees", list(EXPORT_DATASETS), key="export_dataset")
+    fmt = format_col.radio(
+        "Format",
+        export.available_formats(),
+        format_func=lambda value: export.FORMATS[value][0],
+        horizontal=True,
+        key="export_format",
+    )
+    kind, filter_names = EXPORT_DATASETS[dataset]
+    filters = _export_filters(filter_names)
+
+    if st.button("Generer l'export", key="export_run"):
+        with st.spinner("Export en cours..."):
+            st.session_state["export_result"] = export.write_export(kind, fmt, start_date, end_date, **filters)
+
+    result = st.session_state.get("export_result")
+    if result and result["path"].exists():
+        st.caption(
+            f"{result['rows']} lignes, {result['bytes'] / 1024:.0f} Ko, genere en {result['seconds']:.1f} s"
+        )
+        with open(result["path"], "rb") as handle:
+            st.download_button(
+                f"Telecharger {result['file_name']}",
+                data=handle,
+                file_name=result["file_name"],
+                mime=result["mime"],
+                key="export_download",
+            )
 
 
 def render_reports():
@@ -30,7 +102,8 @@ def render_reports():
     total_ventes = totals["total_ventes"] if totals else 0
     marge = totals["marge"] if totals else 0
     total_charges = get_charge_total(start_date, end_date)
-    net = Decimal(str(marge)) - Decimal(str(total_charges))
+    # Centimes entiers (money.py): difference exacte.
+    net = marge - total_charges
 
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("Total ventes", fmt_fcfa(total_ventes))
@@ -40,35 +113,10 @@ def render_reports():
 
     # Serie temporelle journaliere.
     st.subheader("Ventes par jour")
-    daily_df = fetch_df(
-        """
-        SELECT v.date_vente,
-               SUM(v.montant) AS total_ventes,
-               SUM(v.montant - (COALESCE(p.prix_achat, 0) * v.quantite)) AS marge
-        FROM vente v
-        LEFT JOIN produit p ON v.id_produit = p.id_produit
-        WHERE v.date_vente BETWEEN %s AND %s
-        GROUP BY v.date_vente
-        ORDER BY v.date_vente
-        """,
-        (start_date, end_date),
-    )
-    show_dataframe(daily_df, "Aucune vente sur la periode")
+    show_dataframe(sales_by_day(start_date, end_date), "Aucune vente sur la periode")
 
     # Serie temporelle mensuelle.
     st.subheader("Ventes par mois")
-    monthly_df = fetch_df(
-        """
-        SELECT DATE_FORMAT(v.date_vente, '%Y-%m') AS mois,
-               SUM(v.montant) AS total_ventes,
-               SUM(v.montant - (COALESCE(p.prix_achat, 0) * v.quantite)) AS marge
-        FROM vente v
-        LEFT JOIN produit p ON v.id_produit = p.id_produit
-        WHERE v.date_vente BETWEEN %s AND %s
-        GROUP BY DATE_FORMAT(v.date_vente, '%Y-%m')
-        ORDER BY mois
-        """,
-        (start_date, end_date),
-    )
-    show_dataframe(monthly_df, "Aucune vente sur la periode")
+    show_dataframe(sales_by_month(start_date, end_date), "Aucune vente sur la periode")
 
+    _render_export(start_date, end_date)
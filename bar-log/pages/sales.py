@@ -2,44 +2,51 @@
 Page "Ventes": saisie des ventes et historique.
 
 Interaction:
-- lit les produits/categories via data_access.py,
+- lit les produits/categories via data_access.py (liste produit filtree
+  par la recherche de la sidebar, search.py),
 - ajoute des lignes de vente dans une liste temporaire (session_state),
-- persiste les lignes en base via create_receipt() + add_sale_stockable(),
+- soumet le recu complet a write_queue.py (journal local puis rejeu vers
+  MySQL en tache de fond) et affiche son etat (en attente / confirme /
+  conflit de stock / echec),
 - affiche un tableau historique personnalise (HTML/CSS) proche de la maquette.
 """
 
 from datetime import date
-from decimal import Decimal
 from html import escape
 from textwrap import dedent
 
+import numpy as np
+import pandas as pd
 import streamlit as st
 
-from data_access import add_sale_stockable, create_receipt, list_categories, list_products, list_sales
+from data_access import MAX_SALE_QUANTITY, list_categories, list_products, list_sales
+from margin import sale_lines
+from money import MONEY_SCALE, to_units
+from profiling import profiled, section
+from search import filter_product_map
+import ui
 from ui import build_category_map, build_product_map, fmt_fcfa
+import write_queue
 
-import pandas as pd
-from decimal import Decimal
-from datetime import date
-import streamlit as st
-
-def _to_decimal(value):
-    """Convertit une valeur en Decimal avec fallback robuste."""
-    try:
-        return Decimal(str(value))
-    except Exception:
-        return Decimal("0")
+# Nombre de recus soumis dont l'etat reste affiche sous la saisie.
+RECEIPT_STATUS_LIMIT = 5
+_RECEIPT_STATUS_LABELS = {
+    write_queue.PENDING: ("En attente", "sales-pill-yellow"),
+    write_queue.CONFIRMED: ("Confirme", "sales-pill-green"),
+    write_queue.CONFLICT: ("Conflit stock", "sales-pill-purple"),
+    write_queue.FAILED: ("Echec", "sales-pill-red"),
+}
 
 
-def _fmt_fcfa_compact(value):
+def _fmt_fcfa_compact(cents):
     """Format monetaire compact (sans decimales) pour le tableau historique."""
-    number = int(_to_decimal(value).quantize(Decimal("1")))
+    number = to_units(int(cents))
     return f"{number:,}".replace(",", " ") + " FCFA"
 
 
-def _fmt_signed_fcfa(value):
+def _fmt_signed_fcfa(cents):
     """Format monetaire avec signe explicite pour la marge."""
-    number = int(_to_decimal(value).quantize(Decimal("1")))
+    number = to_units(int(cents))
     prefix = "+" if number > 0 else ""
     return f"{prefix}{number:,}".replace(",", " ") + " FCFA"
 
@@ -60,86 +67,67 @@ def _category_color_class(category_name):
     return "sales-pill-gray"
 
 
-def _icon_for_sale(type_vente):
-    """Retourne une icone produit selon le type de vente."""
-    if (type_vente or "").lower() == "verre":
-        return "wine_bar", "sales-icon-red"
-    return "local_bar", "sales-icon-orange"
-
-
-def _build_history_table_html(sales_df):
+@profiled("html")
+def _build_history_table_html(sales_df, max_rows=None):
     """
     Construit le HTML du tableau historique avec la logique de marge mise à jour.
-    """
-    rows_html = []
-    total_montant = Decimal("0")
-    total_marge = Decimal("0")
-    
-    # On transforme le DataFrame en liste de dictionnaires pour itérer proprement
-    records = sales_df.to_dict("records")
-
-    for row in records:
-        # Extraction et conversion sécurisée des données numériques
-        # Ces colonnes doivent être calculées en amont dans list_sales() ou le repository
-        montant = _to_decimal(row.get("montant") or 0)
-        marge = _to_decimal(row.get("marge") or 0)
-        
-        total_montant += montant
-        total_marge += marge
-
-        # Nettoyage des textes pour le HTML
-        article = escape(str(row.get("article") or "-"))
-        categorie = str(row.get("categorie") or "Sans catégorie")
-        categorie_safe = escape(categorie)
-        badge_class = _category_color_class(categorie)
-
-        # Identifiants et dates
-        id_value = row.get("id_produit") or row.get("id_vente") or "-"
-        id_text = escape(str(id_value))
-        date_text = escape(str(row.get("date_vente") or ""))
-        qty_text = escape(str(row.get("quantite") or 0))
-        
-        # Type de vente (verre / bouteille)
-        type_vente = str(row.get("type_vente") or "").lower()
-        type_text = escape(type_vente.title() if type_vente else "-")
-        
-        # Formatage monétaire
-        montant_text = escape(_fmt_fcfa_compact(montant))
-        marge_text = escape(_fmt_signed_fcfa(marge))
 
-        # Gestion des icônes et couleurs de marge
-        icon_name, icon_color_class = _icon_for_sale(type_vente)
-        marge_class = "sales-marge-positive" if marge >= 0 else "sales-marge-negative"
+    Rendu colonne par colonne (ui.html_rows): echappement et formatage
+    monetaire vectorises, un seul join. max_rows limite les lignes rendues;
+    les totaux du pied portent toujours sur toute la periode. montant et
+    marge arrivent en centimes (list_sales).
+    """
+    total_rows = len(sales_df)
+    total_montant = int(sales_df["montant"].sum())
+    total_marge = int(sales_df["marge"].sum())
+
+    view = sales_df.head(max_rows) if max_rows else sales_df
+    index = view.index
+
+    # Colonnes texte (echappees en une passe).
+    article = ui.escape_series(view["article"], "-")
+    categorie = view["categorie"].astype(object).where(view["categorie"].notna(), "Sans catégorie")
+    categorie_safe = ui.escape_series(categorie, "Sans catégorie")
+    badge_class = ui.class_series(categorie, _category_color_class)
+    id_value = view["id_produit"].astype(object).where(view["id_produit"].notna(), view["id_vente"])
+    id_text = ui.escape_series(id_value, "-")
+    date_text = ui.escape_series(view["date_vente"])
+    qty_text = ui.escape_series(view["quantite"].fillna(0).astype("int64"))
+
+    # Type de vente (verre / bouteille) et icone associee.
+    type_vente = view["type_vente"].fillna("").astype(str).str.lower()
+    type_text = ui.escape_series(type_vente.str.title(), "-")
+    is_verre = (type_vente == "verre").to_numpy()
+    icon_name = pd.Series(np.where(is_verre, "wine_bar", "local_bar"), index=index)
+    icon_color_class = pd.Series(np.where(is_verre, "sales-icon-red", "sales-icon-orange"), index=index)
+
+    # Formatage monétaire + couleur de marge.
+    montant_text = ui.fmt_int_series(view["montant"]) + " FCFA"
+    marge_values = view["marge"].to_numpy()
+    marge_text = ui.fmt_int_series(view["marge"], signed=True) + " FCFA"
+    marge_class = pd.Series(
+        np.where(marge_values >= 0, "sales-marge-positive", "sales-marge-negative"), index=index
+    )
 
-        rows_html.append(
-            dedent(
-                f"""
-                <tr>
-                  <td class="sales-col-date">{date_text}</td>
-                  <td>
-                    <div class="sales-product-cell">
-                      <div class="sales-product-icon {icon_color_class}">
-                        <span class="material-symbols-outlined">{icon_name}</span>
-                      </div>
-                      <div>
-                        <div class="sales-product-name">{article}</div>
-                        <div class="sales-product-sub">ID: {id_text}</div>
-                      </div>
-                    </div>
-                  </td>
-                  <td><span class="sales-pill {badge_class}">{categorie_safe}</span></td>
-                  <td class="sales-col-center">{qty_text}</td>
-                  <td>{type_text}</td>
-                  <td class="sales-col-right">{montant_text}</td>
-                  <td class="sales-col-right {marge_class}">{marge_text}</td>
-                </tr>
-                """
-            ).strip()
-        )
+    rows_html = ui.html_rows(
+        [
+            '<tr><td class="sales-col-date">', date_text, "</td>",
+            '<td><div class="sales-product-cell"><div class="sales-product-icon ', icon_color_class, '">',
+            '<span class="material-symbols-outlined">', icon_name, "</span></div>",
+            '<div><div class="sales-product-name">', article, "</div>",
+            '<div class="sales-product-sub">ID: ', id_text, "</div></div></div></td>",
+            '<td><span class="sales-pill ', badge_class, '">', categorie_safe, "</span></td>",
+            '<td class="sales-col-center">', qty_text, "</td>",
+            "<td>", type_text, "</td>",
+            '<td class="sales-col-right">', montant_text, "</td>",
+            '<td class="sales-col-right ', marge_class, '">', marge_text, "</td></tr>",
+        ],
+        index,
+    )
 
     # Calcul des totaux pour le footer
     total_marge_class = "sales-marge-positive" if total_marge >= 0 else "sales-marge-negative"
-    count_text = f"Affichage de 1 à {len(records)} sur {len(records)} résultats"
+    count_text = f"Affichage de 1 à {len(view)} sur {total_rows} résultats"
 
     return dedent(
         f"""
@@ -158,7 +146,7 @@ def _build_history_table_html(sales_df):
                 </tr>
               </thead>
               <tbody>
-                {''.join(rows_html)}
+                {{rows}}
               </tbody>
               <tfoot>
                 <tr>
@@ -172,7 +160,68 @@ def _build_history_table_html(sales_df):
           <div class="sales-history-footer">{escape(count_text)}</div>
         </div>
         """
-    ).strip()
+    ).strip().replace("{rows}", rows_html)
+
+
+def _receipt_status_html(entry):
+    """Ligne d'etat d'un recu soumis (badge + detail)."""
+    label, pill_class = _RECEIPT_STATUS_LABELS[entry["status"]]
+    detail = f"{entry['submitted_at']:%H:%M:%S} - {entry['lines']} ligne(s)"
+    if entry["receipt_id"] is not None:
+        detail += f" - recu #{entry['receipt_id']}"
+    error = ""
+    if entry["conflicts"]:
+        ruptures = ", ".join(
+            f"{conflict['nom_produit']} (stock {conflict['stock']}, vendu {conflict['quantite']})"
+            for conflict in entry["conflicts"]
+        )
+        error = f"<span class='sales-receipt-error'>Stock negatif: {escape(ruptures)}</span>"
+    elif entry["error"]:
+        error = f"<span class='sales-receipt-error'>{escape(entry['error'])}</span>"
+    return (
+        f"<div class='sales-receipt-status'><span class='sales-pill {pill_class}'>{label}</span>"
+        f"<span>{escape(detail)}</span>{error}</div>"
+    )
+
+
+def _render_receipt_statuses():
+    """
+    Etat des derniers recus soumis a la file d'ecriture.
+
+    Rafraichi chaque seconde (fragment) tant qu'un recu est en attente;
+    quand le dernier est applique, la page entiere est relancee pour que
+    l'historique et les stocks affiches l'incluent. Un recu en echec peut
+    etre repris dans le brouillon. Si la base est injoignable, les recus
+    restent dans le journal local et un avertissement l'indique.
+    """
+    entries = write_queue.statuses(st.session_state.get("submitted_receipts", []))
+    if not entries:
+        return
+    pending = any(entry["status"] == write_queue.PENDING for entry in entries)
+
+    @st.fragment(run_every=1.0 if pending else None)
+    def receipt_statuses():
+        current = write_queue.statuses([entry["uuid"] for entry in entries])
+        if pending and not any(entry["status"] == write_queue.PENDING for entry in current):
+            st.rerun()
+        state = write_queue.sync_state()
+        if state["pending"] and state["last_error"]:
+            st.warning(
+                f"Base injoignable: {state['pending']} recu(s) conserve(s) dans le journal local, "
+                "synchronisation automatique au retour de la connexion"
+            )
+        for entry in current:
+            cols = st.columns([6, 1], vertical_alignment="center")
+            cols[0].markdown(_receipt_status_html(entry), unsafe_allow_html=True)
+            if entry["status"] == write_queue.FAILED and cols[1].button(
+                "Reprendre", key=f"sale_retry_{entry['uuid']}", use_container_width=True
+            ):
+                st.session_state["receipt_items"].extend(entry["items"])
+                st.session_state["submitted_receipts"].remove(entry["uuid"])
+                st.rerun()
+
+    receipt_statuses()
+
 
 def render_sales():
     """Rend la page ventes (saisie + historique)."""
@@ -182,9 +231,10 @@ def render_sales():
         unsafe_allow_html=True,
     )
 
+    # Rejoue les recus laisses dans le journal local (redemarrage, coupure).
+    write_queue.start()
     products_df = list_products()
     categories_df = list_categories()
-    all_sales_df = list_sales()
     if categories_df.empty:
         st.info("Ajoutez des categories avant de saisir une vente")
         return
@@ -193,6 +243,8 @@ def render_sales():
         st.session_state["receipt_items"] = []
     if "sale_quantite_text" not in st.session_state:
         st.session_state["sale_quantite_text"] = "1"
+    if "submitted_receipts" not in st.session_state:
+        st.session_state["submitted_receipts"] = []
 
     if st.session_state.get("sale_reset"):
         st.session_state["sale_product"] = None
@@ -203,10 +255,17 @@ def render_sales():
         st.session_state["sale_reset"] = False
 
     product_map = build_product_map(products_df) if not products_df.empty else {}
+    # Recherche de la sidebar: options restreintes et classees par pertinence.
+    product_map = filter_product_map(
+        product_map,
+        st.session_state.get("sidebar_search", ""),
+        keep=st.session_state.get("sale_product"),
+    )
 
     selected_product = None
     selected_key = None
-    prix_unitaire = st.session_state.get("sale_unit_price", 0.0)
+    # Prix unitaire en centimes (money.py).
+    prix_unitaire = st.session_state.get("sale_unit_price", 0)
     quantite = 1
     unite_vente = st.session_state.get("sale_unite", "bouteille")
 
@@ -247,7 +306,7 @@ def render_sales():
                     "Produit",
                     list(product_map.keys()),
                     index=None,
-                    placeholder="Selectionner un produit",
+                    placeholder="Selectionner un produit" if product_map else "Aucun produit pour la recherche",
                     key="sale_product",
                     label_visibility="collapsed",
                     width="stretch",
@@ -272,14 +331,14 @@ def render_sales():
             if loaded_unite not in {"bouteille", "verre"}:
                 loaded_unite = "bouteille"
             price_col = "prix_vente_verre" if loaded_unite == "verre" else "prix_vente_bouteille"
-            loaded_price = float(selected_product.get(price_col) or 0)
+            loaded_price = int(selected_product.get(price_col) or 0)
             unite_vente = loaded_unite
             prix_unitaire = loaded_price
             st.session_state["sale_unite"] = loaded_unite
             st.session_state["sale_unit_price"] = loaded_price
         else:
-            st.session_state["sale_unit_price"] = 0.0
-            prix_unitaire = 0.0
+            st.session_state["sale_unit_price"] = 0
+            prix_unitaire = 0
 
         with entry_cols[3]:
             #st.session_state["sale_unite_display"] = unite_vente
@@ -318,6 +377,8 @@ def render_sales():
             st.error("Selectionnez un produit")
         elif quantite <= 0:
             st.error("La quantite doit etre un nombre entier superieur a 0")
+        elif quantite > MAX_SALE_QUANTITY:
+            st.error(f"La quantite ne peut pas depasser {MAX_SALE_QUANTITY}")
         elif prix_unitaire <= 0:
             st.error("Prix de vente non defini pour ce produit")
         else:
@@ -333,70 +394,40 @@ def render_sales():
             st.rerun()
 # --- PRÉPARATION DES DONNÉES ---
     receipt_items = st.session_state["receipt_items"]
-    product_lookup = {row["id_produit"]: row for row in products_df.to_dict("records")}
-    category_labels = build_category_map(categories_df) # Pour le nom des catégories
-    
-    display_items = []
-    draft_total = Decimal("0")
-    draft_marge = Decimal("0")
-
-    # --- LOGIQUE DE CALCUL STRICTE DU CODE 2 ---
-    for item in receipt_items:
-        product = product_lookup.get(item["product_id"])
-        if not product:
-            continue
-
-        # Données de base (Conversion Decimal pour la précision financière)
-        prix_achat_btl = _to_decimal(product.get("prix_achat"))
-        prix_vente_btl = _to_decimal(product.get("prix_vente_bouteille"))
-        prix_vente_reel_verre = _to_decimal(product.get("prix_vente_verre"))
-        quantite_btl_ml = int(product.get("quantite_ml") or 1)
-        verre_de_mesure_ml = 50 
-        qty = _to_decimal(item["quantite"])
-
-        # Initialisation des variables de calcul
-        prix_vente_moyen_verre = Decimal("0")
-        montant_vente = Decimal("0")
-        montant_moyen_vente_verre = Decimal("0")
-        marge_ligne = Decimal("0")
-
-        if item["unite_vente"] == "verre":
-            # Calcul du rendement (Combien de verres dans une bouteille)
-            nombre_verre_total_moyen = Decimal(quantite_btl_ml) / Decimal(verre_de_mesure_ml)
-            # Prix "théorique" d'un verre s'il était vendu au prix bouteille
-            prix_vente_moyen_verre = (prix_vente_btl / nombre_verre_total_moyen).quantize(Decimal("0.01"))
-            
-            montant_vente = (prix_vente_reel_verre * qty).quantize(Decimal("0.01"))
-            montant_moyen_vente_verre = (prix_vente_moyen_verre * qty).quantize(Decimal("0.01"))
-            
-            # La marge est la différence entre le prix verre réel et le prix moyen bouteille
-            marge_ligne = montant_vente - montant_moyen_vente_verre
-        else:
-            # Calcul pour la bouteille entière
-            montant_vente = (prix_vente_btl * qty).quantize(Decimal("0.01"))
-            marge_ligne = montant_vente - (prix_achat_btl * qty).quantize(Decimal("0.01"))
-
-        # Mise à jour des totaux de la session
-        draft_total += montant_vente
-        draft_marge += marge_ligne
-
-        # Construction de la ligne pour le tableau d'affichage (Colonnes du Code 2)
-        display_items.append({
-            "Produit": product.get("nom_produit", "Inconnu"),
-            "Categorie": category_labels.get(product.get("id_categorie"), {}).get("nom_categorie", ""),
-            "Quantite": float(qty),
-            "Unite": item["unite_vente"],
-            "Prix d'achat bouteille": float(prix_achat_btl),
-            "Prix de vente bouteille": float(prix_vente_btl),
-            "Prix de vente verre": float(prix_vente_reel_verre),
-            "Prix de vente moyen verre": float(prix_vente_moyen_verre),
-            "Montant vente": float(montant_vente),
-            "Marge": float(marge_ligne),
-        })
-
-    # --- AFFICHAGE DU TABLEAU DÉTAILLÉ (EXTRAIT DU CODE 2) ---
-    if display_items:
-        table_df = pd.DataFrame(display_items)
+    draft_total = 0
+    draft_marge = 0
+
+    # --- CALCUL VECTORISE (meme regle de marge que l'historique, cf. margin.py) ---
+    if receipt_items and not products_df.empty:
+        with section("dataframe", "brouillon du recu"):
+            draft_df = pd.DataFrame(receipt_items).rename(columns={"unite_vente": "type_vente"})
+            draft_df = draft_df.merge(
+                products_df.drop(columns=["unite_vente"]),
+                left_on="product_id",
+                right_on="id_produit",
+                how="inner",
+            )
+            draft_df = sale_lines(draft_df)
+        draft_total = int(draft_df["montant"].sum())
+        draft_marge = int(draft_df["marge"].sum())
+
+        # --- AFFICHAGE DU TABLEAU DÉTAILLÉ ---
+        is_verre = draft_df["type_vente"] == "verre"
+        table_df = pd.DataFrame(
+            {
+                "Produit": draft_df["nom_produit"],
+                "Categorie": draft_df["categorie"],
+                "Quantite": draft_df["quantite"].astype(float),
+                "Unite": draft_df["type_vente"],
+                # Centimes -> FCFA pour l'affichage.
+                "Prix d'achat bouteille": draft_df["prix_achat"] / MONEY_SCALE,
+                "Prix de vente bouteille": draft_df["prix_vente_bouteille"] / MONEY_SCALE,
+                "Prix de vente verre": draft_df["prix_vente_verre"] / MONEY_SCALE,
+                "Prix de vente moyen verre": draft_df["cout_unitaire"].where(is_verre, 0) / MONEY_SCALE,
+                "Montant vente": draft_df["montant"] / MONEY_SCALE,
+                "Marge": draft_df["marge"] / MONEY_SCALE,
+            }
+        )
         st.dataframe(table_df, use_container_width=True, hide_index=True)
 
     # --- BARRE D'ACTIONS ET RÉSUMÉ (STYLE CODE 1) ---
@@ -425,22 +456,20 @@ def render_sales():
         st.rerun()
 
     if save_clicked:
+        # Rend la main tout de suite: le recu est applique en tache de fond.
         try:
-            receipt_id = create_receipt()
-            for item in st.session_state["receipt_items"]:
-                add_sale_stockable(
-                    item["product_id"],
-                    item["quantite"],
-                    item["date_vente"],
-                    item["unite_vente"],
-                    receipt_id,
-                )
+            receipt_uuid = write_queue.submit(st.session_state["receipt_items"])
+        except ValueError as exc:
+            st.error(str(exc))
+        else:
+            submitted = st.session_state["submitted_receipts"]
+            submitted.append(receipt_uuid)
+            del submitted[:-RECEIPT_STATUS_LIMIT]
             st.session_state["receipt_items"] = []
             st.session_state["sale_reset"] = True
-            st.success("Ventes enregistrées")
             st.rerun()
-        except Exception as exc:
-            st.error(f"Enregistrement impossible: {exc}")
+
+    _render_receipt_statuses()
 
     # --- SECTION HISTORIQUE (STYLE CODE 1) ---
     st.markdown(
@@ -464,8 +493,16 @@ def render_sales():
 
     category_id = category_map[category_filter]["id_categorie"] if category_filter != "Toutes catégories" else None
 
+    # Historique toujours borne par la periode affichee (jamais de scan
+    # complet de vente: cf. bench/check_vente_scans.py).
+    if start_date > end_date:
+        st.warning("La date de debut doit preceder la date de fin")
+        return
     sales_df = list_sales(start_date, end_date, None, category_id)
     if sales_df.empty:
         st.info("Aucune vente sur la période")
     else:
-        st.markdown(_build_history_table_html(sales_df), unsafe_allow_html=True)
\ No newline at end of file
+        # Rendu plafonne: "Afficher plus" ajoute des lignes a la demande.
+        row_cap = ui.get_row_cap("sales_history_rows")
+        st.markdown(_build_history_table_html(sales_df, row_cap), unsafe_allow_html=True)
+        ui.render_load_more("sales_history_rows", min(row_cap, len(sales_df)), len(sales_df))
\ No newline at end of file
@@ -0,0 +1,234 @@
+"""
+Profilage du rendu des pages BarStock (mode opt-in).
+
+Interaction:
+- streamlit_app.py ouvre profile() autour de la fonction render_* choisie
+  (a l'interieur de query_log.page_scope()),
+- les builders HTML des pages sont decores par profiled("html"), les calculs
+  pandas notables par section("dataframe", ...), ui.show_dataframe() par
+  section("streamlit", ...),
+- query_log.py fournit le temps SQL et le temps de construction des
+  DataFrame du rendu,
+- render_summary() affiche un resume "flame" repliable en bas de page.
+
+Decoupage du temps mural d'un rendu:
+- sql: connexion + execute + fetch (query_log),
+- dataframe: construction des DataFrame (fetch_df) + sections "dataframe",
+- html: sections "html" (construction des tableaux HTML),
+- streamlit: emission des elements (sections "streamlit") + reste du code
+  de page (widgets, logique) non attribue ailleurs.
+
+Activation: variable BARLOG_PROFILE=1 (tout le process) ou parametre d'URL
+?profile=1 (une session). Les percentiles p50/p95 par page sont tenus en
+memoire pour chaque rendu, profilage actif ou non (cout: deux horloges).
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from html import escape
+import os
+import threading
+import time
+
+# Nombre de rendus conserves par page pour les percentiles.
+ROLLING_WINDOW = 200
+
+CATEGORIES = ("sql", "dataframe", "html", "streamlit")
+_CATEGORY_LABELS = {
+    "sql": "SQL",
+    "dataframe": "DataFrame",
+    "html": "HTML",
+    "streamlit": "Streamlit",
+}
+
+_DURATIONS = {}
+_DURATIONS_LOCK = threading.Lock()
+
+# Profil du rendu en cours dans ce thread de script: dict ou None.
+_CURRENT = ContextVar("barlog_current_profile", default=None)
+
+
+def is_enabled(query_params=None):
+    """Profilage actif via BARLOG_PROFILE=1 ou ?profile=1."""
+    if os.getenv("BARLOG_PROFILE") == "1":
+        return True
+    if query_params is None:
+        return False
+    value = query_params.get("profile")
+    if isinstance(value, list):
+        value = value[0] if value else None
+    return value in ("1", "true")
+
+
+@contextmanager
+def section(category, name):
+    """Attribue le temps du bloc a category/name dans le profil en cours."""
+    profile = _CURRENT.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        children = profile["sections"].setdefault(category, {})
+        children[name] = children.get(name, 0.0) + elapsed
+
+
+def profiled(category):
+    """Decorateur: attribue le temps de la fonction a category/nom de fonction."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with section(category, func.__name__):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _record_duration(page, duration_ms):
+    """Ajoute une duree de rendu a la fenetre glissante de la page."""
+    with _DURATIONS_LOCK:
+        window = _DURATIONS.get(page)
+        if window is None:
+            window = _DURATIONS[page] = deque(maxlen=ROLLING_WINDOW)
+        window.append(duration_ms)
+
+
+def _percentile(values, ratio):
+    """Percentile par rang le plus proche (valeurs triees)."""
+    index = min(len(values) - 1, max(0, int(round(ratio * (len(values) - 1)))))
+    return values[index]
+
+
+def page_stats():
+    """p50/p95/max par page sur la fenetre glissante."""
+    with _DURATIONS_LOCK:
+        snapshot = {page: sorted(window) for page, window in _DURATIONS.items()}
+    return [
+        {
+            "page": page,
+            "renders": len(values),
+            "p50_ms": round(_percentile(values, 0.5), 1),
+            "p95_ms": round(_percentile(values, 0.95), 1),
+            "max_ms": round(values[-1], 1),
+        }
+        for page, values in sorted(snapshot.items())
+        if values
+    ]
+
+
+def _breakdown(profile, render):
+    """
+    Repartit le temps mural du rendu entre les categories.
+
+    streamlit recoit le reste (emission des elements + code de page).
+    """
+    sections = profile["sections"]
+    explicit = {category: sum(sections.get(category, {}).values()) for category in CATEGORIES}
+    sql_ms = render["sql_ms"] if render else 0.0
+    build_ms = render["build_ms"] if render else 0.0
+    totals = {
+        "sql": sql_ms,
+        "dataframe": build_ms + explicit["dataframe"],
+        "html": explicit["html"],
+    }
+    totals["streamlit"] = max(0.0, profile["wall_ms"] - sum(totals.values()))
+    children = {
+        "sql": {},
+        "dataframe": dict(sections.get("dataframe", {})),
+        "html": dict(sections.get("html", {})),
+        "streamlit": dict(sections.get("streamlit", {})),
+    }
+    if build_ms:
+        children["dataframe"]["fetch_df"] = build_ms
+    other = totals["streamlit"] - explicit["streamlit"]
+    if other > 0 and children["streamlit"]:
+        children["streamlit"]["(widgets et code de page)"] = other
+    return totals, children
+
+
+@contextmanager
+def profile(page, render=None, enabled=False):
+    """
+    Mesure le rendu d'une page.
+
+    render: dict de query_log.page_scope() (temps SQL du rendu).
+    Retourne (via yield) le profil; profile["summary"] est rempli a la
+    sortie si enabled, pour render_summary().
+    """
+    state = {"page": page, "enabled": enabled, "sections": {}, "wall_ms": 0.0, "summary": None}
+    token = _CURRENT.set(state if enabled else None)
+    started = time.perf_counter()
+    try:
+        yield state
+    finally:
+        _CURRENT.reset(token)
+        state["wall_ms"] = (time.perf_counter() - started) * 1000
+        _record_duration(page, state["wall_ms"])
+        if enabled:
+            totals, children = _breakdown(state, render)
+            state["summary"] = {"totals": totals, "children": children}
+
+
+def _bar(label, value_ms, total_ms, css_class, offset_pct):
+    """Un segment de flame graph (position et largeur en % du total)."""
+    width = value_ms / total_ms * 100 if total_ms else 0
+    return (
+        f"<div class='profile-bar {css_class}' "
+        f"style='left:{offset_pct:.2f}%;width:{max(width, 0.3):.2f}%' "
+        f"title='{escape(label)}: {value_ms:.1f} ms'>"
+        f"<span>{escape(label)} {value_ms:.0f} ms</span></div>"
+    )
+
+
+def _flame_html(state):
+    """Flame graph a 3 niveaux: page / categories / sections."""
+    total = state["wall_ms"]
+    totals = state["summary"]["totals"]
+    children = state["summary"]["children"]
+    rows = [
+        "<div class='profile-row'>"
+        + _bar(state["page"], total, total, "profile-page", 0)
+        + "</div>"
+    ]
+    level_one = []
+    level_two = []
+    offset = 0.0
+    for category in CATEGORIES:
+        value = totals[category]
+        level_one.append(_bar(_CATEGORY_LABELS[category], value, total, f"profile-{category}", offset))
+        child_offset = offset
+        for name, child_ms in sorted(children[category].items(), key=lambda item: item[1], reverse=True):
+            level_two.append(_bar(name, child_ms, total, f"profile-{category}", child_offset))
+            child_offset += child_ms / total * 100 if total else 0
+        offset += value / total * 100 if total else 0
+    rows.append("<div class='profile-row'>" + "".join(level_one) + "</div>")
+    rows.append("<div class='profile-row'>" + "".join(level_two) + "</div>")
+    return "<div class='profile-flame'>" + "".join(rows) + "</div>"
+
+
+def render_summary(state, render=None):
+    """Affiche le resume repliable du rendu (a appeler apres la page)."""
+    if not state or not state.get("summary"):
+        return
+    import pandas as pd
+    import streamlit as st
+
+    totals = state["summary"]["totals"]
+    queries = render["queries"] if render else 0
+    title = (
+        f"Profil du rendu: {state['wall_ms']:.0f} ms "
+        f"(SQL {totals['sql']:.0f} ms / {queries} req., DataFrame {totals['dataframe']:.0f} ms, "
+        f"HTML {totals['html']:.0f} ms, Streamlit {totals['streamlit']:.0f} ms)"
+    )
+    with st.expander(title, expanded=False):
+        st.markdown(_flame_html(state), unsafe_allow_html=True)
+        st.caption("Percentiles par page (fenetre glissante, ce process)")
+        st.dataframe(pd.DataFrame(page_stats()), hide_index=True)
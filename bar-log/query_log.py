@@ -0,0 +1,367 @@
+"""
+Instrumentation des requetes SQL de l'application BarStock.
+
+Interaction:
+- db.db_cursor() enveloppe chaque cursor dans InstrumentedCursor: chaque
+  execute() produit une entree (empreinte SQL, hash des parametres, lignes,
+  temps de connexion / execution / fetch),
+- data_access.fetch_df() ajoute le temps de construction du DataFrame via
+  note_build(),
+- streamlit_app.py ouvre un page_scope() autour du rendu de la page: les
+  requetes sont rattachees a ce rendu,
+- pages/admin.py lit renders(), top_queries() et recent() pour le panneau
+  Diagnostics.
+
+Stockage:
+- un ring buffer en memoire (process) des dernieres requetes et rendus,
+- optionnellement un fichier JSONL des requetes lentes.
+
+Configuration (variables d'environnement):
+- BARLOG_QUERY_LOG=0 desactive l'instrumentation,
+- BARLOG_QUERY_LOG_SIZE: taille du ring buffer (defaut 2000 requetes),
+- BARLOG_SLOW_QUERY_MS: seuil "requete lente" en ms (defaut 250),
+- BARLOG_SLOW_QUERY_LOG: chemin du fichier JSONL (absent = pas de fichier).
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+import hashlib
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+ENABLED = os.getenv("BARLOG_QUERY_LOG", "1") != "0"
+RING_SIZE = int(os.getenv("BARLOG_QUERY_LOG_SIZE", "2000"))
+SLOW_QUERY_MS = float(os.getenv("BARLOG_SLOW_QUERY_MS", "250"))
+SLOW_QUERY_LOG = os.getenv("BARLOG_SLOW_QUERY_LOG") or None
+
+# Nombre de rendus de page conserves (resume par rendu).
+RENDER_RING_SIZE = 200
+
+_QUERIES = deque(maxlen=RING_SIZE)
+_RENDERS = deque(maxlen=RENDER_RING_SIZE)
+_LOCK = threading.Lock()
+_SLOW_LOG_LOCK = threading.Lock()
+_RENDER_IDS = itertools.count(1)
+
+# Rendu de page en cours dans ce thread de script: dict ou None.
+_CURRENT_RENDER = ContextVar("barlog_current_render", default=None)
+
+# Fonctions techniques ignorees pour retrouver l'appelant metier.
+_PLUMBING = {
+    "execute",
+    "fetch_df",
+    "fetch_one",
+    "fetch_frame",
+    "exec_query",
+    "_keyset_page",
+    "stream_rows",
+    "wrapper",
+    "__exit__",
+    "__next__",
+}
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)", re.IGNORECASE)
+_TUPLE = r"\((?:[^()]|\([^()]*\))*\)"
+_VALUES_LIST = re.compile(rf"\bVALUES\s*({_TUPLE})(?:\s*,\s*{_TUPLE})+", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """
+    Normalise une requete en empreinte stable.
+
+    Espaces compactes, litteraux -> ?, listes IN (...) et VALUES (...), (...)
+    multi-lignes ramenees a une seule forme: deux appels de la meme requete
+    avec des parametres differents ont la meme empreinte.
+    """
+    text = " ".join(str(sql).split())
+    text = _STRING_LITERAL.sub("?", text)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = text.replace("%s", "?")
+    text = _IN_LIST.sub("IN (...)", text)
+    text = _VALUES_LIST.sub(r"VALUES \1, ...", text)
+    return text
+
+
+@lru_cache(maxsize=1024)
+def fingerprint_id(text):
+    """Identifiant court d'une empreinte (pour grouper et afficher)."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=4).hexdigest()
+
+
+def params_hash(params):
+    """Hash court des parametres (sans stocker les valeurs elles-memes)."""
+    if not params:
+        return ""
+    return hashlib.blake2b(repr(params).encode("utf-8"), digest_size=6).hexdigest()
+
+
+def _caller():
+    """Nom de la premiere fonction appelante hors plomberie SQL."""
+    frame = sys._getframe(2)
+    depth = 0
+    while frame is not None and depth < 12:
+        name = frame.f_code.co_name
+        module = frame.f_globals.get("__name__", "")
+        if name not in _PLUMBING and module not in ("db", "query_log", "contextlib"):
+            return f"{module}.{name}"
+        frame = frame.f_back
+        depth += 1
+    return ""
+
+
+def _ms(seconds):
+    """Secondes -> millisecondes arrondies."""
+    return round(seconds * 1000, 3)
+
+
+def _finish(entry):
+    """Finalise une entree: total, rattachement au rendu, log lent."""
+    entry["total_ms"] = round(
+        entry["connect_ms"] + entry["execute_ms"] + entry["fetch_ms"] + entry["build_ms"], 3
+    )
+    render = entry.pop("_render", None)
+    if render is not None:
+        render["queries"] += 1
+        render["sql_ms"] += entry["total_ms"] - entry["build_ms"]
+        render["build_ms"] += entry["build_ms"]
+    if SLOW_QUERY_LOG and entry["total_ms"] >= SLOW_QUERY_MS:
+        _write_slow(entry)
+
+
+def _write_slow(entry):
+    """Ajoute une requete lente au fichier JSONL (erreurs d'E/S ignorees)."""
+    line = json.dumps(entry, ensure_ascii=False, default=str)
+    try:
+        with _SLOW_LOG_LOCK, open(SLOW_QUERY_LOG, "a", encoding="utf-8") as handle:
+            handle.write(line + "\n")
+    except OSError:
+        pass
+
+
+class InstrumentedCursor:
+    """
+    Proxy de cursor mysql.connector qui mesure chaque requete.
+
+    Une entree est ouverte a chaque execute() et fermee a l'execute()
+    suivant ou a close(); les fetch*() et note_build() completent l'entree
+    ouverte. Les autres attributs (lastrowid, rowcount...) sont relayes.
+    """
+
+    def __init__(self, cursor, connect_seconds=0.0):
+        self._cursor = cursor
+        self._connect_seconds = connect_seconds
+        self._entry = None
+
+    def _open(self, operation, params):
+        self._close_entry()
+        text = fingerprint(operation)
+        render = _CURRENT_RENDER.get()
+        entry = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "page": render["page"] if render else "",
+            "render_id": render["render_id"] if render else None,
+            "caller": _caller(),
+            "fingerprint": text,
+            "fingerprint_id": fingerprint_id(text),
+            "params_hash": params_hash(params),
+            "rows": 0,
+            "connect_ms": _ms(self._connect_seconds),
+            "execute_ms": 0.0,
+            "fetch_ms": 0.0,
+            "build_ms": 0.0,
+            "_render": render,
+        }
+        # Le temps de connexion n'est compte que sur la premiere requete.
+        self._connect_seconds = 0.0
+        self._entry = entry
+        return entry
+
+    def _close_entry(self):
+        entry = self._entry
+        if entry is None:
+            return
+        self._entry = None
+        _finish(entry)
+        with _LOCK:
+            _QUERIES.append(entry)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        entry = self._open(operation, params)
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            entry["execute_ms"] = _ms(time.perf_counter() - started)
+            # DML: nombre de lignes touchees; SELECT: complete par fetch*().
+            rowcount = getattr(self._cursor, "rowcount", -1)
+            if rowcount and rowcount > 0 and not getattr(self._cursor, "with_rows", False):
+                entry["rows"] = rowcount
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        result = getattr(self._cursor, method)(*args)
+        if self._entry is not None:
+            self._entry["fetch_ms"] = round(self._entry["fetch_ms"] + _ms(time.perf_counter() - started), 3)
+            if isinstance(result, list):
+                self._entry["rows"] += len(result)
+            elif result is not None:
+                self._entry["rows"] += 1
+        return result
+
+    def fetchall(self):
+        return self._fetch("fetchall")
+
+    def fetchone(self):
+        return self._fetch("fetchone")
+
+    def fetchmany(self, size=1):
+        return self._fetch("fetchmany", size)
+
+    def note_build(self, seconds):
+        """Ajoute le temps de construction du DataFrame a la requete ouverte."""
+        if self._entry is not None:
+            self._entry["build_ms"] = round(self._entry["build_ms"] + _ms(seconds), 3)
+
+    def close(self):
+        self._close_entry()
+        return self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def instrument(cursor, connect_seconds=0.0):
+    """Enveloppe un cursor si l'instrumentation est active."""
+    if not ENABLED:
+        return cursor
+    return InstrumentedCursor(cursor, connect_seconds)
+
+
+def note_build(cursor, seconds):
+    """Rattache un temps de construction DataFrame a la derniere requete du cursor."""
+    note = getattr(cursor, "note_build", None)
+    if note is not None:
+        note(seconds)
+
+
+@contextmanager
+def page_scope(page):
+    """
+    Rattache les requetes emises dans le bloc a un rendu de page.
+
+    Le resume du rendu (duree, nb de requetes, temps SQL hors construction
+    des DataFrame, temps de construction) est conserve dans
+    le ring buffer des rendus, meme si la page leve une exception
+    (st.rerun/st.stop passent par des exceptions de controle).
+    """
+    render = {
+        "render_id": next(_RENDER_IDS),
+        "page": page,
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "queries": 0,
+        "sql_ms": 0.0,
+        "build_ms": 0.0,
+        "duration_ms": 0.0,
+    }
+    token = _CURRENT_RENDER.set(render)
+    started = time.perf_counter()
+    try:
+        yield render
+    finally:
+        _CURRENT_RENDER.reset(token)
+        render["duration_ms"] = _ms(time.perf_counter() - started)
+        render["sql_ms"] = round(render["sql_ms"], 3)
+        render["build_ms"] = round(render["build_ms"], 3)
+        with _LOCK:
+            _RENDERS.append(render)
+
+
+def renders(limit=50):
+    """Derniers rendus de page (plus recent d'abord)."""
+    with _LOCK:
+        items = list(_RENDERS)
+    return [dict(item) for item in reversed(items)][:limit]
+
+
+def recent(limit=100, render_id=None):
+    """Dernieres requetes (plus recente d'abord), filtrables par rendu."""
+    with _LOCK:
+        items = list(_QUERIES)
+    if render_id is not None:
+        items = [item for item in items if item["render_id"] == render_id]
+    return [dict(item) for item in reversed(items)][:limit]
+
+
+def top_queries(limit=10, render_id=None, page=None):
+    """
+    Agrege les requetes du ring buffer par empreinte, triees par temps total.
+
+    Filtrable par rendu (render_id) ou par page.
+    """
+    with _LOCK:
+        items = list(_QUERIES)
+    groups = {}
+    for item in items:
+        if render_id is not None and item["render_id"] != render_id:
+            continue
+        if page is not None and item["page"] != page:
+            continue
+        group = groups.get(item["fingerprint_id"])
+        if group is None:
+            group = groups[item["fingerprint_id"]] = {
+                "fingerprint_id": item["fingerprint_id"],
+                "fingerprint": item["fingerprint"],
+                "caller": item["caller"],
+                "calls": 0,
+                "distinct_params": set(),
+                "rows": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "connect_ms": 0.0,
+                "execute_ms": 0.0,
+                "fetch_ms": 0.0,
+                "build_ms": 0.0,
+            }
+        group["calls"] += 1
+        group["distinct_params"].add(item["params_hash"])
+        group["rows"] += item["rows"]
+        group["max_ms"] = max(group["max_ms"], item["total_ms"])
+        for key in ("total_ms", "connect_ms", "execute_ms", "fetch_ms", "build_ms"):
+            group[key] += item[key]
+    result = sorted(groups.values(), key=lambda group: group["total_ms"], reverse=True)[:limit]
+    for group in result:
+        group["distinct_params"] = len(group["distinct_params"])
+        for key in ("total_ms", "max_ms", "connect_ms", "execute_ms", "fetch_ms", "build_ms"):
+            group[key] = round(group[key], 3)
+    return result
+
+
+def settings():
+    """Configuration effective (affichee dans le panneau Diagnostics)."""
+    return {
+        "enabled": ENABLED,
+        "ring_size": RING_SIZE,
+        "slow_query_ms": SLOW_QUERY_MS,
+        "slow_query_log": SLOW_QUERY_LOG,
+    }
+
+
+def clear():
+    """Vide les ring buffers (requetes et rendus)."""
+    with _LOCK:
+        _QUERIES.clear()
+        _RENDERS.clear()
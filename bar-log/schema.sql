@@ -14,8 +14,14 @@ CREATE TABLE produit (
   prix_achat DECIMAL(10,2) NOT NULL DEFAULT 0 CHECK (prix_achat >= 0),
   prix_vente_bouteille DECIMAL(10,2) NOT NULL DEFAULT 0 CHECK (prix_vente_bouteille >= 0),
   prix_vente_verre DECIMAL(10,2) NOT NULL DEFAULT 0 CHECK (prix_vente_verre >= 0),
+  -- Snapshot du stock: valeur au mouvement id_mouvement_snapshot inclus.
+  -- Stock courant = stock_actuel + mouvements posterieurs (mouvement_stock).
   stock_actuel INT NOT NULL DEFAULT 0 CHECK (stock_actuel >= 0),
+  id_mouvement_snapshot BIGINT NOT NULL DEFAULT 0,
   unite_vente VARCHAR(20) NOT NULL DEFAULT 'bouteille' CHECK (unite_vente IN ('bouteille', 'verre')),
+  quantite_ml INT NOT NULL DEFAULT 0,
+  -- Seuil de reapprovisionnement (alerte stock faible).
+  seuil_alerte INT NOT NULL DEFAULT 5 CHECK (seuil_alerte >= 0),
   id_categorie INT NOT NULL,
   CONSTRAINT ck_produit_id CHECK (id_produit REGEXP '^PR[0-9]{6}$'),
   CONSTRAINT fk_produit_categorie
@@ -40,6 +46,7 @@ CREATE TABLE vente (
   date_vente DATE NOT NULL,
   quantite INT NOT NULL CHECK (quantite > 0),
   montant DECIMAL(10,2) NOT NULL CHECK (montant >= 0),
+  cout_unitaire DECIMAL(10,2) NOT NULL DEFAULT 0,
   nom_preparation VARCHAR(255),
   type_vente VARCHAR(20) NOT NULL CHECK (type_vente IN ('bouteille', 'verre')),
   id_produit CHAR(8) NULL,
@@ -58,7 +65,10 @@ CREATE TABLE vente (
 CREATE TABLE recu (
   id_recu INT AUTO_INCREMENT PRIMARY KEY,
   date_recu DATETIME NOT NULL,
-  nom_client VARCHAR(255)
+  nom_client VARCHAR(255),
+  -- Identifiant genere par la caisse: un recu rejoue n'est ecrit qu'une fois.
+  uuid_recu CHAR(36) NULL,
+  CONSTRAINT uk_recu_uuid UNIQUE (uuid_recu)
 ) ENGINE=InnoDB;
 
 ALTER TABLE vente
@@ -67,6 +77,67 @@ ALTER TABLE vente
   ON DELETE RESTRICT
   ON UPDATE CASCADE;
 
+-- Resume journalier des ventes (jour x produit x type_vente), maintenu par
+-- le chemin d'ecriture des ventes. id_produit = '' pour les preparations.
+CREATE TABLE vente_jour (
+  date_vente DATE NOT NULL,
+  id_categorie INT NOT NULL,
+  id_produit CHAR(8) NOT NULL DEFAULT '',
+  type_vente VARCHAR(20) NOT NULL,
+  quantite INT NOT NULL DEFAULT 0,
+  montant DECIMAL(14,2) NOT NULL DEFAULT 0,
+  cout DECIMAL(14,2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (date_vente, id_categorie, id_produit, type_vente)
+) ENGINE=InnoDB;
+
+-- Ledger append-only des mouvements de stock (quantite signee): entrees,
+-- ventes, ajustements (stock initial, correction manuelle). Les ventes ne
+-- font qu'inserer ici; produit.stock_actuel est recale periodiquement
+-- (roll-up, voir maintenance.py rollup-stock).
+CREATE TABLE mouvement_stock (
+  id_mouvement BIGINT AUTO_INCREMENT PRIMARY KEY,
+  date_mouvement DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  id_produit CHAR(8) NOT NULL,
+  quantite INT NOT NULL,
+  type_mouvement VARCHAR(20) NOT NULL CHECK (type_mouvement IN ('entree', 'vente', 'ajustement')),
+  id_entree INT NULL,
+  id_recu INT NULL,
+  CONSTRAINT fk_mouvement_produit
+    FOREIGN KEY (id_produit) REFERENCES produit (id_produit)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+-- Historique des roll-ups: stock d'un produit au mouvement id_mouvement
+-- inclus (point de depart pour le stock a une date passee).
+CREATE TABLE stock_snapshot (
+  id_produit CHAR(8) NOT NULL,
+  id_mouvement BIGINT NOT NULL,
+  stock INT NOT NULL,
+  date_snapshot DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (id_produit, id_mouvement),
+  CONSTRAINT fk_snapshot_produit
+    FOREIGN KEY (id_produit) REFERENCES produit (id_produit)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+-- Produits sous leur seuil d'alerte (stock <= produit.seuil_alerte),
+-- tenus a jour par cle primaire par les ecritures qui changent le stock.
+-- stock: stock a l'entree dans l'ensemble; notifie_le: alerte poussee
+-- (alerts.py), NULL = a notifier.
+CREATE TABLE alerte_stock (
+  id_produit CHAR(8) PRIMARY KEY,
+  stock INT NOT NULL,
+  seuil INT NOT NULL,
+  depuis DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  notifie_le DATETIME NULL,
+  CONSTRAINT fk_alerte_produit
+    FOREIGN KEY (id_produit) REFERENCES produit (id_produit)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
 CREATE TABLE charge (
   id_charge INT AUTO_INCREMENT PRIMARY KEY,
   type_charge VARCHAR(100) NOT NULL,
@@ -91,11 +162,21 @@ BEGIN
 END//
 DELIMITER ;
 
-CREATE INDEX idx_entree_date ON entree_stock (date_entree);
+-- Composites alignes sur les filtres + tris des historiques (cf.
+-- migrations/005_index_composites.sql); la cle primaire complete chaque index.
+CREATE INDEX idx_entree_date_cover ON entree_stock (date_entree, id_entree, id_produit, quantite);
+CREATE INDEX idx_entree_produit_date ON entree_stock (id_produit, date_entree, id_entree, quantite);
 CREATE INDEX idx_vente_date ON vente (date_vente);
-CREATE INDEX idx_charge_date ON charge (date_charge);
+CREATE INDEX idx_vente_categorie_date ON vente (id_categorie, date_vente);
+CREATE INDEX idx_vente_produit_date ON vente (id_produit, date_vente);
+CREATE INDEX idx_charge_date_cover ON charge (date_charge, id_charge, montant, type_charge);
 CREATE INDEX idx_produit_categorie ON produit (id_categorie);
-CREATE INDEX idx_vente_categorie ON vente (id_categorie);
+CREATE INDEX idx_produit_nom ON produit (nom_produit);
+-- Delta depuis le snapshot (couvrant) et stock a une date.
+CREATE INDEX idx_mouvement_produit ON mouvement_stock (id_produit, id_mouvement, quantite);
+CREATE INDEX idx_mouvement_date ON mouvement_stock (id_produit, date_mouvement);
+-- Alertes a notifier (claim_stock_alerts).
+CREATE INDEX idx_alerte_notifie ON alerte_stock (notifie_le, depuis);
 
 INSERT INTO categorie (libelle, stockable) VALUES
 ('Vins moelleux', 1),
@@ -0,0 +1,227 @@
+"""
+Index de recherche produit en memoire (process).
+
+Construit depuis data_access.list_products() et reconstruit quand le
+catalogue change (data_access.catalogue_version(), incrementee par
+invalidate_cache()) ou apres CACHE_TTL_SECONDS (ecritures externes).
+
+Interaction:
+- streamlit_app.py: champ recherche de la sidebar (resultats classes,
+  lien vers l'onglet Modifier de la page Produits),
+- pages/sales.py et pages/entries.py: filter_product_map() restreint et
+  classe les options du selectbox produit selon cette recherche.
+
+Recherche:
+- termes normalises (minuscules, sans accents), tous requis,
+- prefixe sur les mots de nom_produit, de la categorie et sur l'id
+  ("PR000123", "pr12", "123"), par bisect sur le vocabulaire trie,
+- trigrammes sur les mots des noms et categories pour tolerer une faute
+  de frappe (similarite de Jaccard >= FUZZY_THRESHOLD), score plus faible;
+  une faute sur un mot court (environ 5 lettres et moins: "bire",
+  "whsky") reste sous le seuil, la tolerance ne vaut que pour les mots
+  plus longs ("jamesn", "chardonay"),
+- classement: id exact > premier mot du nom > nom > categorie, puis
+  nom alphabetique.
+"""
+
+from bisect import bisect_left
+from collections import Counter, defaultdict
+import heapq
+import re
+import threading
+import time
+import unicodedata
+
+import data_access
+
+SEARCH_LIMIT = 20
+# Resultats affiches sous le champ de la sidebar.
+SIDEBAR_RESULTS = 8
+FUZZY_THRESHOLD = 0.4
+
+# Poids d'un mot selon son champ.
+_WEIGHT_ID = 5.0
+_WEIGHT_FIRST_WORD = 4.0
+_WEIGHT_NAME = 3.0
+_WEIGHT_CATEGORY = 1.0
+# Facteurs selon le type de correspondance.
+_PREFIX_FACTOR = 0.8
+_FUZZY_FACTOR = 0.6
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+_LOCK = threading.Lock()
+_INDEX = {"version": None, "built_at": 0.0}
+
+
+def _normalize(text):
+    """Minuscules sans accents."""
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(char for char in text if not unicodedata.combining(char)).lower()
+
+
+def _words(text):
+    """Mots normalises d'un texte."""
+    return _WORD_RE.findall(_normalize(text))
+
+
+def _trigrams(word):
+    """Trigrammes d'un mot, bornes comprises (" bi", "bie", ..., "re ")."""
+    padded = f" {word} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def _id_words(product_id):
+    """Mots de l'id: "pr000123", "pr123" et "123" (numero sans zeros de tete)."""
+    words = _words(product_id)
+    for word in list(words):
+        digits = word.lstrip("abcdefghijklmnopqrstuvwxyz")
+        prefix = word[: len(word) - len(digits)]
+        digits = digits.lstrip("0")
+        if digits and digits != word:
+            words.append(digits)
+            if prefix and prefix + digits != word:
+                words.append(prefix + digits)
+    return words
+
+
+def _build(products_df, version):
+    """Construit l'index: postings mot -> {produit: poids} et trigrammes du vocabulaire."""
+    started = time.perf_counter()
+    docs = products_df.to_dict("records") if not products_df.empty else []
+    postings = defaultdict(dict)
+    # Mots des noms et categories (les ids ne sont cherches que par prefixe).
+    text_words = set()
+
+    def add(word, doc, weight):
+        if postings[word].get(doc, 0.0) < weight:
+            postings[word][doc] = weight
+
+    for doc, row in enumerate(docs):
+        for word in _id_words(row.get("id_produit")):
+            add(word, doc, _WEIGHT_ID)
+        for position, word in enumerate(_words(row.get("nom_produit"))):
+            add(word, doc, _WEIGHT_FIRST_WORD if position == 0 else _WEIGHT_NAME)
+            text_words.add(word)
+        for word in _words(row.get("categorie")):
+            add(word, doc, _WEIGHT_CATEGORY)
+            text_words.add(word)
+
+    trigrams = defaultdict(set)
+    for word in text_words:
+        for gram in _trigrams(word):
+            trigrams[gram].add(word)
+
+    return {
+        "version": version,
+        "built_at": time.monotonic(),
+        "build_ms": (time.perf_counter() - started) * 1000,
+        "docs": docs,
+        "names": [_normalize(row.get("nom_produit")) for row in docs],
+        "postings": dict(postings),
+        "vocab": sorted(postings),
+        "trigrams": dict(trigrams),
+    }
+
+
+def _index():
+    """Index courant, reconstruit si le catalogue a change ou si le TTL est depasse."""
+    global _INDEX
+    version = data_access.catalogue_version()
+    index = _INDEX
+    if index["version"] == version and time.monotonic() - index["built_at"] < data_access.CACHE_TTL_SECONDS:
+        return index
+    with _LOCK:
+        index = _INDEX
+        if index["version"] != version or time.monotonic() - index["built_at"] >= data_access.CACHE_TTL_SECONDS:
+            index = _build(data_access.list_products(), version)
+            _INDEX = index
+    return index
+
+
+def _term_scores(index, term):
+    """Score par produit pour un terme: prefixe (bisect) puis trigrammes."""
+    postings = index["postings"]
+    vocab = index["vocab"]
+    scores = {}
+
+    def add(word, factor):
+        for doc, weight in postings[word].items():
+            score = weight * factor
+            if scores.get(doc, 0.0) < score:
+                scores[doc] = score
+
+    position = bisect_left(vocab, term)
+    while position < len(vocab) and vocab[position].startswith(term):
+        word = vocab[position]
+        add(word, 1.0 if word == term else _PREFIX_FACTOR)
+        position += 1
+
+    if len(term) >= 3:
+        grams = _trigrams(term)
+        shared = Counter(word for gram in grams for word in index["trigrams"].get(gram, ()))
+        for word, count in shared.items():
+            similarity = count / (len(grams) + len(_trigrams(word)) - count)
+            if similarity >= FUZZY_THRESHOLD:
+                add(word, _FUZZY_FACTOR * similarity)
+    return scores
+
+
+def search_products(query, limit=SEARCH_LIMIT):
+    """
+    Retourne les produits (dict de list_products()) correspondant a query,
+    classes par pertinence. Requete vide: liste vide.
+    """
+    terms = _words(query)
+    if not terms:
+        return []
+    index = _index()
+    totals = None
+    for term in terms:
+        scores = _term_scores(index, term)
+        if totals is None:
+            totals = scores
+        else:
+            totals = {doc: totals[doc] + score for doc, score in scores.items() if doc in totals}
+        if not totals:
+            return []
+    names = index["names"]
+
+    def rank(doc):
+        return (-totals[doc], names[doc])
+
+    ranked = sorted(totals, key=rank) if limit is None else heapq.nsmallest(limit, totals, key=rank)
+    return [index["docs"][doc] for doc in ranked]
+
+
+def filter_product_map(product_map, query, keep=None):
+    """
+    Restreint un mapping label -> produit (ui.build_product_map) aux
+    resultats de query, dans l'ordre de pertinence.
+
+    keep: label deja selectionne, conserve en tete s'il ne correspond pas
+    (le selectbox garderait sinon une valeur absente des options).
+    Requete vide: mapping inchange.
+    """
+    if not _words(query):
+        return product_map
+    label_by_id = {str(row["id_produit"]): label for label, row in product_map.items()}
+    labels = [
+        label_by_id[str(row["id_produit"])]
+        for row in search_products(query, limit=None)
+        if str(row["id_produit"]) in label_by_id
+    ]
+    if keep in product_map and keep not in labels:
+        labels.insert(0, keep)
+    return {label: product_map[label] for label in labels}
+
+
+def index_stats():
+    """Etat de l'index (produits, vocabulaire, temps de construction)."""
+    index = _INDEX
+    return {
+        "version": index["version"],
+        "products": len(index.get("docs", ())),
+        "words": len(index.get("vocab", ())),
+        "build_ms": index.get("build_ms"),
+    }
@@ -10,18 +10,24 @@ Role de ce fichier:
 
 Dependances principales:
 - ui.apply_theme(): injecte le CSS global.
-- pages.*.render_*(): fonctions d'affichage de chaque module metier.
+- search.search_products(): recherche produit de la sidebar (importe a la
+  premiere recherche).
+- pages.*.render_*(): fonctions d'affichage de chaque module metier,
+  importees seulement a la premiere selection de la page (demarrage a
+  froid: ni les autres pages ni pandas ne sont charges avant d'en avoir
+  besoin).
 """
 
+from html import escape
+import importlib
+import os
+from urllib.parse import quote
+
 import streamlit as st
 
+import profiling
+import query_log
 from ui import apply_theme
-from pages.dashboard import render_dashboard
-from pages.products import render_products
-from pages.entries import render_entries
-from pages.sales import render_sales
-from pages.charges import render_charges
-from pages.reports import render_reports
 
 # Configuration globale Streamlit. Elle doit etre appelee tres tot.
 st.set_page_config(page_title="Gestion Stock Bar", layout="wide")
@@ -32,15 +38,49 @@ apply_theme()
 
 # Table de routage principale:
 # la cle (texte du menu) est ce que voit l'utilisateur,
-# la valeur est la fonction "render_*" importee depuis un fichier de page.
+# la valeur est (module de page, fonction "render_*"), resolue a la demande.
 PAGES = {
-    "Tableau de bord": render_dashboard,
-    "Produits": render_products,
-    "Entrees": render_entries,
-    "Ventes": render_sales,
-    "Charges": render_charges,
-    "Rapports": render_reports,
+    "Tableau de bord": ("pages.dashboard", "render_dashboard"),
+    "Produits": ("pages.products", "render_products"),
+    "Entrees": ("pages.entries", "render_entries"),
+    "Ventes": ("pages.sales", "render_sales"),
+    "Charges": ("pages.charges", "render_charges"),
+    "Rapports": ("pages.reports", "render_reports"),
 }
+DEFAULT_PAGE = "Tableau de bord"
+
+# Panneau Diagnostics (requetes SQL par rendu), reserve a l'exploitation.
+if os.getenv("BARLOG_ADMIN") == "1":
+    PAGES["Diagnostics"] = ("pages.admin", "render_admin")
+
+
+@st.cache_resource(show_spinner=False)
+def load_page_renderer(module_name, function_name):
+    """
+    Importe un module de page a sa premiere selection et retourne sa
+    fonction de rendu (cache process, partage par toutes les sessions).
+    """
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def render_search_results(query):
+    """Affiche les produits trouves par la recherche de la sidebar."""
+    from search import SIDEBAR_RESULTS, search_products
+
+    results = search_products(query, limit=SIDEBAR_RESULTS)
+    if not results:
+        st.markdown("<div class='sidebar-search-empty'>Aucun produit</div>", unsafe_allow_html=True)
+        return
+    links = "".join(
+        "<a class='sidebar-search-result' target='_self' "
+        f"href='?products_tab=Modifier&edit_product={quote(str(row['id_produit']))}'>"
+        f"<span>{escape(str(row['nom_produit']))}</span>"
+        f"<span class='sidebar-search-meta'>{escape(str(row['categorie']))} - stock {row['stock_actuel']}</span>"
+        "</a>"
+        for row in results
+    )
+    st.markdown(f"<div class='sidebar-search-results'>{links}</div>", unsafe_allow_html=True)
+
 
 # Si une URL de type ?products_tab=...&edit_product=... ou ...&delete_product=...
 # (clic ligne "Modifier/Supprimer"), on force l'entree sur la page Produits
@@ -61,7 +101,9 @@ elif "main_navigation" not in st.session_state and query_products_tab:
 
 # Sidebar custom:
 # - branding + description
-# - champ recherche (UI uniquement ici, non branche a un filtre pour le moment)
+# - champ recherche produit (resultats classes sous le champ, lien vers la
+#   modification du produit; filtre aussi les listes produit des pages
+#   Ventes et Entrees via st.session_state["sidebar_search"])
 # - menu radio de navigation
 # - bloc support.
 with st.sidebar:
@@ -77,7 +119,14 @@ with st.sidebar:
         """,
         unsafe_allow_html=True,
     )
-    st.text_input("Search", placeholder="Rechercher", label_visibility="collapsed")
+    search_query = st.text_input(
+        "Search",
+        placeholder="Rechercher",
+        label_visibility="collapsed",
+        key="sidebar_search",
+    )
+    if search_query.strip():
+        render_search_results(search_query)
     st.markdown("<div class='sidebar-section'>Menu</div>", unsafe_allow_html=True)
     choice = st.radio(
         "Navigation",
@@ -100,7 +149,15 @@ with st.sidebar:
     )
 
 # Resolution + execution:
-# - get(...) ajoute une securite (fallback sur dashboard si la cle est absente).
+# - get(...) ajoute une securite (fallback sur dashboard si la cle est absente),
+#   load_page_renderer() importe le module de la page au premier passage.
 # - la fonction de page appelle ensuite data_access.py et ui.py selon son besoin.
-page_renderer = PAGES.get(choice, render_dashboard)
-page_renderer()
+# - query_log.page_scope() rattache les requetes SQL du rendu a cette page.
+# - profiling.profile() mesure le rendu; avec ?profile=1 (ou BARLOG_PROFILE=1)
+#   un resume SQL/DataFrame/HTML/Streamlit s'affiche en bas de page.
+page_renderer = load_page_renderer(*PAGES.get(choice, PAGES[DEFAULT_PAGE]))
+profile_enabled = profiling.is_enabled(st.query_params)
+with query_log.page_scope(choice) as render:
+    with profiling.profile(choice, render, enabled=profile_enabled) as page_profile:
+        page_renderer()
+profiling.render_summary(page_profile, render)
@@ -7,25 +7,121 @@ Objectif de ce module:
 - fournir des helpers de mapping utilises dans les formulaires/pages.
 
 Interaction avec les autres modules:
-- streamlit_app.py appelle apply_theme() une seule fois au demarrage.
+- streamlit_app.py appelle apply_theme() a chaque rerun (CSS en cache process).
 - pages/*.py appellent render_page_title(), show_dataframe(), fmt_fcfa() etc.
 - les fonctions de mapping recoivent des DataFrame venant de data_access.py.
+- les montants arrivent en centimes entiers (money.py): les formateurs
+  travaillent sur des int / ndarray int64, sans Decimal.
 """
 
-from decimal import Decimal
+import hashlib
 from pathlib import Path
+import re
+import threading
 
 import streamlit as st
 
+from money import MONEY_COLUMNS, MONEY_SCALE, to_units
+from profiling import section
+
+THEME_PATH = Path(__file__).resolve().parent / "styles.css"
+# Dossier servi par Streamlit sous app/static/ (server.enableStaticServing).
+STATIC_DIR = THEME_PATH.parent / "static"
+
+# Theme en cache process: (mtime_ns, css minifie, empreinte, url publiee).
+_THEME = None
+_THEME_LOCK = threading.Lock()
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+_CSS_SPACES = re.compile(r"\s*([{};,>])\s*")
+
+# Nombre de lignes affichees par defaut (et ajoutees par "Afficher plus")
+# dans les tableaux HTML longs (historique ventes, edition produits).
+DEFAULT_ROW_CAP = 200
+
+
+def _minify_css(css):
+    """Minification simple: commentaires, espaces et ';' final retires."""
+    css = _CSS_COMMENT.sub("", css)
+    css = " ".join(css.split())
+    css = _CSS_SPACES.sub(r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def _load_theme():
+    """
+    Retourne (css minifie, empreinte) de styles.css, ou None si absent.
+
+    Lu une seule fois par process puis seulement si le mtime du fichier
+    change (edition en dev); sinon aucun acces disque autre qu'un stat().
+    """
+    global _THEME
+    try:
+        mtime = THEME_PATH.stat().st_mtime_ns
+    except OSError:
+        return None
+    with _THEME_LOCK:
+        if _THEME is None or _THEME[0] != mtime:
+            css = _minify_css(THEME_PATH.read_text(encoding="utf-8"))
+            digest = hashlib.blake2b(css.encode("utf-8"), digest_size=6).hexdigest()
+            _THEME = (mtime, css, digest, None)
+        return _THEME
+
+
+def _publish_theme(css, digest):
+    """
+    Ecrit static/styles.<empreinte>.css (servi par Streamlit) et retourne
+    son URL relative. Les anciennes versions du fichier sont supprimees.
+    """
+    STATIC_DIR.mkdir(exist_ok=True)
+    target = STATIC_DIR / f"styles.{digest}.css"
+    if not target.exists():
+        for old in STATIC_DIR.glob("styles.*.css"):
+            old.unlink(missing_ok=True)
+        temporary = target.with_suffix(".tmp")
+        temporary.write_text(css, encoding="utf-8")
+        temporary.replace(target)
+    return f"app/static/{target.name}"
+
+
+def _theme_url(theme):
+    """URL du CSS publie (une ecriture par version), None si indisponible."""
+    global _THEME
+    mtime, css, digest, url = theme
+    if url is not None:
+        return url
+    try:
+        url = _publish_theme(css, digest)
+    except OSError:
+        return None
+    with _THEME_LOCK:
+        if _THEME is not None and _THEME[2] == digest:
+            _THEME = (mtime, css, digest, url)
+    return url
+
 
 def apply_theme():
-    """Charge styles.css et l'injecte globalement dans Streamlit."""
-    css_path = Path(__file__).resolve().parent / "styles.css"
-    if not css_path.exists():
+    """
+    Injecte styles.css globalement dans Streamlit.
+
+    - CSS lu une fois par process, minifie, invalide par mtime,
+    - si server.enableStaticServing est actif (.streamlit/config.toml), le
+      CSS est servi comme fichier statique a nom versionne: chaque rerun
+      n'envoie qu'une balise <link> de quelques octets et le navigateur
+      garde le fichier en cache,
+    - sinon repli sur un <style> inline (CSS minifie) renvoye a chaque
+      rerun: un element non reemis disparait de la page, il ne peut pas
+      etre envoye une seule fois par session.
+    """
+    theme = _load_theme()
+    if theme is None:
         # Pas de CSS -> on laisse Streamlit afficher le style par defaut.
         return
-    css = css_path.read_text(encoding="utf-8")
-    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
+    url = _theme_url(theme) if st.get_option("server.enableStaticServing") else None
+    if url is not None:
+        st.markdown(f"<link rel='stylesheet' href='{url}'>", unsafe_allow_html=True)
+    else:
+        st.markdown(f"<style>{theme[1]}</style>", unsafe_allow_html=True)
 
 
 def render_page_title(title, subtitle=None):
@@ -43,17 +139,31 @@ def render_page_title(title, subtitle=None):
         )
 
 
-def fmt_fcfa(value):
+def fmt_fcfa(cents):
     """
-    Formate une valeur monetaire en FCFA.
+    Formate un montant en centimes (int) en "1,234.50 FCFA".
 
-    Utilise Decimal pour eviter des artefacts d'arrondi float.
+    Arithmetique entiere: pas d'artefact d'arrondi float.
     """
     try:
-        return f"{Decimal(str(value)):,.2f} FCFA"
-    except Exception:
+        cents = int(cents)
+    except (TypeError, ValueError):
         # Fallback defensif: l'UI affiche toujours une valeur lisible.
         return "0.00 FCFA"
+    sign = "-" if cents < 0 else ""
+    units, rest = divmod(abs(cents), MONEY_SCALE)
+    return f"{sign}{units:,}.{rest:02d} FCFA"
+
+
+def money_frame(df):
+    """Copie d'affichage: colonnes MONEY_COLUMNS en FCFA (float) pour st.dataframe."""
+    columns = MONEY_COLUMNS.intersection(df.columns)
+    if not columns:
+        return df
+    df = df.copy()
+    for name in columns:
+        df[name] = df[name] / MONEY_SCALE
+    return df
 
 
 def show_dataframe(df, empty_message):
@@ -61,12 +171,13 @@ def show_dataframe(df, empty_message):
     Affiche un DataFrame avec un comportement uniforme.
 
     - si vide: message d'information clair,
-    - sinon: tableau Streamlit plein largeur sans index.
+    - sinon: tableau Streamlit plein largeur sans index (montants en FCFA).
     """
     if df.empty:
         st.info(empty_message)
     else:
-        st.dataframe(df, use_container_width=True, hide_index=True)
+        with section("streamlit", "st.dataframe"):
+            st.dataframe(money_frame(df), use_container_width=True, hide_index=True)
 
 
 def build_product_map(products_df):
@@ -116,7 +227,7 @@ def render_product_table(products_df, key):
         return None
 
     # Copie d'affichage: on ne modifie jamais le DataFrame source.
-    display_df = products_df.copy()
+    display_df = money_frame(products_df).copy()
     if "id_categorie" in display_df.columns:
         # Cache l'id technique dans la vue utilisateur.
         display_df = display_df.drop(columns=["id_categorie"])
@@ -159,3 +270,98 @@ def get_category_key(category_map, category_id):
         if row["id_categorie"] == category_id:
             return key
     return None
+
+
+def escape_series(series, default=""):
+    """
+    Echappe une colonne entiere pour le HTML (equivalent vectorise de
+    html.escape). Les valeurs vides/None sont remplacees par default.
+    """
+    text = series.astype(object).where(series.notna(), default).astype(str)
+    text = text.where(text != "", default)
+    return (
+        text.str.replace("&", "&amp;", regex=False)
+        .str.replace("<", "&lt;", regex=False)
+        .str.replace(">", "&gt;", regex=False)
+        .str.replace('"', "&quot;", regex=False)
+        .str.replace("'", "&#x27;", regex=False)
+    )
+
+
+def round_int_series(series):
+    """Arrondit une colonne en centimes a l'unite FCFA (int64, meme index)."""
+    import numpy as np
+    import pandas as pd
+
+    values = np.asarray(series.to_numpy(), dtype="int64")
+    return pd.Series(to_units(values), index=series.index)
+
+
+def fmt_int_series(series, signed=False):
+    """
+    Formate une colonne en centimes en FCFA "1 234" (separateur espace),
+    en une passe.
+
+    signed=True prefixe les valeurs positives par "+" (affichage de marge).
+    """
+    import numpy as np
+    import pandas as pd
+
+    values = round_int_series(series)
+    text = values.map("{:,}".format).astype(str).str.replace(",", " ", regex=False)
+    if signed:
+        text = pd.Series(np.where(values > 0, "+", ""), index=series.index) + text
+    return text
+
+
+def class_series(series, classifier, default=""):
+    """
+    Applique une fonction de classe CSS (ex: badge categorie) a une colonne.
+
+    La fonction n'est evaluee qu'une fois par valeur distincte.
+    """
+    text = series.astype(object).where(series.notna(), default).astype(str)
+    mapping = {value: classifier(value) for value in text.unique()}
+    return text.map(mapping).astype(str)
+
+
+def html_rows(parts, index):
+    """
+    Assemble les lignes d'un tableau HTML colonne par colonne.
+
+    parts: sequence de fragments (str fixe ou Series alignee sur index),
+    concatenes dans l'ordre pour chaque ligne. Retourne une seule chaine
+    (un seul join, pas de f-string par ligne).
+    """
+    import pandas as pd
+
+    if len(index) == 0:
+        return ""
+    rows = pd.Series("", index=index, dtype=object)
+    for part in parts:
+        if isinstance(part, pd.Series):
+            rows = rows + part.astype(str)
+        else:
+            rows = rows + str(part)
+    return "".join(rows.tolist())
+
+
+def get_row_cap(key, step=DEFAULT_ROW_CAP):
+    """Retourne le nombre de lignes a afficher pour un tableau (session)."""
+    return int(st.session_state.get(key, step))
+
+
+def render_load_more(key, shown, total, step=DEFAULT_ROW_CAP):
+    """
+    Affiche un bouton "Afficher plus" si toutes les lignes ne sont pas rendues.
+
+    Le clic augmente la limite stockee sous key (voir get_row_cap()).
+    """
+    if shown >= total:
+        return
+    if st.button(
+        f"Afficher plus ({total - shown} restantes)",
+        key=f"{key}_more",
+    ):
+        st.session_state[key] = shown + step
+        st.rerun()
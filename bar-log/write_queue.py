@@ -0,0 +1,178 @@
+"""
+File d'ecriture des recus: journal local + synchronisation en tache de fond.
+
+La caisse ne bloque plus sur l'aller-retour MySQL et ne perd plus de vente
+quand la base est injoignable: submit() ecrit le recu dans le journal
+SQLite local (journal.py) et rend la main, un thread de fond rejoue les
+recus en attente vers MySQL, par lots et dans l'ordre de saisie.
+
+Interaction:
+- pages/sales.py appelle start() a chaque rendu (rejeu des recus laisses
+  en attente par un process precedent), submit() au clic "Enregistrer",
+  puis statuses() / sync_state() pour l'affichage,
+- data_access.replay_receipts() applique un lot en une transaction; les
+  uuid_recu rendent le rejeu idempotent (un lot rejoue apres une coupure
+  pendant le commit n'ecrit rien deux fois),
+- quand la base repond, submit() controle d'abord le recu contre le
+  catalogue (data_access.check_receipt_stock): une vente impossible
+  (stock insuffisant, produit supprime, prix absent) est refusee a la
+  caisse comme avant le journal; base injoignable, le recu est journalise
+  sans ce controle,
+- un stock devenu negatif entre la vente et sa synchronisation (vente
+  concurrente, saisie hors ligne) n'annule pas le recu (la vente a eu
+  lieu): il est enregistre et marque "conflict" avec le detail des
+  ruptures.
+
+Etats: "pending" (journal local), "confirmed", "conflict" (enregistre,
+stock a verifier), "failed" (refuse par la base: produit supprime, prix
+absent, valeur hors limites ou contrainte violee; jamais rejoue).
+Seules les erreurs de connexion et de verrou sont rejouees: un recu
+refuse ne bloque pas les recus suivants du journal.
+"""
+
+import random
+import threading
+import time
+import uuid
+
+import data_access
+from db import is_permanent_error
+import journal
+
+# Etats d'un recu (definis par journal.py), utilises par pages/sales.py.
+PENDING = journal.PENDING
+CONFIRMED = journal.CONFIRMED
+CONFLICT = journal.CONFLICT
+FAILED = journal.FAILED
+
+# Recus rejoues par transaction MySQL.
+BATCH_SIZE = 50
+# Attente entre deux tentatives quand la base est injoignable (exponentielle bornee).
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 30.0
+
+_WAKE = threading.Event()
+_LOCK = threading.Lock()
+_WORKER = None
+_STATE = {"last_error": None, "last_error_at": None, "last_sync_at": None}
+
+
+def start():
+    """Demarre le syncer du process s'il ne tourne pas deja."""
+    global _WORKER
+    with _LOCK:
+        if _WORKER is None or not _WORKER.is_alive():
+            _WORKER = threading.Thread(target=_run, name="barlog-write-queue", daemon=True)
+            _WORKER.start()
+
+
+def submit(items, nom_client=None, uuid_recu=None):
+    """
+    Ecrit un recu dans le journal local et retourne son uuid (genere si absent).
+
+    items: meme format que data_access.commit_receipt(). Le recu est sur
+    disque au retour; la synchronisation MySQL suit en tache de fond.
+    Un recu invalide (vide, quantite hors bornes) ou impossible quand la
+    base repond (stock insuffisant, produit introuvable, prix absent) leve
+    ValueError et n'est pas journalise. Si le syncer est en echec (base
+    injoignable), le controle du stock est saute pour ne pas bloquer la
+    caisse; une erreur technique pendant le controle a le meme effet.
+    """
+    data_access.check_receipt(items)
+    with _LOCK:
+        online = _STATE["last_error"] is None
+    if online:
+        try:
+            data_access.check_receipt_stock(items)
+        except ValueError:
+            raise
+        except Exception:
+            # Base injoignable: le rejeu signalera les ruptures.
+            pass
+    uuid_recu = uuid_recu or str(uuid.uuid4())
+    journal.append(uuid_recu, items, nom_client)
+    start()
+    _WAKE.set()
+    return uuid_recu
+
+
+def statuses(uuids):
+    """Etat des recus demandes (cf. journal.statuses)."""
+    return journal.statuses(uuids)
+
+
+def pending_count():
+    """Nombre de recus du journal en attente de synchronisation."""
+    return journal.counts().get(PENDING, 0)
+
+
+def sync_state():
+    """Etat du syncer: recus en attente + derniere erreur de synchronisation."""
+    with _LOCK:
+        state = dict(_STATE)
+    state["pending"] = pending_count()
+    return state
+
+
+def _receipt(entry):
+    """Entree du journal -> argument de data_access.replay_receipts()."""
+    return {
+        "uuid_recu": entry["uuid"],
+        "items": entry["items"],
+        "nom_client": entry["nom_client"],
+        "date_recu": entry["submitted_at"],
+    }
+
+
+def _is_rejected(exc):
+    """Vrai si le recu est refuse pour de bon (erreur metier ou donnee refusee par la base)."""
+    return isinstance(exc, ValueError) or is_permanent_error(exc)
+
+
+def _sync_batch(batch):
+    """
+    Rejoue un lot; un recu refuse (_is_rejected) fait rejouer le lot recu
+    par recu pour isoler le recu fautif, marque "failed" s'il echoue encore
+    seul. Les erreurs de connexion et de verrou remontent (backoff).
+    """
+    try:
+        results = data_access.replay_receipts([_receipt(entry) for entry in batch])
+    except Exception as exc:
+        if not _is_rejected(exc):
+            raise
+        if len(batch) == 1:
+            journal.mark_failed(batch[0]["uuid"], str(exc))
+            return
+        for entry in batch:
+            _sync_batch([entry])
+        return
+    journal.mark_synced(results)
+
+
+def _run():
+    """Boucle du syncer: lots en attente dans l'ordre, attente sur submit() ou backoff."""
+    failures = 0
+    journal.purge()
+    while True:
+        batch = journal.pending(BATCH_SIZE)
+        if not batch:
+            _WAKE.wait()
+            _WAKE.clear()
+            continue
+        try:
+            _sync_batch(batch)
+        except Exception as exc:
+            failures += 1
+            journal.note_attempt([entry["uuid"] for entry in batch], str(exc))
+            with _LOCK:
+                _STATE["last_error"] = str(exc)
+                _STATE["last_error_at"] = time.time()
+            delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (failures - 1))
+            # Un nouveau recu reveille le syncer: il retente aussitot.
+            _WAKE.wait(delay * random.uniform(0.5, 1.0))
+            _WAKE.clear()
+            continue
+        failures = 0
+        with _LOCK:
+            _STATE["last_error"] = None
+            _STATE["last_sync_at"] = time.time()